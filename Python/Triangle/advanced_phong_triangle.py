@@ -5,20 +5,113 @@ Interactive demo with lighting controls, multiple triangles, and real-time param
 """
 
 import numpy as np
+import functools
 import glfw
-from OpenGL.GL import *
+from gl_optional import *
+from shader_program import create_program
+from frame_profiler import NullProfiler
+from render_scheduler import RenderScheduler
+from transforms import MvpTransform
+from phong_shading import shade_phong, shade_point_lights
+from normals import random_normals, radial_normals
+from vertex_cache import compact_indices
+from frame_uniforms import FrameUniforms, bind_uniform_blocks, CAMERA_BLOCK, LIGHT_BLOCK
+from light_culling import TiledLights, random_point_lights, screen_bounds, TILED_LIGHTS
+from gbuffer import GBuffer, GEOMETRY_OUTPUTS, LIGHTING_INPUTS, FULLSCREEN_VERTEX_SHADER
+from software_rasterizer import transform_vertices
 import math
-import random
+
+# Interleaved layout: position (x, y, z) + normal (nx, ny, nz)
+FLOATS_PER_VERTEX = 6
+FLOATS_PER_TRIANGLE = 3 * FLOATS_PER_VERTEX
+
+# Material table for the batched and deferred paths, stored in a std140 uniform block
+MAX_MATERIALS = 256
+MATERIAL_BLOCK_BINDING = 0
+
+# GLSL declaration of the material table
+MATERIALS_BLOCK = f"""
+        struct Material {{
+            vec4 color;   // rgb = object color
+            vec4 params;  // x = ambient, y = specular, z = shininess
+        }};
+        
+        layout (std140) uniform Materials {{
+            Material materials[{MAX_MATERIALS}];
+        }};
+"""
+
+# Lighting uniforms shared by the GL and software renderers
+LIGHT_POSITION = (1.0, 1.0, 2.0)
+VIEW_POSITION = (0.0, 0.0, 3.0)
+LIGHT_COLOR = (1.0, 1.0, 1.0)
+
+# Colored point lights scattered over the triangles' (x, y) extent, culled per tile
+POINT_LIGHT_COUNT = 64
+MAX_POINT_LIGHTS = 16384
+POINT_LIGHT_BOUNDS = ((-1.2, -0.7), (1.2, 1.2))
+
+# The Phong model shared by the forward and deferred fragment shaders; needs the
+# Light, Camera and tiled light declarations before it
+PHONG_LIGHTING = """
+        vec3 phongLighting(vec3 fragPos, vec3 normal, vec3 objectColor,
+                           float ambientStrength, float specularStrength, float shininess)
+        {
+            // Ambient lighting
+            vec3 ambient = ambientStrength * lightColor * lightIntensity;
+            
+            // Diffuse lighting
+            vec3 norm = normalize(normal);
+            vec3 lightDir = normalize(lightPos - fragPos);
+            float diff = max(dot(norm, lightDir), 0.0);
+            vec3 diffuse = diff * lightColor * lightIntensity;
+            
+            // Specular lighting
+            vec3 viewDir = normalize(viewPos - fragPos);
+            vec3 reflectDir = reflect(-lightDir, norm);
+            float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+            vec3 specular = specularStrength * spec * lightColor * lightIntensity;
+            
+            // Point lights affecting this fragment's screen tile
+            vec3 points = pointLighting(fragPos, norm, viewDir, specularStrength, shininess);
+            
+            // Combine all lighting components
+            return (ambient + diffuse + specular + points) * objectColor;
+        }
+"""
+
+def phong_fragment(light_intensity, point_lights, values):
+    """Software fragment shader: FragPos, Normal, then the flat material row per triangle"""
+    color = shade_phong(values[:, 0:3], values[:, 3:6], LIGHT_POSITION, VIEW_POSITION, values[:, 6:9],
+                        LIGHT_COLOR, values[:, 9], values[:, 10], values[:, 11], light_intensity)
+    points = shade_point_lights(values[:, 0:3], values[:, 3:6], VIEW_POSITION, *point_lights,
+                                values[:, 10], values[:, 11])
+    return color + points * values[:, 6:9]
 
 class AdvancedPhongTriangleDemo:
     def __init__(self):
         self.window = None
         self.shader_program = None
+        self.batched_program = None
+        self.geometry_program = None
+        self.lighting_program = None
         self.vao = None
+        self.screen_vao = None
+        self.gbuffer = None
         self.vbo = None
-        
-        # Multiple triangles for comparison
+        self.ebo = None
+        self.index_type = None
+        self.material_vbo = None
+        self.material_ubo = None
+        self.frame_uniforms = None
+        self.tiled_lights = None
+        
+        # Multiple triangles for comparison, packed into one interleaved array
         self.triangles = []
+        self.vertex_data = None
+        self.vertex_count = 0
+        self.indices = None
+        self.geometry_dirty = False
         self.generate_triangles()
         
         # Lighting parameters
@@ -41,8 +134,34 @@ class AdvancedPhongTriangleDemo:
         self.show_normals = False
         self.light_intensity = 1.0
         
+        # Point lights, regenerated when their count changes
+        self.point_light_count = POINT_LIGHT_COUNT
+        self.point_lights = random_point_lights(POINT_LIGHT_COUNT, *POINT_LIGHT_BOUNDS)
+        self.lights_dirty = False
+        
+        # Mouse state
+        self.mouse_x = 0.0
+        self.mouse_y = 0.0
+        self.camera_angle_x = 0.0
+        self.camera_angle_y = 0.0
+        self.zoom = 1.0
+        
+        # Batched mode draws every triangle in one call, reading materials
+        # from a uniform block instead of per-triangle uniforms
+        self.batched = True
+        
+        # Deferred mode writes a G-buffer and lights each covered pixel exactly once
+        self.deferred = False
+        
+        # Model/view/projection matrices, rebuilt in place every frame
+        self.transform = MvpTransform(aspect=1000.0 / 800.0, distance=5.0)
+        
+        # Per-phase frame timing, replaced by a FrameProfiler when benchmarking
+        self.profiler = NullProfiler()
+        
     def init_glfw(self):
         """Initialize GLFW and create window"""
+        require_opengl()
         if not glfw.init():
             raise RuntimeError("Failed to initialize GLFW")
         
@@ -64,19 +183,10 @@ class AdvancedPhongTriangleDemo:
         glfw.set_cursor_pos_callback(self.window, self.cursor_callback)
         glfw.set_scroll_callback(self.window, self.scroll_callback)
         
-        # Enable depth testing
-        glEnable(GL_DEPTH_TEST)
-        
-        # Mouse state
-        self.mouse_x = 0.0
-        self.mouse_y = 0.0
-        self.camera_angle_x = 0.0
-        self.camera_angle_y = 0.0
-        self.zoom = 1.0
-        
     def window_size_callback(self, window, width, height):
         """Handle window resize"""
         glViewport(0, 0, width, height)
+        self.transform.projection.resize(width, height)
         
     def key_callback(self, window, key, scancode, action, mods):
         """Handle keyboard input"""
@@ -87,6 +197,12 @@ class AdvancedPhongTriangleDemo:
             elif key == glfw.KEY_M:
                 self.current_material = (self.current_material + 1) % len(self.materials)
                 print(f"Switched to material {self.current_material + 1}")
+            elif key == glfw.KEY_B:
+                self.batched = not self.batched
+                print(f"Rendering mode: {'Batched' if self.batched else 'Per-triangle'}")
+            elif key == glfw.KEY_D:
+                self.deferred = not self.deferred
+                print(f"Shading: {'Deferred' if self.deferred else 'Forward'}")
             elif key == glfw.KEY_N:
                 self.show_normals = not self.show_normals
                 print(f"Normal visualization: {'ON' if self.show_normals else 'OFF'}")
@@ -96,6 +212,10 @@ class AdvancedPhongTriangleDemo:
             elif key == glfw.KEY_DOWN:
                 self.light_intensity = max(0.1, self.light_intensity - 0.1)
                 print(f"Light intensity: {self.light_intensity:.1f}")
+            elif key == glfw.KEY_RIGHT_BRACKET:
+                self.set_point_light_count(max(1, self.point_light_count * 2))
+            elif key == glfw.KEY_LEFT_BRACKET:
+                self.set_point_light_count(self.point_light_count // 2)
             elif key == glfw.KEY_ESCAPE:
                 glfw.set_window_should_close(window, True)
                 
@@ -116,6 +236,13 @@ class AdvancedPhongTriangleDemo:
         self.zoom *= (1.0 + yoffset * 0.1)
         self.zoom = max(0.1, min(5.0, self.zoom))
         
+    def set_point_light_count(self, count):
+        """Replace the point lights with count new ones"""
+        self.point_light_count = min(count, MAX_POINT_LIGHTS)
+        self.point_lights = random_point_lights(self.point_light_count, *POINT_LIGHT_BOUNDS)
+        self.lights_dirty = True
+        print(f"Point lights: {self.point_light_count}")
+        
     def generate_triangles(self):
         """Generate multiple triangles with different normal configurations"""
         self.triangles = []
@@ -129,14 +256,7 @@ class AdvancedPhongTriangleDemo:
         ], dtype=np.float32)
         
         # Generate random normals
-        for i in range(3):
-            nx = random.uniform(-1.0, 1.0)
-            ny = random.uniform(-1.0, 1.0)
-            nz = random.uniform(0.0, 1.0)
-            length = math.sqrt(nx*nx + ny*ny + nz*nz)
-            triangle1[i*6 + 3] = nx / length
-            triangle1[i*6 + 4] = ny / length
-            triangle1[i*6 + 5] = nz / length
+        triangle1.reshape(-1, 6)[:, 3:6] = random_normals(3)
         
         # Triangle 2: Smooth normals (realistic)
         triangle2 = np.array([
@@ -154,117 +274,183 @@ class AdvancedPhongTriangleDemo:
              0.0,  1.0, 0.0,  0.0, 0.0, 1.0,  # Top
         ], dtype=np.float32)
         
-        # Generate varied normals for triangle 3
-        for i in range(3):
-            angle = i * 2 * math.pi / 3
-            nx = math.cos(angle) * 0.5
-            ny = math.sin(angle) * 0.5
-            nz = 0.8
-            length = math.sqrt(nx*nx + ny*ny + nz*nz)
-            triangle3[i*6 + 3] = nx / length
-            triangle3[i*6 + 4] = ny / length
-            triangle3[i*6 + 5] = nz / length
+        # Generate varied normals for triangle 3, fanned around +z
+        triangle3.reshape(-1, 6)[:, 3:6] = radial_normals(3)
         
         self.triangles = [triangle1, triangle2, triangle3]
+        self.pack_triangles()
+        
+    def pack_triangles(self):
+        """Concatenate all triangles into one interleaved vertex array"""
+        self.vertex_data = np.concatenate(self.triangles)
+        self.vertex_count = len(self.vertex_data) // FLOATS_PER_VERTEX
+        self.triangles = [
+            self.vertex_data[i * FLOATS_PER_TRIANGLE:(i + 1) * FLOATS_PER_TRIANGLE]
+            for i in range(self.vertex_count // 3)
+        ]
+        
+        # Corners drawn through an element buffer like the other Phong demos. Every
+        # corner has its own normal and material, so no vertex is shared here
+        self.indices = compact_indices(np.arange(self.vertex_count))
+        
+        # Bounding box of the scene (center, half extents), for the deferred scissor rectangle
+        positions = self.vertex_data.reshape(-1, FLOATS_PER_VERTEX)[:, :3]
+        low, high = positions.min(axis=0), positions.max(axis=0)
+        self.bounds = ((low + high)[np.newaxis] * 0.5, (high - low)[np.newaxis] * 0.5)
+        self.geometry_dirty = True
+        
+    def triangle_material_ids(self):
+        """Material index of every triangle (triangle i uses material i, cycling)"""
+        return np.arange(self.vertex_count // 3, dtype=np.int32) % len(self.materials)
         
     def create_shaders(self):
         """Create and compile shaders"""
         # Vertex shader source
-        vertex_shader_source = """
+        vertex_shader_source = f"""
         #version 330 core
         layout (location = 0) in vec3 aPos;
         layout (location = 1) in vec3 aNormal;
-        
-        uniform mat4 mvp;
-        
+        {CAMERA_BLOCK}
         out vec3 FragPos;
         out vec3 Normal;
         
         void main()
-        {
+        {{
             FragPos = aPos;
             Normal = aNormal;
             gl_Position = mvp * vec4(aPos, 1.0);
-        }
+        }}
         """
         
         # Fragment shader source with enhanced Phong lighting
-        fragment_shader_source = """
+        fragment_shader_source = f"""
         #version 330 core
         out vec4 FragColor;
         
         in vec3 FragPos;
         in vec3 Normal;
-        
-        uniform vec3 lightPos;
-        uniform vec3 viewPos;
+        {CAMERA_BLOCK}{LIGHT_BLOCK}{TILED_LIGHTS}{PHONG_LIGHTING}
         uniform vec3 objectColor;
-        uniform vec3 lightColor;
         uniform float ambientStrength;
         uniform float specularStrength;
         uniform int shininess;
-        uniform float lightIntensity;
         
         void main()
-        {
-            // Ambient lighting
-            vec3 ambient = ambientStrength * lightColor * lightIntensity;
-            
-            // Diffuse lighting
-            vec3 norm = normalize(Normal);
-            vec3 lightDir = normalize(lightPos - FragPos);
-            float diff = max(dot(norm, lightDir), 0.0);
-            vec3 diffuse = diff * lightColor * lightIntensity;
-            
-            // Specular lighting
-            vec3 viewDir = normalize(viewPos - FragPos);
-            vec3 reflectDir = reflect(-lightDir, norm);
-            float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
-            vec3 specular = specularStrength * spec * lightColor * lightIntensity;
+        {{
+            vec3 result = phongLighting(FragPos, Normal, objectColor, ambientStrength, specularStrength, float(shininess));
+            FragColor = vec4(result, 1.0);
+        }}
+        """
+        
+        # Compile and link (or load from the program binary cache)
+        self.shader_program = create_program(vertex_shader_source, fragment_shader_source)
+        print(f"Shaders loaded {self.shader_program.build_summary()}")
+        bind_uniform_blocks(self.shader_program)
+        
+        # Batched vertex shader: forwards the per-vertex material index
+        batched_vertex_shader_source = f"""
+        #version 330 core
+        layout (location = 0) in vec3 aPos;
+        layout (location = 1) in vec3 aNormal;
+        layout (location = 2) in int aMaterial;
+        {CAMERA_BLOCK}
+        out vec3 FragPos;
+        out vec3 Normal;
+        flat out int MaterialIndex;
+        
+        void main()
+        {{
+            FragPos = aPos;
+            Normal = aNormal;
+            MaterialIndex = aMaterial;
+            gl_Position = mvp * vec4(aPos, 1.0);
+        }}
+        """
+        
+        # Batched fragment shader: same lighting, material read from a uniform block
+        batched_fragment_shader_source = f"""
+        #version 330 core
+        out vec4 FragColor;
+        
+        in vec3 FragPos;
+        in vec3 Normal;
+        flat in int MaterialIndex;
+        {MATERIALS_BLOCK}{CAMERA_BLOCK}{LIGHT_BLOCK}{TILED_LIGHTS}{PHONG_LIGHTING}
+        void main()
+        {{
+            Material material = materials[MaterialIndex];
+            vec3 result = phongLighting(FragPos, Normal, material.color.rgb,
+                                        material.params.x, material.params.y, material.params.z);
+            FragColor = vec4(result, 1.0);
+        }}
+        """
+        
+        self.batched_program = create_program(batched_vertex_shader_source, batched_fragment_shader_source)
+        print(f"Batched shaders loaded {self.batched_program.build_summary()}")
+        self.bind_materials(self.batched_program)
+        
+        # Deferred geometry pass: no lighting, just what the lighting pass needs per pixel
+        geometry_fragment_shader_source = f"""
+        #version 330 core
+        in vec3 FragPos;
+        in vec3 Normal;
+        flat in int MaterialIndex;
+        {GEOMETRY_OUTPUTS}
+        void main()
+        {{
+            gPosition = vec4(FragPos, 1.0);
+            gNormal = vec4(normalize(Normal), 0.0);
+            gMaterial = MaterialIndex;
+        }}
+        """
+        
+        self.geometry_program = create_program(batched_vertex_shader_source, geometry_fragment_shader_source)
+        print(f"Geometry pass shaders loaded {self.geometry_program.build_summary()}")
+        bind_uniform_blocks(self.geometry_program)
+        
+        # Deferred lighting pass: one full-screen triangle, lighting every covered pixel once
+        lighting_fragment_shader_source = f"""
+        #version 330 core
+        out vec4 FragColor;
+        {LIGHTING_INPUTS}{MATERIALS_BLOCK}{CAMERA_BLOCK}{LIGHT_BLOCK}{TILED_LIGHTS}{PHONG_LIGHTING}
+        void main()
+        {{
+            ivec2 pixel = ivec2(gl_FragCoord.xy);
+            int materialIndex = texelFetch(gMaterial, pixel, 0).r;
+            if (materialIndex < 0)
+                discard;  // background, keeps the clear color
             
-            // Combine all lighting components
-            vec3 result = (ambient + diffuse + specular) * objectColor;
+            Material material = materials[materialIndex];
+            vec3 fragPos = texelFetch(gPosition, pixel, 0).xyz;
+            vec3 normal = texelFetch(gNormal, pixel, 0).xyz;
+            vec3 result = phongLighting(fragPos, normal, material.color.rgb,
+                                        material.params.x, material.params.y, material.params.z);
             FragColor = vec4(result, 1.0);
-        }
+        }}
         """
         
-        # Compile vertex shader
-        vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-        glShaderSource(vertex_shader, vertex_shader_source)
-        glCompileShader(vertex_shader)
-        
-        # Check vertex shader compilation
-        success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(vertex_shader)
-            raise RuntimeError(f"Vertex shader compilation failed: {info_log}")
-        
-        # Compile fragment shader
-        fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-        glShaderSource(fragment_shader, fragment_shader_source)
-        glCompileShader(fragment_shader)
-        
-        # Check fragment shader compilation
-        success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(fragment_shader)
-            raise RuntimeError(f"Fragment shader compilation failed: {info_log}")
-        
-        # Create shader program
-        self.shader_program = glCreateProgram()
-        glAttachShader(self.shader_program, vertex_shader)
-        glAttachShader(self.shader_program, fragment_shader)
-        glLinkProgram(self.shader_program)
-        
-        # Check program linking
-        success = glGetProgramiv(self.shader_program, GL_LINK_STATUS)
-        if not success:
-            info_log = glGetProgramInfoLog(self.shader_program)
-            raise RuntimeError(f"Shader program linking failed: {info_log}")
-        
-        # Clean up shaders
-        glDeleteShader(vertex_shader)
-        glDeleteShader(fragment_shader)
+        self.lighting_program = create_program(FULLSCREEN_VERTEX_SHADER, lighting_fragment_shader_source)
+        print(f"Lighting pass shaders loaded {self.lighting_program.build_summary()}")
+        self.bind_materials(self.lighting_program)
+        
+    def bind_materials(self, program):
+        """Point a program's material table and shared blocks at their binding points"""
+        block_index = glGetUniformBlockIndex(program.program, "Materials")
+        glUniformBlockBinding(program.program, block_index, MATERIAL_BLOCK_BINDING)
+        bind_uniform_blocks(program)
+        
+    def setup(self):
+        """Create GL resources once a context (window or headless) is current"""
+        # Enable depth testing
+        glEnable(GL_DEPTH_TEST)
+        
+        self.create_shaders()
+        self.setup_buffers()
+        self.generate_triangles()
+        
+    def setup_software(self):
+        """Prepare for render_software(), drawing the same random normals setup() would"""
+        self.generate_triangles()
         
     def setup_buffers(self):
         """Setup VAO and VBO"""
@@ -284,113 +470,199 @@ class AdvancedPhongTriangleDemo:
         glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 6 * 4, ctypes.c_void_p(3 * 4))
         glEnableVertexAttribArray(1)
         
-        # Unbind
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        # Material index attribute (location = 2), one int per vertex
+        self.material_vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.material_vbo)
+        glVertexAttribIPointer(2, 1, GL_INT, 4, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(2)
+        
+        # Element buffer, recorded by the VAO
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+        self.index_type = GL_UNSIGNED_SHORT if self.indices.dtype == np.uint16 else GL_UNSIGNED_INT
+        
+        # Unbind (the VAO first, so it keeps the element buffer)
         glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
         
-    def create_mvp_matrix(self):
-        """Create Model-View-Projection matrix"""
-        # Model matrix (rotation around Y axis)
-        model = np.eye(4, dtype=np.float32)
-        cos_angle = math.cos(self.rotation_angle)
-        sin_angle = math.sin(self.rotation_angle)
-        model[0, 0] = cos_angle
-        model[0, 2] = sin_angle
-        model[2, 0] = -sin_angle
-        model[2, 2] = cos_angle
-        
-        # View matrix with mouse control
-        view = np.eye(4, dtype=np.float32)
-        
-        # Apply camera rotation
-        cos_x = math.cos(self.camera_angle_x)
-        sin_x = math.sin(self.camera_angle_x)
-        cos_y = math.cos(self.camera_angle_y)
-        sin_y = math.sin(self.camera_angle_y)
-        
-        # Rotation around X axis
-        view[1, 1] = cos_x
-        view[1, 2] = sin_x
-        view[2, 1] = -sin_x
-        view[2, 2] = cos_x
-        
-        # Rotation around Y axis
-        temp = view.copy()
-        view[0, 0] = cos_y
-        view[0, 2] = -sin_y
-        view[2, 0] = sin_y
-        view[2, 2] = cos_y
-        view = np.dot(view, temp)
-        
-        # Apply zoom and translation
-        view[2, 3] = -5.0 / self.zoom
-        
-        # Projection matrix (perspective)
-        fov = 45.0
-        aspect = 1000.0 / 800.0
-        near = 0.1
-        far = 100.0
-        
-        projection = np.zeros((4, 4), dtype=np.float32)
-        f = 1.0 / math.tan(math.radians(fov) / 2.0)
-        projection[0, 0] = f / aspect
-        projection[1, 1] = f
-        projection[2, 2] = (far + near) / (near - far)
-        projection[2, 3] = (2 * far * near) / (near - far)
-        projection[3, 2] = -1.0
-        
-        # Combine matrices: MVP = Projection * View * Model
-        mvp = np.dot(projection, np.dot(view, model))
-        return mvp
+        # Material table uniform buffer
+        self.material_ubo = glGenBuffers(1)
+        
+        # Camera and light blocks shared by both programs
+        self.frame_uniforms = FrameUniforms()
+        
+        # Point lights and per-tile light lists
+        self.tiled_lights = TiledLights()
+        self.tiled_lights.set_lights(*self.point_lights)
+        
+        # Deferred shading: G-buffer (sized on first use) and the full-screen pass's empty VAO
+        self.gbuffer = GBuffer()
+        self.screen_vao = glGenVertexArrays(1)
+        self.upload_materials()
+        self.upload_geometry()
+        
+    def upload_geometry(self):
+        """Upload the packed triangles and their per-vertex material indices"""
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.vertex_data.nbytes, self.vertex_data, GL_STATIC_DRAW)
+        
+        material_ids = np.repeat(self.triangle_material_ids(), 3)
+        glBindBuffer(GL_ARRAY_BUFFER, self.material_vbo)
+        glBufferData(GL_ARRAY_BUFFER, material_ids.nbytes, material_ids, GL_STATIC_DRAW)
+        
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.geometry_dirty = False
+        
+    def upload_materials(self):
+        """Pack the material dicts into the std140 material uniform block"""
+        if len(self.materials) > MAX_MATERIALS:
+            raise RuntimeError(f"At most {MAX_MATERIALS} materials are supported")
+        
+        # Each Material is two vec4s: (r, g, b, -) and (ambient, specular, shininess, -)
+        table = np.zeros((MAX_MATERIALS, 8), dtype=np.float32)
+        for i, material in enumerate(self.materials):
+            table[i, 0:3] = material["color"]
+            table[i, 4] = material["ambient"]
+            table[i, 5] = material["specular"]
+            table[i, 6] = material["shininess"]
+        
+        glBindBuffer(GL_UNIFORM_BUFFER, self.material_ubo)
+        glBufferData(GL_UNIFORM_BUFFER, table.nbytes, table, GL_STATIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        glBindBufferBase(GL_UNIFORM_BUFFER, MATERIAL_BLOCK_BINDING, self.material_ubo)
         
     def render(self):
         """Render the triangles"""
         # Clear screen
         glClearColor(0.1, 0.1, 0.3, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.profiler.mark("draw")
+        
+        # Upload geometry if the triangles were regenerated
+        if self.geometry_dirty:
+            self.upload_geometry()
+        self.profiler.mark("buffers")
+        
+        # Use shader program (the lighting pass's, in deferred mode)
+        if self.deferred:
+            program = self.lighting_program
+        else:
+            program = self.batched_program if self.batched else self.shader_program
+        program.use()
+        
+        # Create the MVP matrix
+        self.transform.update_view(self.camera_angle_x, self.camera_angle_y, self.zoom)
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        
+        # Camera and lighting reach both programs through one uniform buffer upload
+        self.frame_uniforms.set_camera(mvp, VIEW_POSITION)
+        self.frame_uniforms.set_light(LIGHT_POSITION, LIGHT_COLOR, self.light_intensity)
+        self.frame_uniforms.upload()
+        self.profiler.mark("uniforms")
+        
+        # Re-cull the point lights for this frame's camera and viewport size
+        if self.lights_dirty:
+            self.tiled_lights.set_lights(*self.point_lights)
+            self.lights_dirty = False
+        _, _, width, height = glGetIntegerv(GL_VIEWPORT)
+        self.tiled_lights.update(mvp, int(width), int(height))
+        self.tiled_lights.bind(program)
+        self.profiler.mark("buffers")
+        
+        if self.deferred:
+            self.render_deferred(mvp, int(width), int(height))
+        elif self.batched:
+            # Whole scene in one draw, materials come from the uniform block
+            glBindVertexArray(self.vao)
+            glDrawElements(GL_TRIANGLES, len(self.indices), self.index_type, None)
+        else:
+            glBindVertexArray(self.vao)
+            self.render_per_triangle(program)
+        
+        self.profiler.mark("draw")
+        
+        # Swap buffers (headless contexts render into an FBO instead)
+        if self.window:
+            glfw.swap_buffers(self.window)
+        self.profiler.mark("swap")
+        
+    def render_deferred(self, mvp, width, height):
+        """Geometry pass into the G-buffer, then one lighting pass into the current framebuffer"""
+        self.gbuffer.resize(width, height)
+        
+        # Both passes only touch the scene's screen rectangle, so the cost of the
+        # full-screen pass follows what is on screen rather than the window size
+        rect, visible = screen_bounds(*self.bounds, mvp, width, height)
+        if not visible[0]:
+            return
+        x0, y0 = np.clip(np.floor(rect[0, :2]), 0, (width, height)).astype(int)
+        x1, y1 = np.clip(np.ceil(rect[0, 2:]), 0, (width, height)).astype(int)
+        glEnable(GL_SCISSOR_TEST)
+        glScissor(x0, y0, x1 - x0, y1 - y0)
+        
+        # Geometry pass: every triangle in one draw, only the nearest fragment survives
+        self.gbuffer.begin()
+        self.geometry_program.use()
+        glBindVertexArray(self.vao)
+        glDrawElements(GL_TRIANGLES, len(self.indices), self.index_type, None)
+        self.gbuffer.end()
+        self.profiler.mark("draw")
+        
+        # Lighting pass: one full-screen triangle over the cleared target, no depth needed
+        self.lighting_program.use()
+        self.gbuffer.bind_textures(self.lighting_program)
+        glDisable(GL_DEPTH_TEST)
+        glBindVertexArray(self.screen_vao)
+        glDrawArrays(GL_TRIANGLES, 0, 3)
+        glEnable(GL_DEPTH_TEST)
+        glDisable(GL_SCISSOR_TEST)
         
-        # Use shader program
-        glUseProgram(self.shader_program)
-        
-        # Create and set MVP matrix
-        mvp = self.create_mvp_matrix()
-        mvp_loc = glGetUniformLocation(self.shader_program, "mvp")
-        glUniformMatrix4fv(mvp_loc, 1, GL_FALSE, mvp)
-        
-        # Set lighting uniforms
-        light_pos_loc = glGetUniformLocation(self.shader_program, "lightPos")
-        view_pos_loc = glGetUniformLocation(self.shader_program, "viewPos")
-        object_color_loc = glGetUniformLocation(self.shader_program, "objectColor")
-        light_color_loc = glGetUniformLocation(self.shader_program, "lightColor")
-        ambient_str_loc = glGetUniformLocation(self.shader_program, "ambientStrength")
-        specular_str_loc = glGetUniformLocation(self.shader_program, "specularStrength")
-        shininess_loc = glGetUniformLocation(self.shader_program, "shininess")
-        light_intensity_loc = glGetUniformLocation(self.shader_program, "lightIntensity")
-        
-        glUniform3f(light_pos_loc, 1.0, 1.0, 2.0)  # Light position
-        glUniform3f(view_pos_loc, 0.0, 0.0, 3.0)  # View position
-        glUniform3f(light_color_loc, 1.0, 1.0, 1.0)  # White light
-        glUniform1f(light_intensity_loc, self.light_intensity)
-        
-        # Render each triangle
-        for i, triangle in enumerate(self.triangles):
+    def render_per_triangle(self, program):
+        """Draw each triangle separately with its material set as uniforms"""
+        for i, material_id in enumerate(self.triangle_material_ids()):
             # Set material properties
-            material = self.materials[i]
-            glUniform3fv(object_color_loc, 1, material["color"])
-            glUniform1f(ambient_str_loc, material["ambient"])
-            glUniform1f(specular_str_loc, material["specular"])
-            glUniform1i(shininess_loc, material["shininess"])
-            
-            # Update VBO with current triangle data
-            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-            glBufferData(GL_ARRAY_BUFFER, triangle.nbytes, triangle, GL_DYNAMIC_DRAW)
+            material = self.materials[material_id]
+            program.set_vec3("objectColor", material["color"])
+            program.set_float("ambientStrength", material["ambient"])
+            program.set_float("specularStrength", material["specular"])
+            program.set_int("shininess", material["shininess"])
+            self.profiler.mark("uniforms")
             
-            # Draw triangle
-            glBindVertexArray(self.vao)
-            glDrawArrays(GL_TRIANGLES, 0, 3)
+            # Draw triangle from the shared VBO and element buffer
+            glDrawElements(GL_TRIANGLES, 3, self.index_type, ctypes.c_void_p(i * 3 * self.indices.itemsize))
+            self.profiler.mark("draw")
+        
+    def render_software(self, rasterizer):
+        """Render the triangles with the CPU rasterizer and the NumPy Phong kernel"""
+        rasterizer.clear((0.1, 0.1, 0.3, 1.0))
+        self.profiler.mark("draw")
+        
+        self.transform.update_view(self.camera_angle_x, self.camera_angle_y, self.zoom)
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        
+        # Varyings are FragPos and Normal, one material row per triangle is flat
+        vertices = self.vertex_data.reshape(-1, FLOATS_PER_VERTEX)
+        clip = transform_vertices(vertices[:, :3], mvp)[self.indices]
+        vertices = vertices[self.indices]
+        materials = np.array([
+            material["color"] + [material["ambient"], material["specular"], material["shininess"]]
+            for material in self.materials
+        ], dtype=np.float32)
+        flat = materials[self.triangle_material_ids()]
+        self.profiler.mark("uniforms")
         
-        # Swap buffers
-        glfw.swap_buffers(self.window)
+        fragment = functools.partial(phong_fragment, self.light_intensity, self.point_lights)
+        rasterizer.draw(clip, vertices, fragment, flat=flat)
+        self.profiler.mark("draw")
+        
+    def update(self, time):
+        """Advance the animation to the given time in seconds"""
+        self.time = time
+        self.rotation_angle = self.time * 0.3  # Slow rotation
         
     def run(self):
         """Main render loop"""
@@ -398,19 +670,20 @@ class AdvancedPhongTriangleDemo:
         print("Controls:")
         print("  R - Generate new random normals")
         print("  M - Switch material")
+        print("  B - Toggle batched / per-triangle rendering")
+        print("  D - Toggle deferred / forward shading")
         print("  N - Toggle normal visualization")
         print("  UP/DOWN - Adjust light intensity")
+        print("  [ / ] - Halve / double the point lights")
         print("  Mouse drag - Rotate camera")
         print("  Mouse scroll - Zoom")
         print("  ESC - Exit")
         
-        while not glfw.window_should_close(self.window):
+        # The scene rotates, so it needs a new frame every time round the loop
+        scheduler = RenderScheduler(self.window, animated=True)
+        while scheduler.next_frame():
             # Update time and rotation
-            self.time = glfw.get_time()
-            self.rotation_angle = self.time * 0.3  # Slow rotation
-            
-            # Handle input
-            glfw.poll_events()
+            self.update(glfw.get_time())
             
             # Render
             self.render()
@@ -421,8 +694,28 @@ class AdvancedPhongTriangleDemo:
             glDeleteVertexArrays(1, [self.vao])
         if self.vbo:
             glDeleteBuffers(1, [self.vbo])
+        if self.ebo:
+            glDeleteBuffers(1, [self.ebo])
+        if self.material_vbo:
+            glDeleteBuffers(1, [self.material_vbo])
+        if self.material_ubo:
+            glDeleteBuffers(1, [self.material_ubo])
+        if self.frame_uniforms:
+            self.frame_uniforms.delete()
+        if self.tiled_lights:
+            self.tiled_lights.delete()
+        if self.gbuffer:
+            self.gbuffer.delete()
+        if self.screen_vao:
+            glDeleteVertexArrays(1, [self.screen_vao])
         if self.shader_program:
-            glDeleteProgram(self.shader_program)
+            self.shader_program.delete()
+        if self.batched_program:
+            self.batched_program.delete()
+        if self.geometry_program:
+            self.geometry_program.delete()
+        if self.lighting_program:
+            self.lighting_program.delete()
         glfw.terminate()
 
 def main():
@@ -430,9 +723,7 @@ def main():
     try:
         demo = AdvancedPhongTriangleDemo()
         demo.init_glfw()
-        demo.create_shaders()
-        demo.setup_buffers()
-        demo.generate_triangles()
+        demo.setup()
         demo.run()
     except Exception as e:
         print(f"Error: {e}")
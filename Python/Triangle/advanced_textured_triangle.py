@@ -5,23 +5,87 @@ Multiple triangles with different textures and effects.
 """
 
 import numpy as np
+import functools
 import glfw
-from OpenGL.GL import *
+from gl_optional import *
+from shader_program import create_program
+from frame_profiler import NullProfiler
+from render_scheduler import RenderScheduler
+from transforms import MvpTransform, compose, model_matrices
+from texture_cache import create_texture
+from texture_loader import AsyncTextureLoader
+from texture_sampler import (EFFECT_PULSE, EFFECT_WAVE, effect_color, effect_texcoords,
+                             load_sampled_texture, triangle_lod)
+from software_rasterizer import transform_vertices
+from vertex_cache import compact_indices
 import math
-from PIL import Image
+import os
+
+# The demo texture ships next to this file
+ROSE_TEXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rose.png")
+
+# Interleaved layout: position (x, y, z) + texture coordinates (u, v)
+FLOATS_PER_VERTEX = 5
+FLOATS_PER_TRIANGLE = 3 * FLOATS_PER_VERTEX
+
+# Per-instance layout for the instanced path: offset (x, y, z), rotation, scale,
+# UV scale (u, v) and UV offset (u, v)
+FLOATS_PER_INSTANCE = 9
+DEFAULT_INSTANCE_COUNT = 10000
+MAX_INSTANCE_COUNT = 4 * 1024 * 1024
+
+# Unit triangle centered on the origin that every instance is drawn from
+BASE_TRIANGLE = np.array([
+    # Position (x, y, z), Texture coordinates (u, v)
+    -0.5, -0.433, 0.0,  0.0, 0.0,  # Bottom left
+     0.5, -0.433, 0.0,  1.0, 0.0,  # Bottom right
+     0.0,  0.433, 0.0,  0.5, 1.0,  # Top center
+], dtype=np.float32)
+
+def effect_fragment(texture, effect, time, brightness, values):
+    """Software fragment shader: the effect's texture lookup and color, black without a texture"""
+    tex_coord = values[:, 0:2]
+    if texture is None:
+        color = np.zeros((len(values), 4), dtype=np.float32)
+        color[:, 3] = 1.0
+    else:
+        uv, level = effect_texcoords(tex_coord, values[:, 2], effect, time)
+        color = texture.sample(uv, level)
+    return effect_color(color, tex_coord, effect, time, brightness)
 
 class AdvancedTexturedTriangleDemo:
-    def __init__(self):
+    def __init__(self, instanced=False, instance_count=DEFAULT_INSTANCE_COUNT):
         self.window = None
         self.shader_program = None
+        self.instanced_program = None
         self.vao = None
         self.vbo = None
+        self.ebo = None
+        self.index_type = None
         self.textures = []
+        self.texture_loader = None
+        self.sampled_texture = None
         
-        # Multiple triangles with different textures
+        # Multiple triangles with different textures, packed into one
+        # interleaved array so the whole scene lives in a single VBO
         self.triangles = []
+        self.vertex_data = None
+        self.vertex_count = 0
+        self.indices = None
+        self.dirty_triangles = set()
         self.generate_triangles()
         
+        # Instanced path: BASE_TRIANGLE drawn instance_count times with one
+        # glDrawArraysInstanced call, each copy placed by a per-instance attribute
+        self.instanced = instanced
+        self.instanced_vao = None
+        self.base_vbo = None
+        self.instance_vbo = None
+        self.instance_data = None
+        self.instance_count = 0
+        self.instances_dirty = False
+        self.generate_instances(instance_count)
+        
         # Animation parameters
         self.rotation_angle = 0.0
         self.time = 0.0
@@ -31,8 +95,22 @@ class AdvancedTexturedTriangleDemo:
         self.texture_scale = 1.0
         self.brightness = 1.0
         
+        # Mouse state
+        self.mouse_x = 0.0
+        self.mouse_y = 0.0
+        self.camera_angle_x = 0.0
+        self.camera_angle_y = 0.0
+        self.zoom = 1.0
+        
+        # Model/view/projection matrices, rebuilt in place every frame
+        self.transform = MvpTransform(aspect=1000.0 / 800.0, distance=5.0)
+        
+        # Per-phase frame timing, replaced by a FrameProfiler when benchmarking
+        self.profiler = NullProfiler()
+        
     def init_glfw(self):
         """Initialize GLFW and create window"""
+        require_opengl()
         if not glfw.init():
             raise RuntimeError("Failed to initialize GLFW")
         
@@ -54,19 +132,10 @@ class AdvancedTexturedTriangleDemo:
         glfw.set_cursor_pos_callback(self.window, self.cursor_callback)
         glfw.set_scroll_callback(self.window, self.scroll_callback)
         
-        # Enable depth testing
-        glEnable(GL_DEPTH_TEST)
-        
-        # Mouse state
-        self.mouse_x = 0.0
-        self.mouse_y = 0.0
-        self.camera_angle_x = 0.0
-        self.camera_angle_y = 0.0
-        self.zoom = 1.0
-        
     def window_size_callback(self, window, width, height):
         """Handle window resize"""
         glViewport(0, 0, width, height)
+        self.transform.projection.resize(width, height)
         
     def key_callback(self, window, key, scancode, action, mods):
         """Handle keyboard input"""
@@ -80,6 +149,15 @@ class AdvancedTexturedTriangleDemo:
             elif key == glfw.KEY_DOWN:
                 self.brightness = max(0.1, self.brightness - 0.1)
                 print(f"Brightness: {self.brightness:.1f}")
+            elif key == glfw.KEY_I:
+                self.instanced = not self.instanced
+                print(f"Rendering mode: {'Instanced' if self.instanced else 'Scene'}")
+            elif key == glfw.KEY_RIGHT_BRACKET:
+                self.generate_instances(self.instance_count * 2)
+                print(f"Instances: {self.instance_count}")
+            elif key == glfw.KEY_LEFT_BRACKET:
+                self.generate_instances(self.instance_count // 2)
+                print(f"Instances: {self.instance_count}")
             elif key == glfw.KEY_ESCAPE:
                 glfw.set_window_should_close(window, True)
                 
@@ -127,6 +205,51 @@ class AdvancedTexturedTriangleDemo:
         ], dtype=np.float32)
         
         self.triangles = [triangle1, triangle2, triangle3]
+        self.pack_triangles()
+        
+    def pack_triangles(self):
+        """Concatenate all triangles into one interleaved vertex array"""
+        self.vertex_data = np.concatenate(self.triangles)
+        self.vertex_count = len(self.vertex_data) // FLOATS_PER_VERTEX
+        
+        # Keep each triangle as a view into the packed array so that edits
+        # through self.triangles[i] land directly in the upload buffer
+        self.triangles = [
+            self.vertex_data[i * FLOATS_PER_TRIANGLE:(i + 1) * FLOATS_PER_TRIANGLE]
+            for i in range(self.vertex_count // 3)
+        ]
+        self.dirty_triangles.clear()
+        
+        # Corners drawn through an element buffer like textured_triangle.py. The
+        # triangles have their own texture coordinates, so no vertex is shared here
+        self.indices = compact_indices(np.arange(self.vertex_count))
+        
+    def update_triangle(self, index, data):
+        """Replace the vertex data of one triangle and mark it for re-upload"""
+        self.triangles[index][:] = data
+        self.dirty_triangles.add(index)
+        
+    def generate_instances(self, count):
+        """Lay out count copies of the base triangle on a grid with random rotation, scale and UVs"""
+        count = max(1, min(MAX_INSTANCE_COUNT, count))
+        
+        # Square grid over roughly [-2, 2] x [-2, 2], one cell per instance
+        side = int(math.ceil(math.sqrt(count)))
+        spacing = min(1.0, 4.0 / side)
+        index = np.arange(count)
+        
+        data = np.empty((count, FLOATS_PER_INSTANCE), dtype=np.float32)
+        data[:, 0] = (index % side + 0.5 - side / 2.0) * spacing
+        data[:, 1] = (index // side + 0.5 - side / 2.0) * spacing
+        data[:, 2] = 0.0
+        data[:, 3] = np.random.uniform(0.0, 2.0 * math.pi, count)
+        data[:, 4] = spacing * np.random.uniform(0.6, 1.0, count)
+        data[:, 5:7] = np.random.uniform(0.5, 1.0, (count, 1))
+        data[:, 7:9] = np.random.uniform(0.0, 1.0, (count, 2))
+        
+        self.instance_data = data
+        self.instance_count = count
+        self.instances_dirty = True
         
     def create_shaders(self):
         """Create and compile shaders"""
@@ -207,91 +330,105 @@ class AdvancedTexturedTriangleDemo:
         }
         """
         
-        # Compile vertex shader
-        vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-        glShaderSource(vertex_shader, vertex_shader_source)
-        glCompileShader(vertex_shader)
-        
-        # Check vertex shader compilation
-        success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(vertex_shader)
-            raise RuntimeError(f"Vertex shader compilation failed: {info_log}")
-        
-        # Compile fragment shader
-        fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-        glShaderSource(fragment_shader, fragment_shader_source)
-        glCompileShader(fragment_shader)
-        
-        # Check fragment shader compilation
-        success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(fragment_shader)
-            raise RuntimeError(f"Fragment shader compilation failed: {info_log}")
-        
-        # Create shader program
-        self.shader_program = glCreateProgram()
-        glAttachShader(self.shader_program, vertex_shader)
-        glAttachShader(self.shader_program, fragment_shader)
-        glLinkProgram(self.shader_program)
-        
-        # Check program linking
-        success = glGetProgramiv(self.shader_program, GL_LINK_STATUS)
-        if not success:
-            info_log = glGetProgramInfoLog(self.shader_program)
-            raise RuntimeError(f"Shader program linking failed: {info_log}")
-        
-        # Clean up shaders
-        glDeleteShader(vertex_shader)
-        glDeleteShader(fragment_shader)
+        # Compile and link (or load from the program binary cache)
+        self.shader_program = create_program(vertex_shader_source, fragment_shader_source)
+        print(f"Shaders loaded {self.shader_program.build_summary()}")
+        
+        # Instanced vertex shader: places each copy of the base triangle from
+        # per-instance attributes, then applies the same effects
+        instanced_vertex_shader_source = """
+        #version 330 core
+        layout (location = 0) in vec3 aPos;
+        layout (location = 1) in vec2 aTexCoord;
+        layout (location = 2) in vec3 iOffset;
+        layout (location = 3) in vec2 iRotationScale;
+        layout (location = 4) in vec4 iUvTransform;
+        
+        uniform mat4 mvp;
+        uniform float time;
+        uniform int effect;
+        
+        out vec2 TexCoord;
+        out float VertexTime;
+        
+        void main()
+        {
+            // Rotate in the XY plane, scale, then move to the instance position
+            float c = cos(iRotationScale.x);
+            float s = sin(iRotationScale.x);
+            vec3 pos = vec3(mat2(c, s, -s, c) * aPos.xy * iRotationScale.y, aPos.z) + iOffset;
+            
+            // Apply effects
+            if (effect == 1) { // Wave effect
+                pos.y += sin(pos.x * 3.0 + time * 2.0) * 0.1;
+            } else if (effect == 2) { // Pulse effect
+                float scale = 1.0 + sin(time * 3.0) * 0.2;
+                pos *= scale;
+            }
+            
+            gl_Position = mvp * vec4(pos, 1.0);
+            TexCoord = aTexCoord * iUvTransform.xy + iUvTransform.zw;
+            VertexTime = time;
+        }
+        """
+        
+        self.instanced_program = create_program(instanced_vertex_shader_source, fragment_shader_source)
+        print(f"Instanced shaders loaded {self.instanced_program.build_summary()}")
         
     def load_texture(self, image_path):
         """Load texture from image file"""
         try:
-            # Load image using PIL
-            img = Image.open(image_path)
-            
-            # Convert to RGBA if not already
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Flip image vertically to match OpenGL coordinate system
-            # (OpenGL has (0,0) at bottom-left, images have (0,0) at top-left)
-            img = img.transpose(Image.FLIP_TOP_BOTTOM)
-            
-            # Get image data
-            img_data = np.array(img, dtype=np.uint8)
-            width, height = img.size
-            
-            # Generate texture
-            texture = glGenTextures(1)
-            glBindTexture(GL_TEXTURE_2D, texture)
-            
-            # Set texture parameters
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            
-            # Upload texture data
-            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-            
+            # Decoded, flipped and mipmapped once, then memory-mapped from the cache
+            texture, width, height, from_cache = create_texture(image_path)
             self.textures.append(texture)
-            print(f"Texture loaded successfully: {width}x{height}")
+            
+            source = "texture cache" if from_cache else "decoded image"
+            print(f"Texture loaded successfully: {width}x{height} (from {source})")
             return True
             
         except Exception as e:
             print(f"Failed to load texture: {e}")
             return False
             
+    def texture_loaded(self, texture, width, height):
+        """Swap the streamed-in texture in for the placeholder"""
+        self.textures[self.textures.index(self.texture_loader.placeholder)] = texture
+        print(f"Texture streamed in: {width}x{height}")
+        
+    def setup(self, async_textures=False):
+        """Create GL resources once a context (window or headless) is current"""
+        # Enable depth testing
+        glEnable(GL_DEPTH_TEST)
+        
+        self.create_shaders()
+        self.setup_buffers()
+        self.setup_instanced_buffers()
+        
+        # Load texture, or show a placeholder while it decodes and streams in
+        if async_textures:
+            self.texture_loader = AsyncTextureLoader()
+            self.textures.append(self.texture_loader.placeholder)
+            self.texture_loader.load(ROSE_TEXTURE, self.texture_loaded)
+        elif not self.load_texture(ROSE_TEXTURE):
+            print("Warning: Could not load rose.png")
+        
+    def setup_software(self):
+        """Load the texture for render_software() into a NumPy sampler"""
+        try:
+            self.sampled_texture = load_sampled_texture(ROSE_TEXTURE)
+            print(f"Texture loaded for software rendering: {self.sampled_texture.width}x{self.sampled_texture.height}")
+        except Exception as e:
+            print(f"Failed to load texture: {e}")
+        
     def setup_buffers(self):
         """Setup VAO and VBO"""
         # Generate and bind VAO
         self.vao = glGenVertexArrays(1)
         glBindVertexArray(self.vao)
         
-        # Generate and bind VBO
+        # Generate VBO and upload all triangles once
         self.vbo = glGenBuffers(1)
+        self.upload_triangles()
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
         
         # Position attribute (location = 0)
@@ -302,107 +439,187 @@ class AdvancedTexturedTriangleDemo:
         glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, 5 * 4, ctypes.c_void_p(3 * 4))
         glEnableVertexAttribArray(1)
         
-        # Unbind
+        # Element buffer, recorded by the VAO
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+        self.index_type = GL_UNSIGNED_SHORT if self.indices.dtype == np.uint16 else GL_UNSIGNED_INT
+        
+        # Unbind (the VAO first, so it keeps the element buffer)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        
+    def setup_instanced_buffers(self):
+        """Setup the VAO for the instanced path: base triangle + per-instance attributes"""
+        self.instanced_vao = glGenVertexArrays(1)
+        glBindVertexArray(self.instanced_vao)
+        
+        # Base triangle, shared by every instance
+        self.base_vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.base_vbo)
+        glBufferData(GL_ARRAY_BUFFER, BASE_TRIANGLE.nbytes, BASE_TRIANGLE, GL_STATIC_DRAW)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, FLOATS_PER_VERTEX * 4, ctypes.c_void_p(0))
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, FLOATS_PER_VERTEX * 4, ctypes.c_void_p(3 * 4))
+        glEnableVertexAttribArray(1)
+        
+        # Per-instance attributes advance once per instance (divisor 1)
+        self.instance_vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        stride = FLOATS_PER_INSTANCE * 4
+        for location, size, offset in ((2, 3, 0), (3, 2, 3), (4, 4, 5)):
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset * 4))
+            glEnableVertexAttribArray(location)
+            glVertexAttribDivisor(location, 1)
+        
         glBindBuffer(GL_ARRAY_BUFFER, 0)
         glBindVertexArray(0)
         
-    def create_mvp_matrix(self):
-        """Create Model-View-Projection matrix"""
-        # Model matrix (rotation around Y axis)
-        model = np.eye(4, dtype=np.float32)
-        cos_angle = math.cos(self.rotation_angle)
-        sin_angle = math.sin(self.rotation_angle)
-        model[0, 0] = cos_angle
-        model[0, 2] = sin_angle
-        model[2, 0] = -sin_angle
-        model[2, 2] = cos_angle
-        
-        # View matrix with mouse control
-        view = np.eye(4, dtype=np.float32)
-        
-        # Apply camera rotation
-        cos_x = math.cos(self.camera_angle_x)
-        sin_x = math.sin(self.camera_angle_x)
-        cos_y = math.cos(self.camera_angle_y)
-        sin_y = math.sin(self.camera_angle_y)
-        
-        # Rotation around X axis
-        view[1, 1] = cos_x
-        view[1, 2] = sin_x
-        view[2, 1] = -sin_x
-        view[2, 2] = cos_x
-        
-        # Rotation around Y axis
-        temp = view.copy()
-        view[0, 0] = cos_y
-        view[0, 2] = -sin_y
-        view[2, 0] = sin_y
-        view[2, 2] = cos_y
-        view = np.dot(view, temp)
-        
-        # Apply zoom and translation
-        view[2, 3] = -5.0 / self.zoom
-        
-        # Projection matrix (perspective)
-        fov = 45.0
-        aspect = 1000.0 / 800.0
-        near = 0.1
-        far = 100.0
-        
-        projection = np.zeros((4, 4), dtype=np.float32)
-        f = 1.0 / math.tan(math.radians(fov) / 2.0)
-        projection[0, 0] = f / aspect
-        projection[1, 1] = f
-        projection[2, 2] = (far + near) / (near - far)
-        projection[2, 3] = (2 * far * near) / (near - far)
-        projection[3, 2] = -1.0
-        
-        # Combine matrices: MVP = Projection * View * Model
-        mvp = np.dot(projection, np.dot(view, model))
-        return mvp
+    def upload_instances(self):
+        """(Re)allocate the instance VBO with the current instance data"""
+        glBindBuffer(GL_ARRAY_BUFFER, self.instance_vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.instance_data.nbytes, self.instance_data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.instances_dirty = False
+        
+    def upload_triangles(self):
+        """(Re)allocate the VBO with the full packed vertex array"""
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.vertex_data.nbytes, self.vertex_data, GL_STATIC_DRAW)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.dirty_triangles.clear()
+        
+    def flush_dirty_triangles(self):
+        """Re-upload only the triangles that changed since the last frame"""
+        if not self.dirty_triangles:
+            return
+        
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        
+        # Merge adjacent dirty triangles into contiguous ranges so each
+        # range costs a single glBufferSubData call
+        dirty = sorted(self.dirty_triangles)
+        start = end = dirty[0]
+        for index in dirty[1:] + [None]:
+            if index == end + 1:
+                end = index
+                continue
+            first = start * FLOATS_PER_TRIANGLE
+            last = (end + 1) * FLOATS_PER_TRIANGLE
+            chunk = self.vertex_data[first:last]
+            glBufferSubData(GL_ARRAY_BUFFER, first * 4, chunk.nbytes, chunk)
+            if index is not None:
+                start = end = index
+        
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        self.dirty_triangles.clear()
         
     def render(self):
         """Render the textured triangles"""
         # Clear screen
         glClearColor(0.1, 0.1, 0.2, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.profiler.mark("draw")
+        
+        # Stream in pending texture data within this frame's upload budget
+        if self.texture_loader:
+            self.texture_loader.poll()
+        self.profiler.mark("buffers")
         
         # Use shader program
-        glUseProgram(self.shader_program)
+        program = self.instanced_program if self.instanced else self.shader_program
+        program.use()
         
         # Create and set MVP matrix
-        mvp = self.create_mvp_matrix()
-        mvp_loc = glGetUniformLocation(self.shader_program, "mvp")
-        glUniformMatrix4fv(mvp_loc, 1, GL_FALSE, mvp)
-        
-        # Set uniforms
-        time_loc = glGetUniformLocation(self.shader_program, "time")
-        effect_loc = glGetUniformLocation(self.shader_program, "effect")
-        brightness_loc = glGetUniformLocation(self.shader_program, "brightness")
+        self.transform.update_view(self.camera_angle_x, self.camera_angle_y, self.zoom)
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        program.set_mat4("mvp", mvp)
         
-        glUniform1f(time_loc, self.time)
-        glUniform1i(effect_loc, self.current_effect)
-        glUniform1f(brightness_loc, self.brightness)
+        # Set uniforms (unchanged values are not re-uploaded)
+        program.set_float("time", self.time)
+        program.set_int("effect", self.current_effect)
+        program.set_float("brightness", self.brightness)
         
         # Bind texture
         if self.textures:
             glActiveTexture(GL_TEXTURE0)
             glBindTexture(GL_TEXTURE_2D, self.textures[0])  # Use first texture for all triangles
-            texture_loc = glGetUniformLocation(self.shader_program, "ourTexture")
-            glUniform1i(texture_loc, 0)
-        
-        # Render each triangle
-        for triangle in self.triangles:
-            # Update VBO with current triangle data
-            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-            glBufferData(GL_ARRAY_BUFFER, triangle.nbytes, triangle, GL_DYNAMIC_DRAW)
-            
-            # Draw triangle
+            program.set_int("ourTexture", 0)
+        self.profiler.mark("uniforms")
+        
+        if self.instanced:
+            # Upload the instance table if it was regenerated, then draw every
+            # instance of the base triangle in one call
+            if self.instances_dirty:
+                self.upload_instances()
+            self.profiler.mark("buffers")
+            glBindVertexArray(self.instanced_vao)
+            glDrawArraysInstanced(GL_TRIANGLES, 0, 3, self.instance_count)
+        else:
+            # Upload any edited triangles, then draw the whole scene at once
+            self.flush_dirty_triangles()
+            self.profiler.mark("buffers")
             glBindVertexArray(self.vao)
-            glDrawArrays(GL_TRIANGLES, 0, 3)
-        
-        # Swap buffers
-        glfw.swap_buffers(self.window)
+            glDrawElements(GL_TRIANGLES, len(self.indices), self.index_type, None)
+        self.profiler.mark("draw")
+        
+        # Swap buffers (headless contexts render into an FBO instead)
+        if self.window:
+            glfw.swap_buffers(self.window)
+        self.profiler.mark("swap")
+        
+    def software_vertices(self):
+        """Object-space positions and texture coordinates the vertex shaders would see"""
+        if not self.instanced:
+            vertices = self.vertex_data.reshape(-1, FLOATS_PER_VERTEX)[self.indices]
+            return vertices[:, :3], vertices[:, 3:5]
+        
+        # Expand every instance of the base triangle like the instanced vertex shader:
+        # one model matrix per instance, applied to the base corners in one product
+        base = BASE_TRIANGLE.reshape(-1, FLOATS_PER_VERTEX)
+        data = self.instance_data
+        models = model_matrices(data[:, 0:3], data[:, 3], data[:, 4], axis="z")
+        corners = np.ones((3, 4), dtype=np.float32)
+        corners[:, :3] = base[:, :3]
+        
+        # Row vectors: corners @ model^T is (N, 3, 4), one x, y, z, w row per corner
+        positions = compose(corners, models.transpose(0, 2, 1))[..., :3]
+        uvs = base[:, 3:5] * data[:, np.newaxis, 5:7] + data[:, np.newaxis, 7:9]
+        return positions.reshape(-1, 3), uvs.reshape(-1, 2)
+        
+    def render_software(self, rasterizer):
+        """Render the current mode with the CPU rasterizer and NumPy sampler"""
+        rasterizer.clear((0.1, 0.1, 0.2, 1.0))
+        self.profiler.mark("draw")
+        
+        self.transform.update_view(self.camera_angle_x, self.camera_angle_y, self.zoom)
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        
+        # Vertex shader effects
+        positions, uvs = self.software_vertices()
+        if self.current_effect == EFFECT_WAVE:
+            positions[:, 1] += np.sin(positions[:, 0] * 3.0 + self.time * 2.0) * 0.1
+        elif self.current_effect == EFFECT_PULSE:
+            positions *= 1.0 + math.sin(self.time * 3.0) * 0.2
+        clip = transform_vertices(positions, mvp)
+        
+        texture = self.sampled_texture
+        lod = None
+        if texture:
+            lod = triangle_lod(clip, uvs, rasterizer.width, rasterizer.height, texture.width, texture.height)
+        self.profiler.mark("buffers")
+        
+        fragment = functools.partial(effect_fragment, texture, self.current_effect, self.time, self.brightness)
+        rasterizer.draw(clip, uvs, fragment, flat=lod)
+        self.profiler.mark("draw")
+        
+    def update(self, time):
+        """Advance the animation to the given time in seconds"""
+        self.time = time
+        self.rotation_angle = self.time * 0.3  # Slow rotation
         
     def run(self):
         """Main render loop"""
@@ -410,17 +627,17 @@ class AdvancedTexturedTriangleDemo:
         print("Controls:")
         print("  E - Switch effects (Normal, Wave, Pulse, Rainbow)")
         print("  UP/DOWN - Adjust brightness")
+        print("  I - Toggle instanced rendering")
+        print("  [ / ] - Halve / double the instance count")
         print("  Mouse drag - Rotate camera")
         print("  Mouse scroll - Zoom")
         print("  ESC - Exit")
         
-        while not glfw.window_should_close(self.window):
+        # The scene rotates, so it needs a new frame every time round the loop
+        scheduler = RenderScheduler(self.window, animated=True)
+        while scheduler.next_frame():
             # Update time and rotation
-            self.time = glfw.get_time()
-            self.rotation_angle = self.time * 0.3  # Slow rotation
-            
-            # Handle input
-            glfw.poll_events()
+            self.update(glfw.get_time())
             
             # Render
             self.render()
@@ -431,24 +648,35 @@ class AdvancedTexturedTriangleDemo:
             glDeleteVertexArrays(1, [self.vao])
         if self.vbo:
             glDeleteBuffers(1, [self.vbo])
+        if self.ebo:
+            glDeleteBuffers(1, [self.ebo])
+        if self.instanced_vao:
+            glDeleteVertexArrays(1, [self.instanced_vao])
+        if self.base_vbo:
+            glDeleteBuffers(2, [self.base_vbo, self.instance_vbo])
+        if self.texture_loader:
+            # The placeholder belongs to the loader
+            self.textures = [t for t in self.textures if t != self.texture_loader.placeholder]
+            self.texture_loader.shutdown()
         if self.textures:
             glDeleteTextures(len(self.textures), self.textures)
         if self.shader_program:
-            glDeleteProgram(self.shader_program)
+            self.shader_program.delete()
+        if self.instanced_program:
+            self.instanced_program.delete()
         glfw.terminate()
 
+class InstancedTexturedTriangleDemo(AdvancedTexturedTriangleDemo):
+    """The advanced textured demo starting in instanced mode (used by the headless tools)"""
+    def __init__(self, instance_count=DEFAULT_INSTANCE_COUNT):
+        super().__init__(instanced=True, instance_count=instance_count)
+
 def main():
     """Main function"""
     try:
         demo = AdvancedTexturedTriangleDemo()
         demo.init_glfw()
-        demo.create_shaders()
-        demo.setup_buffers()
-        
-        # Load texture
-        if not demo.load_texture('rose.png'):
-            print("Warning: Could not load rose.png")
-        
+        demo.setup(async_textures=True)
         demo.run()
     except Exception as e:
         print(f"Error: {e}")
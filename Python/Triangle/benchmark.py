@@ -0,0 +1,274 @@
+#!/usr/bin/env python3
+"""
+Triangle Demo Benchmark
+Drives each demo for a fixed number of frames at a fixed timestep and reports CPU,
+GPU (GL_TIME_ELAPSED) and per-phase render() times as JSON or CSV percentiles.
+"""
+
+import argparse
+import csv
+import ctypes
+import json
+import os
+import sys
+import time
+import numpy as np
+
+from frame_profiler import PHASES, FrameProfiler
+from offscreen import BACKENDS, select_platform
+from render_headless import DEMOS, SOFTWARE_BACKEND
+
+PERCENTILES = (50, 90, 95, 99)
+
+# Timer queries are read back a few frames late so the CPU never waits on the GPU
+QUERY_LATENCY = 4
+
+def summarize(samples):
+    """Mean, percentiles and extremes of a list of millisecond samples"""
+    values = np.asarray(samples, dtype=np.float64)
+    summary = {"mean": float(values.mean()), "min": float(values.min()), "max": float(values.max())}
+    for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{p}"] = float(value)
+    summary["stdev"] = float(values.std())
+    return summary
+
+class GpuTimer:
+    """Ring of GL_TIME_ELAPSED queries measuring GPU time per frame"""
+    
+    def __init__(self):
+        from OpenGL.GL import glGenQueries
+        self.queries = list(glGenQueries(QUERY_LATENCY))
+        self.pending = []
+        self.results = []
+    
+    def begin(self):
+        """Start timing a frame, collecting the oldest result if the ring is full"""
+        from OpenGL.GL import glBeginQuery, GL_TIME_ELAPSED
+        if len(self.pending) == QUERY_LATENCY:
+            self.collect(self.pending.pop(0))
+        
+        # Use whichever query is not still in flight
+        in_flight = set(self.pending)
+        query = next(q for q in self.queries if q not in in_flight)
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        self.pending.append(query)
+    
+    def end(self):
+        """Stop timing the current frame"""
+        from OpenGL.GL import glEndQuery, GL_TIME_ELAPSED
+        glEndQuery(GL_TIME_ELAPSED)
+    
+    def collect(self, query):
+        """Read one query result (nanoseconds) as milliseconds"""
+        from OpenGL.GL import glGetQueryObjectui64v, GL_QUERY_RESULT
+        
+        # PyOpenGL cannot size a 64-bit result by itself, so pass our own
+        elapsed = ctypes.c_uint64(0)
+        glGetQueryObjectui64v(query, GL_QUERY_RESULT, ctypes.byref(elapsed))
+        self.results.append(elapsed.value / 1e6)
+    
+    def finish(self):
+        """Collect every outstanding query and release them"""
+        from OpenGL.GL import glDeleteQueries
+        while self.pending:
+            self.collect(self.pending.pop(0))
+        glDeleteQueries(len(self.queries), self.queries)
+        return self.results
+
+def run_frames(demo, draw, frames, warmup, dt, finish, gl=True):
+    """Render warmup + frames at a fixed timestep and return the renderer name and samples"""
+    profiler = FrameProfiler()
+    demo.profiler = profiler
+    
+    # The software rasterizer has no GL context to time or wait on
+    if gl:
+        from OpenGL.GL import glFinish, glGetString, GL_RENDERER
+        gpu_timer = GpuTimer()
+    else:
+        gpu_timer = None
+    samples = {"frame_ms": [], "cpu_ms": []}
+    
+    for frame in range(warmup + frames):
+        measured = frame >= warmup
+        frame_start = time.perf_counter()
+        if measured and gpu_timer:
+            gpu_timer.begin()
+        profiler.begin_frame()
+        
+        draw(frame * dt)
+        
+        cpu_ms = (time.perf_counter() - frame_start) * 1000.0
+        if measured and gpu_timer:
+            gpu_timer.end()
+        
+        # Without a swap to throttle us, wait for the GPU so frames cannot pile up
+        if finish and gl:
+            glFinish()
+        phases = profiler.end_frame()
+        
+        if measured:
+            samples["frame_ms"].append((time.perf_counter() - frame_start) * 1000.0)
+            samples["cpu_ms"].append(cpu_ms)
+            for phase in PHASES:
+                samples.setdefault(f"{phase}_ms", []).append(phases[phase])
+    
+    if not gl:
+        return "software rasterizer", samples
+    samples["gpu_ms"] = gpu_timer.finish()
+    renderer = (glGetString(GL_RENDERER) or b"").decode(errors="replace")
+    return renderer, samples
+
+def set_light_count(demo, name, lights):
+    """Apply a point light count for a sweep; False if the demo has no point lights"""
+    if lights is None:
+        return True
+    if not hasattr(demo, "set_point_light_count"):
+        print(f"Skipping {name}: it has no point lights")
+        return False
+    demo.set_point_light_count(lights)
+    return True
+
+def set_vertex_format(name):
+    """Select the vertex format demos created from now on use, for a sweep"""
+    if name is not None:
+        os.environ["VERTEX_FORMAT"] = name
+
+def geometry_bytes(demo, name, vertex_format):
+    """Bytes of vertex and index data a demo uploaded; None (skipping it) in a format sweep without formats"""
+    if not hasattr(demo, "vertex_format"):
+        if vertex_format is not None:
+            print(f"Skipping {name}: it has no vertex formats")
+        return None
+    return len(demo.vertices) // demo.vertex_format.floats * demo.vertex_format.stride() + demo.indices.nbytes
+
+def benchmark_headless(name, args, lights=None, vertex_format=None):
+    """Benchmark one demo on an offscreen context"""
+    from render_headless import HeadlessRenderer
+    
+    set_vertex_format(vertex_format)
+    width, height = args.size if args.size else (None, None)
+    renderer = HeadlessRenderer(name, width, height, backend=args.backend, threads=args.threads, processes=args.processes)
+    try:
+        if not set_light_count(renderer.demo, name, lights):
+            return None
+        memory = geometry_bytes(renderer.demo, name, vertex_format)
+        if memory is None and vertex_format is not None:
+            return None
+        gl = renderer.rasterizer is None
+        return run_frames(renderer.demo, renderer.draw, args.frames, args.warmup, args.dt, finish=True, gl=gl) + (memory,)
+    finally:
+        renderer.demo.profiler = None
+        renderer.close()
+
+def benchmark_window(name, args, lights=None, vertex_format=None):
+    """Benchmark one demo in a GLFW window with vsync disabled"""
+    import glfw
+    import importlib
+    
+    set_vertex_format(vertex_format)
+    module_name, class_name = DEMOS[name][:2]
+    demo = getattr(importlib.import_module(module_name), class_name)()
+    if not hasattr(demo, "init_glfw"):
+        print(f"Skipping {name}: it has no GLFW window mode")
+        return None
+    
+    demo.init_glfw()
+    try:
+        glfw.swap_interval(0)
+        if demo.setup() is False:
+            raise RuntimeError(f"Failed to set up demo '{name}'")
+        if not set_light_count(demo, name, lights):
+            return None
+        memory = geometry_bytes(demo, name, vertex_format)
+        if memory is None and vertex_format is not None:
+            return None
+        
+        def draw(t):
+            glfw.poll_events()
+            demo.update(t)
+            demo.render()
+        
+        return run_frames(demo, draw, args.frames, args.warmup, args.dt, finish=False) + (memory,)
+    finally:
+        demo.cleanup()
+
+def write_report(report, path):
+    """Write the report as JSON, or as one CSV row per demo and metric"""
+    if path.endswith(".csv"):
+        columns = ["mean"] + [f"p{p}" for p in PERCENTILES] + ["min", "max", "stdev"]
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["demo", "metric"] + columns)
+            for name, result in report["demos"].items():
+                for metric, summary in result["metrics"].items():
+                    writer.writerow([name, metric] + [f"{summary[c]:.4f}" for c in columns])
+    else:
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Benchmark the Triangle demos")
+    parser.add_argument("demos", nargs="*", help=f"demos to run (default: all of {', '.join(DEMOS)})")
+    parser.add_argument("--frames", type=int, default=300, help="measured frames per demo")
+    parser.add_argument("--warmup", type=int, default=30, help="unmeasured frames before measuring")
+    parser.add_argument("--dt", type=float, default=1.0 / 60.0, help="fixed animation timestep in seconds")
+    parser.add_argument("--backend", choices=BACKENDS + (SOFTWARE_BACKEND,), default="egl", help="headless GL backend, or the CPU rasterizer")
+    parser.add_argument("--window", action="store_true", help="render in GLFW windows instead of headless")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="override headless frame size")
+    parser.add_argument("--threads", type=int, default=1, help="software rasterizer tile threads (0: one per core)")
+    parser.add_argument("--processes", action="store_true", help="run the --threads tile workers as processes")
+    parser.add_argument("--lights", type=int, nargs="+", help="point light counts to sweep (demos with point lights only)")
+    parser.add_argument("--formats", nargs="+", help="vertex formats to sweep: float, half, quantized (demos with vertex formats only)")
+    parser.add_argument("--output", default="benchmark.json", help="report path (.json or .csv)")
+    args = parser.parse_args()
+    
+    unknown = [name for name in args.demos if name not in DEMOS]
+    if unknown:
+        parser.error(f"unknown demos: {', '.join(unknown)}")
+    
+    # Must happen before any demo module imports OpenGL
+    if not args.window and args.backend != SOFTWARE_BACKEND:
+        select_platform(args.backend)
+    
+    report = {
+        "frames": args.frames,
+        "warmup": args.warmup,
+        "dt": args.dt,
+        "mode": "window" if args.window else f"headless-{args.backend}",
+        "python": sys.version.split()[0],
+        "demos": {},
+    }
+    
+    # Sweeps run every demo once per light count and vertex format, reported as
+    # "demo/N lights/format vertices"
+    runs = [(name, lights, vertex_format) for name in args.demos or list(DEMOS)
+            for lights in args.lights or [None] for vertex_format in args.formats or [None]]
+    for name, lights, vertex_format in runs:
+        if args.window:
+            result = benchmark_window(name, args, lights, vertex_format)
+        else:
+            result = benchmark_headless(name, args, lights, vertex_format)
+        if result is None:
+            continue
+        
+        renderer, samples, memory = result
+        metrics = {metric: summarize(values) for metric, values in samples.items() if values}
+        key = "/".join([name] + ([f"{lights} lights"] if lights is not None else [])
+                       + ([f"{vertex_format} vertices"] if vertex_format is not None else []))
+        report["demos"][key] = {"renderer": renderer, "metrics": metrics}
+        if lights is not None:
+            report["demos"][key]["lights"] = lights
+        if memory is not None:
+            report["demos"][key]["geometry_bytes"] = memory
+        
+        frame = metrics["frame_ms"]
+        gpu = metrics.get("gpu_ms", {}).get("p50", float("nan"))
+        size = f"  geometry {memory / 2 ** 20:7.2f} MB" if memory is not None else ""
+        print(f"{key:36s} frame p50 {frame['p50']:7.3f} ms  p99 {frame['p99']:7.3f} ms  gpu p50 {gpu:7.3f} ms{size}")
+    
+    write_report(report, args.output)
+    print(f"Report written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+Frame Pacer
+Swap-interval control and frame pacing for the GLFW run loops: vsync, uncapped (for
+benchmarking) or a fixed target rate held with a coarse sleep plus a short spin-wait.
+Frame intervals are recorded so the achieved pacing can be reported.
+
+The mode comes from the FRAME_PACING environment variable: "vsync" (default),
+"uncapped", or a target rate in frames per second such as "60".
+"""
+
+import os
+import time
+from collections import deque
+import glfw
+import numpy as np
+
+VSYNC = "vsync"
+UNCAPPED = "uncapped"
+FIXED = "fixed"
+
+# time.sleep() can overshoot by about a scheduler tick, so stop sleeping this long
+# before the deadline and spin for the rest
+SPIN_MARGIN = 0.002
+
+# Frame intervals kept for the report, the most recent ones win
+MAX_SAMPLES = 10000
+
+class FramePacer:
+    """Sets the swap interval and, in fixed mode, holds frames to a target rate"""
+    
+    def __init__(self, mode=VSYNC, target_fps=60.0):
+        if mode not in (VSYNC, UNCAPPED, FIXED):
+            raise ValueError(f"Unknown frame pacing mode '{mode}'")
+        if mode == FIXED and target_fps <= 0:
+            raise ValueError("Target FPS must be positive")
+        self.mode = mode
+        self.target_fps = target_fps
+        self.period = 1.0 / target_fps
+        
+        self.deadline = None
+        self.last_frame = None
+        self.intervals = deque(maxlen=MAX_SAMPLES)
+    
+    def describe(self):
+        """Mode name for messages"""
+        return f"{self.target_fps:g} FPS" if self.mode == FIXED else self.mode
+    
+    def attach(self):
+        """Apply the swap interval to the current context"""
+        # Fixed-rate pacing does its own waiting, vsync would add to it
+        glfw.swap_interval(1 if self.mode == VSYNC else 0)
+    
+    def wait(self):
+        """Block until the next frame may start and record the interval since the last one"""
+        if self.mode == FIXED:
+            now = time.perf_counter()
+            if self.deadline is None or now - self.deadline > self.period:
+                # First frame, or too far behind to catch up: restart the schedule
+                self.deadline = now
+            else:
+                remaining = self.deadline - now
+                if remaining > SPIN_MARGIN:
+                    time.sleep(remaining - SPIN_MARGIN)
+                while time.perf_counter() < self.deadline:
+                    pass
+            self.deadline += self.period
+        
+        now = time.perf_counter()
+        if self.last_frame is not None:
+            self.intervals.append((now - self.last_frame) * 1000.0)
+        self.last_frame = now
+    
+    def pause(self):
+        """Forget the last frame time, so idle time is not counted as a slow frame"""
+        self.last_frame = None
+        self.deadline = None
+    
+    def stats(self):
+        """Mean, standard deviation, variance and p99 of the frame intervals in ms"""
+        if not self.intervals:
+            return None
+        intervals = np.asarray(self.intervals)
+        return {
+            "frames": len(intervals),
+            "mean": float(intervals.mean()),
+            "stdev": float(intervals.std()),
+            "variance": float(intervals.var()),
+            "p99": float(np.percentile(intervals, 99)),
+        }
+    
+    def report(self):
+        """Print the achieved frame pacing"""
+        stats = self.stats()
+        if stats is None:
+            return
+        print(f"Frame pacing ({self.describe()}): {stats['frames']} frames, "
+              f"mean {stats['mean']:.2f} ms ({1000.0 / stats['mean']:.1f} FPS), "
+              f"stdev {stats['stdev']:.2f} ms, variance {stats['variance']:.3f} ms^2, p99 {stats['p99']:.2f} ms")
+
+def pacer_from_environment():
+    """FramePacer configured by the FRAME_PACING environment variable"""
+    setting = os.environ.get("FRAME_PACING", VSYNC).strip().lower()
+    if setting in (VSYNC, UNCAPPED):
+        return FramePacer(setting)
+    try:
+        return FramePacer(FIXED, float(setting))
+    except ValueError:
+        print(f"Warning: unknown FRAME_PACING '{setting}', using vsync")
+        return FramePacer(VSYNC)
@@ -0,0 +1,47 @@
+"""
+Frame Profiler
+Splits the CPU time of each rendered frame into phases (matrix build, uniform upload,
+buffer upload, draw, swap) so the benchmark can see where render() spends its time.
+"""
+
+import time
+
+PHASES = ("matrix", "uniforms", "buffers", "draw", "swap")
+
+class FrameProfiler:
+    """Records per-phase CPU time in milliseconds for every profiled frame"""
+    
+    def __init__(self):
+        self.frames = []
+        self.current = None
+        self.last = 0.0
+        
+    def begin_frame(self):
+        """Start timing a new frame"""
+        self.current = dict.fromkeys(PHASES, 0.0)
+        self.last = time.perf_counter()
+        
+    def mark(self, phase):
+        """Charge the time since the previous mark (or frame start) to a phase"""
+        now = time.perf_counter()
+        self.current[phase] += (now - self.last) * 1000.0
+        self.last = now
+        
+    def end_frame(self):
+        """Finish the frame and return its phase timings"""
+        frame = self.current
+        self.frames.append(frame)
+        self.current = None
+        return frame
+
+class NullProfiler:
+    """Profiler that records nothing; the default outside of benchmarks"""
+    
+    def begin_frame(self):
+        pass
+        
+    def mark(self, phase):
+        pass
+        
+    def end_frame(self):
+        return None
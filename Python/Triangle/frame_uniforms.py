@@ -0,0 +1,102 @@
+"""
+Frame Uniforms
+Per-frame camera and lighting state shared by every program through std140 uniform
+blocks. Both blocks live in one uniform buffer, mirrored by a preallocated NumPy
+structured array, so a frame's state reaches all programs with a single glBufferSubData.
+"""
+
+import numpy as np
+from gl_optional import *
+
+# Binding points of the shared blocks (the Phong material table uses 0)
+CAMERA_BLOCK_BINDING = 1
+LIGHT_BLOCK_BINDING = 2
+
+# GLSL declarations to paste into any shader stage that reads the shared state;
+# mvp is stored untransposed, like ShaderProgram.set_mat4() uploads it
+CAMERA_BLOCK = """
+        layout (std140) uniform Camera {
+            mat4 mvp;
+            vec3 viewPos;
+        };
+"""
+
+LIGHT_BLOCK = """
+        layout (std140) uniform Light {
+            vec3 lightPos;
+            vec3 lightColor;
+            float lightIntensity;
+        };
+"""
+
+# std140 sizes of the two blocks; a vec3 takes 16 bytes unless a float follows it
+CAMERA_BLOCK_SIZE = 80
+LIGHT_BLOCK_SIZE = 32
+
+def frame_uniforms_dtype(alignment):
+    """Structured dtype laying out the Camera and Light blocks in one buffer"""
+    # Each block is bound with glBindBufferRange(), whose offset must be a
+    # multiple of GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT
+    light_offset = -(-CAMERA_BLOCK_SIZE // alignment) * alignment
+    return np.dtype({
+        "names": ["mvp", "view_pos", "light_pos", "light_color", "light_intensity"],
+        "formats": [(np.float32, (4, 4)), (np.float32, 3), (np.float32, 3), (np.float32, 3), np.float32],
+        "offsets": [0, 64, light_offset, light_offset + 16, light_offset + 28],
+        "itemsize": light_offset + LIGHT_BLOCK_SIZE,
+    })
+
+def bind_uniform_blocks(program):
+    """Point a program's Camera and Light blocks (whichever it uses) at the shared bindings"""
+    for name, binding in (("Camera", CAMERA_BLOCK_BINDING), ("Light", LIGHT_BLOCK_BINDING)):
+        block_index = glGetUniformBlockIndex(program.program, name)
+        if block_index != GL_INVALID_INDEX:
+            glUniformBlockBinding(program.program, block_index, binding)
+
+class FrameUniforms:
+    """Uniform buffer holding the Camera and Light blocks, written once per frame"""
+    
+    def __init__(self):
+        alignment = int(glGetIntegerv(GL_UNIFORM_BUFFER_OFFSET_ALIGNMENT))
+        self.data = np.zeros(1, dtype=frame_uniforms_dtype(alignment))
+        self.light_offset = self.data.dtype.fields["light_pos"][1]
+        
+        # Bytes of the last upload, so a frame with unchanged state uploads nothing
+        self.uploaded = None
+        
+        self.ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, None, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.bind()
+    
+    def bind(self):
+        """Attach the two blocks of the buffer to their binding points"""
+        glBindBufferRange(GL_UNIFORM_BUFFER, CAMERA_BLOCK_BINDING, self.ubo, 0, CAMERA_BLOCK_SIZE)
+        glBindBufferRange(GL_UNIFORM_BUFFER, LIGHT_BLOCK_BINDING, self.ubo, self.light_offset, LIGHT_BLOCK_SIZE)
+    
+    def set_camera(self, mvp, view_pos):
+        """Stage the camera block"""
+        self.data["mvp"] = mvp
+        self.data["view_pos"] = view_pos
+    
+    def set_light(self, position, color=(1.0, 1.0, 1.0), intensity=1.0):
+        """Stage the light block"""
+        self.data["light_pos"] = position
+        self.data["light_color"] = color
+        self.data["light_intensity"] = intensity
+    
+    def upload(self):
+        """Send the staged state to the GPU in one call, if it changed since the last one"""
+        data = self.data.tobytes()
+        if data == self.uploaded:
+            return
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, self.data.nbytes, self.data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        self.uploaded = data
+    
+    def delete(self):
+        """Delete the uniform buffer"""
+        glDeleteBuffers(1, [self.ubo])
+        self.ubo = 0
+        self.uploaded = None
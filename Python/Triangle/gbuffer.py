@@ -0,0 +1,129 @@
+"""
+G-Buffer
+Framebuffer for deferred shading: a geometry pass writes each visible fragment's
+position, normal and material index, and a lighting pass reads them back per pixel.
+Binding and unbinding restore whatever framebuffer was bound before, so the lighting
+pass lands in a window or a headless FBO alike.
+"""
+
+import numpy as np
+from gl_optional import *
+
+# Texture units the lighting pass reads the attachments from (light culling uses 1-3)
+POSITION_UNIT = 4
+NORMAL_UNIT = 5
+MATERIAL_UNIT = 6
+
+UNITS = (POSITION_UNIT, NORMAL_UNIT, MATERIAL_UNIT)
+
+# Geometry pass outputs, matching the GBuffer attachments
+GEOMETRY_OUTPUTS = """
+        layout (location = 0) out vec4 gPosition;
+        layout (location = 1) out vec4 gNormal;
+        layout (location = 2) out int gMaterial;
+"""
+
+# Lighting pass inputs, read with texelFetch at the fragment's own pixel
+LIGHTING_INPUTS = """
+        uniform sampler2D gPosition;
+        uniform sampler2D gNormal;
+        uniform isampler2D gMaterial;
+"""
+
+# Full-screen triangle from gl_VertexID, drawn with an empty VAO
+FULLSCREEN_VERTEX_SHADER = """
+        #version 330 core
+        void main()
+        {
+            vec2 corner = vec2((gl_VertexID << 1) & 2, gl_VertexID & 2);
+            gl_Position = vec4(corner * 2.0 - 1.0, 0.0, 1.0);
+        }
+"""
+
+class GBuffer:
+    """FBO with position, normal and material attachments plus a depth buffer"""
+    
+    def __init__(self):
+        # Attachments in draw-buffer order: name, internal format, format, type. Positions
+        # keep full float precision so lighting matches forward shading; the material index
+        # is an integer and cleared to -1 where nothing was drawn
+        self.attachments = (
+            ("gPosition", GL_RGBA32F, GL_RGBA, GL_FLOAT),
+            ("gNormal", GL_RGBA16F, GL_RGBA, GL_FLOAT),
+            ("gMaterial", GL_R32I, GL_RED_INTEGER, GL_INT),
+        )
+        
+        self.width = 0
+        self.height = 0
+        self.fbo = glGenFramebuffers(1)
+        self.textures = glGenTextures(len(self.attachments))
+        self.depth = glGenRenderbuffers(1)
+        self.previous = None
+    
+    def resize(self, width, height):
+        """(Re)allocate the attachments when the viewport size changes"""
+        if (width, height) == (self.width, self.height):
+            return
+        self.width = width
+        self.height = height
+        
+        previous = self.current_framebuffers()
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        for i, (texture, (_, internal_format, data_format, data_type)) in enumerate(zip(self.textures, self.attachments)):
+            glBindTexture(GL_TEXTURE_2D, texture)
+            glTexImage2D(GL_TEXTURE_2D, 0, internal_format, width, height, 0, data_format, data_type, None)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0 + i, GL_TEXTURE_2D, texture, 0)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, width, height)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth)
+        
+        glDrawBuffers(len(self.attachments), [GL_COLOR_ATTACHMENT0 + i for i in range(len(self.attachments))])
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        self.restore_framebuffers(previous)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError(f"G-buffer incomplete (status 0x{status:x})")
+    
+    def current_framebuffers(self):
+        """The bound draw and read framebuffers"""
+        return glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING), glGetIntegerv(GL_READ_FRAMEBUFFER_BINDING)
+    
+    def restore_framebuffers(self, framebuffers):
+        """Rebind draw and read framebuffers saved by current_framebuffers()"""
+        draw, read = framebuffers
+        glBindFramebuffer(GL_DRAW_FRAMEBUFFER, draw)
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, read)
+    
+    def begin(self):
+        """Bind and clear the G-buffer for the geometry pass, remembering the current framebuffer"""
+        self.previous = self.current_framebuffers()
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        
+        # Integer attachments cannot be cleared by glClear, so clear each one explicitly
+        glClearBufferfv(GL_COLOR, 0, np.zeros(4, dtype=np.float32))
+        glClearBufferfv(GL_COLOR, 1, np.zeros(4, dtype=np.float32))
+        glClearBufferiv(GL_COLOR, 2, np.array([-1, 0, 0, 0], dtype=np.int32))
+        glClearBufferfv(GL_DEPTH, 0, np.ones(1, dtype=np.float32))
+    
+    def end(self):
+        """Return to the framebuffer that was bound before begin()"""
+        self.restore_framebuffers(self.previous)
+        self.previous = None
+    
+    def bind_textures(self, program):
+        """Bind the attachments for the lighting pass; the program must be in use"""
+        for texture, unit, (name, *_) in zip(self.textures, UNITS, self.attachments):
+            glActiveTexture(GL_TEXTURE0 + unit)
+            glBindTexture(GL_TEXTURE_2D, texture)
+            program.set_int(name, unit)
+        glActiveTexture(GL_TEXTURE0)
+    
+    def delete(self):
+        """Delete the framebuffer and its attachments"""
+        glDeleteFramebuffers(1, [self.fbo])
+        glDeleteTextures(len(self.textures), self.textures)
+        glDeleteRenderbuffers(1, [self.depth])
@@ -0,0 +1,18 @@
+"""
+Optional OpenGL
+Re-exports OpenGL.GL for the demos and their GL helpers, or nothing when PyOpenGL or
+the system's OpenGL library cannot be loaded. Modules that star-import this one still
+import on such hosts, so render_headless.py can run their render_software() paths on
+the CPU rasterizer; their GL entry points call require_opengl() to fail with the reason.
+"""
+
+try:
+    from OpenGL.GL import *
+    OPENGL_ERROR = None
+except ImportError as e:
+    OPENGL_ERROR = e
+
+def require_opengl():
+    """Raise RuntimeError naming the import failure when OpenGL.GL is unavailable"""
+    if OPENGL_ERROR is not None:
+        raise RuntimeError(f"OpenGL is not available: {OPENGL_ERROR}")
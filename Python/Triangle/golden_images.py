@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Golden Image Regression Check
+Renders every Triangle demo headlessly at fixed animation times on a process pool and
+compares each frame against a stored golden image (bad-pixel ratio and SSIM). Render
+times are recorded alongside the images, so a case that got much slower fails too.
+"""
+
+import argparse
+import contextlib
+import importlib.abc
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from PIL import Image
+
+from offscreen import BACKENDS, select_platform
+from render_headless import DEMOS, SOFTWARE_BACKEND
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+TIMINGS_FILE = "timings.json"
+DEFAULT_TIMES = (0.0, 1.5)
+
+# A pixel is bad when any channel differs by more than PIXEL_TOLERANCE; a case fails
+# when more than MAX_BAD_PIXELS of its pixels are bad or its SSIM drops below MIN_SSIM
+PIXEL_TOLERANCE = 16
+MAX_BAD_PIXELS = 0.005
+MIN_SSIM = 0.98
+SSIM_WINDOW = 8
+
+# A case is too slow when it takes longer than golden * (1 + MAX_SLOWDOWN) + SLACK_MS
+MAX_SLOWDOWN = 0.5
+SLACK_MS = 2.0
+
+class OpenGLBlocker(importlib.abc.MetaPathFinder):
+    """Import hook that fails every OpenGL import, as on a host without PyOpenGL"""
+    
+    def find_spec(self, name, path, target=None):
+        if name == "OpenGL" or name.startswith("OpenGL."):
+            raise ImportError(f"No module named '{name}' (OpenGL is blocked for the software run)")
+        return None
+
+def block_opengl():
+    """Make every later OpenGL import in this process fail"""
+    if "OpenGL" in sys.modules:
+        raise RuntimeError("OpenGL was imported before it could be blocked")
+    if not any(isinstance(finder, OpenGLBlocker) for finder in sys.meta_path):
+        sys.meta_path.insert(0, OpenGLBlocker())
+
+def case_name(demo, t):
+    """File name stem of one demo at one animation time"""
+    return f"{demo}_t{t:.2f}"
+
+def render_case(demo, t, backend, repeats):
+    """Render one case in a worker process; returns (pixels, median ms, renderer name)"""
+    # Each worker binds PyOpenGL to the backend before anything imports OpenGL. The
+    # software run blocks OpenGL instead, so it also checks that the demos import and
+    # render on hosts without it
+    if backend == SOFTWARE_BACKEND:
+        block_opengl()
+    else:
+        select_platform(backend)
+    from render_headless import HeadlessRenderer
+    
+    # Demos print while setting up, which would interleave across workers
+    with contextlib.redirect_stdout(io.StringIO()):
+        renderer = HeadlessRenderer(demo, backend=backend, fallback=False)
+        try:
+            # The first frame also warms shader, texture and allocation caches
+            pixels = renderer.render(t)
+            samples = []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                renderer.render(t)
+                samples.append((time.perf_counter() - start) * 1000.0)
+            
+            if renderer.rasterizer:
+                name = "software rasterizer"
+            else:
+                from OpenGL.GL import glGetString, GL_RENDERER
+                name = (glGetString(GL_RENDERER) or b"").decode(errors="replace")
+        finally:
+            renderer.close()
+    return pixels, float(np.median(samples)), name
+
+def box_mean(image, size):
+    """Mean over every size x size window (valid positions only), via summed-area tables"""
+    table = np.pad(image.cumsum(axis=0).cumsum(axis=1), ((1, 0), (1, 0)))
+    sums = table[size:, size:] - table[:-size, size:] - table[size:, :-size] + table[:-size, :-size]
+    return sums / (size * size)
+
+def ssim(a, b, size=SSIM_WINDOW):
+    """Mean structural similarity of two luma images in 0..255"""
+    c1 = (0.01 * 255) ** 2
+    c2 = (0.03 * 255) ** 2
+    mean_a = box_mean(a, size)
+    mean_b = box_mean(b, size)
+    var_a = box_mean(a * a, size) - mean_a ** 2
+    var_b = box_mean(b * b, size) - mean_b ** 2
+    covariance = box_mean(a * b, size) - mean_a * mean_b
+    index = ((2 * mean_a * mean_b + c1) * (2 * covariance + c2)) / ((mean_a ** 2 + mean_b ** 2 + c1) * (var_a + var_b + c2))
+    return float(index.mean())
+
+def compare_images(actual, expected):
+    """Bad-pixel ratio, SSIM and largest channel difference between two RGBA frames"""
+    diff = np.abs(actual.astype(np.int16) - expected.astype(np.int16)).max(axis=-1)
+    luma_weights = np.array([0.299, 0.587, 0.114])
+    luma_actual = actual[..., :3].astype(np.float64) @ luma_weights
+    luma_expected = expected[..., :3].astype(np.float64) @ luma_weights
+    return {
+        "bad_pixels": float((diff > PIXEL_TOLERANCE).mean()),
+        "ssim": ssim(luma_actual, luma_expected),
+        "max_diff": int(diff.max()),
+    }, diff
+
+def load_timings(golden_dir):
+    """Recorded renderer name and per-case times, or None before the first --update"""
+    path = os.path.join(golden_dir, TIMINGS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+def check_case(name, pixels, render_ms, renderer, timings, args):
+    """Compare one rendered case against its golden image and time; returns failure reasons"""
+    path = os.path.join(args.golden_dir, f"{name}.png")
+    if not os.path.exists(path):
+        return ["no golden image (run with --update)"], ""
+    expected = np.asarray(Image.open(path).convert("RGBA"))
+    if expected.shape != pixels.shape:
+        return [f"size {pixels.shape[1]}x{pixels.shape[0]}, golden is {expected.shape[1]}x{expected.shape[0]}"], ""
+    
+    failures = []
+    metrics, diff = compare_images(pixels, expected)
+    if metrics["bad_pixels"] > MAX_BAD_PIXELS:
+        failures.append(f"{metrics['bad_pixels']:.2%} pixels differ by more than {PIXEL_TOLERANCE}")
+    if metrics["ssim"] < MIN_SSIM:
+        failures.append(f"SSIM {metrics['ssim']:.4f} below {MIN_SSIM}")
+    summary = f"bad {metrics['bad_pixels']:.3%}  ssim {metrics['ssim']:.4f}  max {metrics['max_diff']:3d}  {render_ms:7.2f} ms"
+    
+    # Times are only comparable on the renderer they were recorded with
+    golden_ms = None
+    if timings and not args.no_timing and timings.get("renderer") == renderer:
+        golden_ms = timings["cases"].get(name)
+    if golden_ms is not None:
+        summary += f" (golden {golden_ms:.2f} ms)"
+        if render_ms > golden_ms * (1.0 + MAX_SLOWDOWN) + SLACK_MS:
+            failures.append(f"render time {render_ms:.2f} ms, golden {golden_ms:.2f} ms")
+    
+    # Keep the evidence next to each other for failed cases
+    if failures:
+        os.makedirs(args.output, exist_ok=True)
+        Image.fromarray(pixels, "RGBA").save(os.path.join(args.output, f"{name}_actual.png"))
+        highlight = np.minimum(diff * 8, 255).astype(np.uint8)
+        Image.fromarray(highlight, "L").save(os.path.join(args.output, f"{name}_diff.png"))
+    return failures, summary
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compare Triangle demo renders against golden images")
+    parser.add_argument("demos", nargs="*", help=f"demos to check (default: all of {', '.join(DEMOS)})")
+    parser.add_argument("--times", type=float, nargs="+", default=list(DEFAULT_TIMES), help="animation times in seconds")
+    parser.add_argument("--backend", choices=BACKENDS + (SOFTWARE_BACKEND,), default="egl", help="headless GL backend, or the CPU rasterizer")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--repeats", type=int, default=5, help="timed renders per case (median is kept)")
+    parser.add_argument("--golden-dir", default=GOLDEN_DIR, help="directory of golden images and timings")
+    parser.add_argument("--output", default="golden_failures", help="where actual and diff images of failures go")
+    parser.add_argument("--update", action="store_true", help="re-record golden images and timings")
+    parser.add_argument("--no-timing", action="store_true", help="do not fail on render time")
+    args = parser.parse_args()
+    
+    unknown = [name for name in args.demos if name not in DEMOS]
+    if unknown:
+        parser.error(f"unknown demos: {', '.join(unknown)}")
+    
+    cases = [(demo, t) for demo in args.demos or list(DEMOS) for t in args.times]
+    
+    # Spawned workers start without OpenGL imported, so each can pick its platform
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(max_workers=args.jobs, mp_context=context) as pool:
+        futures = {case: pool.submit(render_case, *case, args.backend, args.repeats) for case in cases}
+        
+        # A demo that cannot render fails its own cases, not the whole run
+        results, errors = {}, {}
+        for (demo, t), future in futures.items():
+            try:
+                results[case_name(demo, t)] = future.result()
+            except Exception as e:
+                errors[case_name(demo, t)] = f"render failed: {e}"
+    
+    if args.update:
+        os.makedirs(args.golden_dir, exist_ok=True)
+        timings = load_timings(args.golden_dir) or {"renderer": None, "cases": {}}
+        for name, (pixels, render_ms, renderer) in results.items():
+            Image.fromarray(pixels, "RGBA").save(os.path.join(args.golden_dir, f"{name}.png"))
+            
+            # Times recorded on another renderer are meaningless here, start over
+            if timings["renderer"] != renderer:
+                timings = {"renderer": renderer, "cases": {}}
+            timings["cases"][name] = round(render_ms, 3)
+            print(f"Recorded {name} ({render_ms:.2f} ms)")
+        with open(os.path.join(args.golden_dir, TIMINGS_FILE), "w") as f:
+            json.dump(timings, f, indent=2, sort_keys=True)
+        for name, error in errors.items():
+            print(f"Not recorded {name}: {error}")
+        if errors:
+            sys.exit(1)
+        return
+    
+    timings = load_timings(args.golden_dir)
+    failed = 0
+    for demo, t in cases:
+        name = case_name(demo, t)
+        if name in errors:
+            failures, summary = [errors[name]], ""
+        else:
+            failures, summary = check_case(name, *results[name], timings, args)
+        print(f"{'FAIL' if failures else 'ok  '} {name:40s} {summary}")
+        for failure in failures:
+            print(f"       {failure}")
+        failed += bool(failures)
+    
+    print(f"{len(cases) - failed} passed, {failed} failed")
+    if failed:
+        print(f"Actual and diff images of failed cases are in {args.output}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
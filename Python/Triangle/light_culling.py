@@ -0,0 +1,185 @@
+"""
+Tiled Light Culling
+Point lights for the Phong demos, culled per screen tile on the CPU. Each light's
+bounding sphere is projected to a screen rectangle with one vectorized transform, the
+rectangles are tested against every tile at once, and the resulting per-tile light
+lists go to the GPU in texture buffers so a fragment only loops over the lights that
+can reach its tile.
+"""
+
+import numpy as np
+from gl_optional import *
+
+# Screen tile edge in pixels
+TILE_SIZE = 32
+
+# Texture units of the light, tile list and tile range buffers
+POINT_LIGHT_UNIT = 1
+TILE_LIGHT_UNIT = 2
+TILE_RANGE_UNIT = 3
+
+# Corners of the unit cube, scaled by each light's radius to bound its sphere
+CUBE_CORNERS = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)], dtype=np.float32)
+
+# GLSL declarations and the tile loop, pasted into the fragment shaders. Lights fade
+# to exactly zero at their radius, so culling by the bounding sphere changes nothing.
+TILED_LIGHTS = f"""
+        uniform samplerBuffer pointLights;  // per light: (position, radius), (color * intensity, 0)
+        uniform isamplerBuffer tileLights;  // light indices, grouped by tile
+        uniform isamplerBuffer tileRanges;  // per tile: (first index, light count)
+        uniform int tilesX;
+        
+        vec3 pointLighting(vec3 fragPos, vec3 norm, vec3 viewDir, float specularStrength, float shininess)
+        {{
+            ivec2 tile = ivec2(gl_FragCoord.xy) / {TILE_SIZE};
+            ivec2 range = texelFetch(tileRanges, tile.y * tilesX + tile.x).xy;
+            
+            vec3 result = vec3(0.0);
+            for (int i = range.x; i < range.x + range.y; i++)
+            {{
+                int light = texelFetch(tileLights, i).x;
+                vec4 positionRadius = texelFetch(pointLights, 2 * light);
+                vec3 color = texelFetch(pointLights, 2 * light + 1).rgb;
+                
+                vec3 toLight = positionRadius.xyz - fragPos;
+                float distance = length(toLight);
+                float attenuation = clamp(1.0 - distance / positionRadius.w, 0.0, 1.0);
+                attenuation *= attenuation;
+                
+                vec3 lightDir = toLight / distance;
+                float diff = max(dot(norm, lightDir), 0.0);
+                vec3 reflectDir = reflect(-lightDir, norm);
+                float spec = pow(max(dot(viewDir, reflectDir), 0.0), shininess);
+                result += (diff + specularStrength * spec) * attenuation * color;
+            }}
+            return result;
+        }}
+"""
+
+def random_point_lights(count, low, high, plane_z=0.0, seed=0, coverage=4.0, intensity=1.0):
+    """Positions (L, 3), colors (L, 3) and radii (L,) of count lights over an (x, y) rectangle"""
+    rng = np.random.default_rng(seed)
+    low = np.asarray(low, dtype=np.float32)
+    high = np.asarray(high, dtype=np.float32)
+    
+    # Radii shrink as lights are added, so the rectangle stays covered about coverage
+    # times over and a light count sweep measures culling rather than overdraw
+    area = float((high[0] - low[0]) * (high[1] - low[1]))
+    base = np.sqrt(coverage * area / (np.pi * max(count, 1)))
+    radii = (base * (0.75 + 0.5 * rng.random(count, dtype=np.float32))).astype(np.float32)
+    
+    # Each light hovers a fraction of its radius above the plane, so it reaches it
+    positions = np.empty((count, 3), dtype=np.float32)
+    positions[:, :2] = low + rng.random((count, 2), dtype=np.float32) * (high - low)
+    positions[:, 2] = plane_z + radii * (0.2 + 0.4 * rng.random(count, dtype=np.float32))
+    colors = (rng.random((count, 3), dtype=np.float32) * 0.7 + 0.3) * intensity
+    return positions, colors.astype(np.float32), radii
+
+def screen_bounds(positions, radii, mvp, width, height):
+    """Pixel rectangles (L, 4) as x0, y0, x1, y1 covering boxes around each position, and a visible mask"""
+    # radii (L,) bound spheres with cubes, (L, 3) gives per-axis half extents. The
+    # projected box contains the projected sphere, as long as the whole box is in
+    # front of the camera
+    extents = np.reshape(radii, (len(positions), 1, -1))
+    corners = positions[:, np.newaxis, :] + extents * CUBE_CORNERS
+    clip = np.concatenate([corners, np.ones(corners.shape[:2] + (1,), dtype=np.float32)], axis=-1) @ mvp
+    w = clip[..., 3]
+    straddles = (w <= 1e-6).any(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ndc = clip[..., :2] / w[..., np.newaxis]
+    low = ndc.min(axis=1)
+    high = ndc.max(axis=1)
+    
+    # A box reaching behind the camera can land anywhere, so it covers the screen
+    low[straddles] = -1.0
+    high[straddles] = 1.0
+    visible = (high >= -1.0).all(axis=1) & (low <= 1.0).all(axis=1)
+    
+    size = np.array([width, height], dtype=np.float32)
+    rect = np.concatenate([(low * 0.5 + 0.5) * size, (high * 0.5 + 0.5) * size], axis=1)
+    return rect, visible
+
+def cull_lights(positions, radii, mvp, width, height, tile_size=TILE_SIZE):
+    """Per-tile (first index, count) ranges and the concatenated light index lists"""
+    tiles_x = -(-width // tile_size)
+    tiles_y = -(-height // tile_size)
+    if len(positions) == 0:
+        return np.zeros((tiles_x * tiles_y, 2), dtype=np.int32), np.zeros(0, dtype=np.int32)
+    
+    rect, visible = screen_bounds(positions, radii, mvp, width, height)
+    first = np.floor(rect[:, :2] / tile_size)
+    last = np.floor(rect[:, 2:] / tile_size)
+    
+    # Separable overlap tests, then one (tiles_y, tiles_x, L) mask for every pair
+    tx = np.arange(tiles_x)[:, np.newaxis]
+    ty = np.arange(tiles_y)[:, np.newaxis]
+    overlap_x = (tx >= first[:, 0]) & (tx <= last[:, 0]) & visible
+    overlap_y = (ty >= first[:, 1]) & (ty <= last[:, 1])
+    mask = (overlap_y[:, np.newaxis, :] & overlap_x[np.newaxis, :, :]).reshape(tiles_x * tiles_y, -1)
+    
+    # Row-major nonzero() already groups the light indices by tile
+    counts = mask.sum(axis=1)
+    _, lights = np.nonzero(mask)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return np.stack([offsets, counts], axis=1).astype(np.int32), lights.astype(np.int32)
+
+class TiledLights:
+    """Texture buffers holding the point lights and the per-tile light lists"""
+    
+    def __init__(self):
+        self.buffers = glGenBuffers(3)
+        self.textures = glGenTextures(3)
+        self.tiles_x = 1
+        self.light_count = 0
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.radii = np.zeros(0, dtype=np.float32)
+        
+        # Light and tile buffers start with one texel so they are never empty
+        self.upload(0, GL_RGBA32F, np.zeros((1, 4), dtype=np.float32))
+        self.upload(1, GL_R32I, np.zeros(1, dtype=np.int32))
+        self.upload(2, GL_RG32I, np.zeros((1, 2), dtype=np.int32))
+    
+    def upload(self, index, internal_format, data):
+        """Replace the contents of one buffer and (re)attach it to its buffer texture"""
+        glBindBuffer(GL_TEXTURE_BUFFER, self.buffers[index])
+        glBufferData(GL_TEXTURE_BUFFER, data.nbytes, data, GL_DYNAMIC_DRAW)
+        glBindBuffer(GL_TEXTURE_BUFFER, 0)
+        glBindTexture(GL_TEXTURE_BUFFER, self.textures[index])
+        glTexBuffer(GL_TEXTURE_BUFFER, internal_format, self.buffers[index])
+        glBindTexture(GL_TEXTURE_BUFFER, 0)
+    
+    def set_lights(self, positions, colors, radii):
+        """Upload a new set of point lights"""
+        self.positions = np.asarray(positions, dtype=np.float32)
+        self.radii = np.asarray(radii, dtype=np.float32)
+        self.light_count = len(self.positions)
+        
+        texels = np.zeros((max(self.light_count, 1), 2, 4), dtype=np.float32)
+        texels[:self.light_count, 0, :3] = self.positions
+        texels[:self.light_count, 0, 3] = self.radii
+        texels[:self.light_count, 1, :3] = colors
+        self.upload(0, GL_RGBA32F, texels.reshape(-1, 4))
+    
+    def update(self, mvp, width, height):
+        """Rebuild and upload the tile light lists for this frame's camera and viewport"""
+        ranges, lights = cull_lights(self.positions, self.radii, mvp, width, height)
+        self.tiles_x = -(-width // TILE_SIZE)
+        self.upload(1, GL_R32I, lights if len(lights) else np.zeros(1, dtype=np.int32))
+        self.upload(2, GL_RG32I, ranges)
+        return len(lights)
+    
+    def bind(self, program):
+        """Bind the buffer textures and point a program's samplers at them; the program must be in use"""
+        for unit, texture in zip((POINT_LIGHT_UNIT, TILE_LIGHT_UNIT, TILE_RANGE_UNIT), self.textures):
+            glActiveTexture(GL_TEXTURE0 + unit)
+            glBindTexture(GL_TEXTURE_BUFFER, texture)
+        glActiveTexture(GL_TEXTURE0)
+        program.set_int("pointLights", POINT_LIGHT_UNIT)
+        program.set_int("tileLights", TILE_LIGHT_UNIT)
+        program.set_int("tileRanges", TILE_RANGE_UNIT)
+        program.set_int("tilesX", self.tiles_x)
+    
+    def delete(self):
+        """Delete the buffers and buffer textures"""
+        glDeleteTextures(3, self.textures)
+        glDeleteBuffers(3, self.buffers)
@@ -0,0 +1,515 @@
+#!/usr/bin/env python3
+"""
+Mesh Loader
+Streams Wavefront OBJ and binary PLY files into an indexed triangle mesh, and emits
+the interleaved vertex layouts the demos draw: position + normal for Phong, position
++ uv for the textured demos. OBJ text is parsed a few megabytes at a time, with every
+line of a kind converted in one NumPy call; binary PLY vertices are read straight out
+of a memory map. Either way no Python code runs per vertex, so multi-million triangle
+meshes load in seconds.
+
+Usage:
+    python mesh_loader.py model.obj   # load a mesh and report its size and load time
+
+The demos load the mesh named by the DEMO_MESH environment variable in place of
+their hardcoded triangle.
+"""
+
+import os
+import sys
+import time
+import numpy as np
+from normals import smooth_normals
+
+# Bytes of OBJ text parsed at a time; bounds the temporary arrays of the parser
+CHUNK_BYTES = 1 << 23
+
+# Rows of a PLY memory map copied at a time
+BLOCK_ROWS = 1 << 20
+
+# Attribute names and float counts of the interleaved layouts
+ATTRIBUTE_SIZES = {"position": 3, "normal": 3, "uv": 2}
+PHONG_LAYOUT = ("position", "normal")
+TEXTURED_LAYOUT = ("position", "uv")
+
+# PLY scalar types as NumPy type codes (byte order is added from the header)
+PLY_TYPES = {
+    "char": "i1", "int8": "i1", "uchar": "u1", "uint8": "u1",
+    "short": "i2", "int16": "i2", "ushort": "u2", "uint16": "u2",
+    "int": "i4", "int32": "i4", "uint": "u4", "uint32": "u4",
+    "float": "f4", "float32": "f4", "double": "f8", "float64": "f8",
+}
+
+# Texture coordinate property pairs different PLY exporters write
+PLY_UV_NAMES = (("u", "v"), ("s", "t"), ("texture_u", "texture_v"), ("texture_s", "texture_t"))
+
+def planar_uvs(positions):
+    """Texture coordinates projecting the (x, y) bounding box onto the unit square"""
+    xy = positions[:, :2]
+    low = xy.min(axis=0)
+    size = xy.max(axis=0) - low
+    return ((xy - low) / np.where(size > 0.0, size, 1.0)).astype(np.float32)
+
+class Mesh:
+    """Indexed triangle mesh: per-vertex attributes shared through an (F, 3) index array"""
+    
+    def __init__(self, positions, indices, normals=None, uvs=None):
+        self.positions = np.ascontiguousarray(positions, dtype=np.float32)
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32).reshape(-1, 3)
+        self.normals = None if normals is None else np.ascontiguousarray(normals, dtype=np.float32)
+        self.uvs = None if uvs is None else np.ascontiguousarray(uvs, dtype=np.float32)
+    
+    def vertex_count(self):
+        """Number of unique vertices"""
+        return len(self.positions)
+    
+    def triangle_count(self):
+        """Number of triangles"""
+        return len(self.indices)
+    
+    def fit(self, extent=1.0):
+        """Center the mesh on the origin and scale its largest half extent to extent"""
+        low = self.positions.min(axis=0)
+        high = self.positions.max(axis=0)
+        half = float((high - low).max()) * 0.5
+        self.positions -= (low + high) * 0.5
+        if half > 0.0:
+            self.positions *= extent / half
+        return self
+    
+    def attribute(self, name):
+        """(N, size) array of one attribute; missing normals and uvs are generated"""
+        if name == "position":
+            return self.positions
+        if name == "normal":
+            if self.normals is None:
+                self.normals = smooth_normals(self.positions, self.indices)
+            return self.normals
+        if name == "uv":
+            if self.uvs is None:
+                self.uvs = planar_uvs(self.positions)
+            return self.uvs
+        raise RuntimeError(f"Unknown vertex attribute: {name}")
+    
+    def vertex_array(self, layout=PHONG_LAYOUT):
+        """Interleaved (N, floats) vertices, to draw through the index array"""
+        vertices = np.empty((self.vertex_count(), sum(ATTRIBUTE_SIZES[name] for name in layout)), dtype=np.float32)
+        column = 0
+        for name in layout:
+            size = ATTRIBUTE_SIZES[name]
+            vertices[:, column:column + size] = self.attribute(name)
+            column += size
+        return vertices
+    
+    def triangle_array(self, layout=PHONG_LAYOUT):
+        """Flat interleaved vertices of every triangle corner, to draw with glDrawArrays"""
+        return self.vertex_array(layout)[self.indices.reshape(-1)].reshape(-1)
+
+def triangulate(offsets, counts):
+    """(T, 3) fan triangulation of polygons whose corners start at offsets"""
+    if (counts == 3).all():
+        return offsets[:, np.newaxis] + np.arange(3)
+    fans = counts - 2
+    first = np.repeat(offsets, fans)
+    step = np.arange(len(first)) - np.repeat(np.cumsum(fans) - fans, fans)
+    return np.stack([first, first + step + 1, first + step + 2], axis=1)
+
+def unique_rows(rows):
+    """Indices of the first occurrence of each distinct row, and every row's unique index"""
+    # One int64 key per row sorts far faster than np.unique(axis=0), when it fits
+    spans = rows.max(axis=0).astype(np.int64) + 2
+    if np.prod(spans.astype(np.float64)) < 2.0 ** 62:
+        keys = np.zeros(len(rows), dtype=np.int64)
+        for column, span in enumerate(spans):
+            keys = keys * span + (rows[:, column] + 1)
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+    else:
+        _, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+    return first, inverse.reshape(-1)
+
+def obj_line_values(buffer, lengths, selected, skip, dtype):
+    """Values of the selected lines and the value count of each line"""
+    # Gather the selected lines, newlines included, into one buffer that
+    # np.fromstring parses in a single call; their keywords become spaces
+    text = buffer[np.repeat(selected, lengths)]
+    line_lengths = lengths[selected]
+    line_starts = np.cumsum(line_lengths) - line_lengths
+    for i in range(skip):
+        text[line_starts + i] = 32
+    
+    # Anything up to space (tabs, CR, newlines) separates values
+    separator = text <= 32
+    token_start = ~separator
+    token_start[1:] &= separator[:-1]
+    first_tokens = np.searchsorted(np.flatnonzero(token_start), line_starts)
+    counts = np.diff(first_tokens, append=np.count_nonzero(token_start))
+    
+    try:
+        values = np.fromstring(text.tobytes(), dtype=dtype, sep=" ")
+    except ValueError:
+        values = None
+    if values is None or len(values) != counts.sum():
+        raise RuntimeError("Malformed numbers in OBJ file")
+    return values, counts
+
+def obj_leading_values(values, counts, width, name):
+    """(L, width) array of the first width values of every line"""
+    if (counts == width).all():
+        return values.reshape(-1, width)
+    if (counts < width).any():
+        raise RuntimeError(f"OBJ {name} line with fewer than {width} values")
+    return values[(np.cumsum(counts) - counts)[:, np.newaxis] + np.arange(width)]
+
+def parse_obj_chunk(data, totals):
+    """Attributes and triangle corners (v, vt, vn indices, -1 if absent) of complete OBJ lines"""
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    ends = np.flatnonzero(buffer == 10)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    lengths = ends - starts + 1
+    
+    # Blank trailing comments, from the first # of a line up to its newline; lines
+    # that start with # are comments as a whole and never classified below
+    hashes = np.flatnonzero(buffer == ord("#"))
+    if len(hashes):
+        lines, first_hashes = np.unique(np.searchsorted(ends, hashes), return_index=True)
+        hashes = hashes[first_hashes]
+        trailing = hashes != starts[lines]
+        if trailing.any():
+            marks = np.zeros(len(buffer) + 1, dtype=np.int8)
+            marks[hashes[trailing]] = 1
+            marks[ends[lines[trailing]]] = -1
+            buffer = buffer.copy()
+            buffer[np.cumsum(marks[:-1], dtype=np.int8) > 0] = 32
+    
+    # Classify every line by its first three bytes
+    padded = np.concatenate([buffer, np.zeros(3, dtype=np.uint8)])
+    first, second, third = padded[starts], padded[starts + 1], padded[starts + 2]
+    spaced = (second == 32) | (second == 9)
+    keyword_v = first == ord("v")
+    kinds = {
+        "v": keyword_v & spaced,
+        "vt": keyword_v & (second == ord("t")) & ((third == 32) | (third == 9)),
+        "vn": keyword_v & (second == ord("n")) & ((third == 32) | (third == 9)),
+        "f": (first == ord("f")) & spaced,
+    }
+    
+    attributes = {}
+    for kind, width in (("v", 3), ("vt", 2), ("vn", 3)):
+        if kinds[kind].any():
+            values, counts = obj_line_values(buffer, lengths, kinds[kind], len(kind), np.float32)
+            attributes[kind] = obj_leading_values(values, counts, width, kind)
+        else:
+            attributes[kind] = np.zeros((0, width), dtype=np.float32)
+    
+    faces = np.flatnonzero(kinds["f"])
+    if not len(faces):
+        return attributes, np.zeros((0, 3), dtype=np.int32)
+    
+    # Every face of a file uses one corner format, read off the first corner:
+    # v, v/vt, v//vn or v/vt/vn
+    body = buffer[starts[faces[0]] + 1:ends[faces[0]]].tobytes().split()
+    corner = body[0] if body else b""
+    if b"//" in corner:
+        columns = (0, 2)
+    else:
+        columns = (0, 1, 2)[:corner.count(b"/") + 1]
+    
+    slashes = buffer == ord("/")
+    if slashes.any():
+        buffer = buffer.copy()
+        buffer[slashes] = 32
+    values, counts = obj_line_values(buffer, lengths, kinds["f"], 1, np.int64)
+    if (counts % len(columns)).any() or (counts < 3 * len(columns)).any():
+        raise RuntimeError("OBJ faces mix corner formats or have fewer than 3 corners")
+    values = values.reshape(-1, len(columns))
+    
+    # 1-based indices to 0-based; negative ones count back from the last element
+    # defined before their face line
+    corners = np.full((len(values), 3), -1, dtype=np.int64)
+    sizes = counts // len(columns)
+    for position, column in enumerate(columns):
+        kind = ("v", "vt", "vn")[column]
+        indices = values[:, position]
+        negative = indices < 0
+        if negative.any():
+            before = totals[kind] + np.cumsum(kinds[kind])[faces]
+            indices = np.where(negative, indices + np.repeat(before, sizes) + 1, indices)
+        corners[:, column] = indices - 1
+    
+    triangles = triangulate(np.cumsum(sizes) - sizes, sizes)
+    return attributes, corners[triangles.reshape(-1)].astype(np.int32)
+
+def load_obj(path, chunk_bytes=CHUNK_BYTES):
+    """Load a Wavefront OBJ file, merging corners with identical v/vt/vn into one vertex"""
+    totals = {"v": 0, "vt": 0, "vn": 0}
+    attributes = {"v": [], "vt": [], "vn": []}
+    corners = []
+    with open(path, "rb") as file:
+        remainder = b""
+        while True:
+            data = file.read(chunk_bytes)
+            if not data:
+                if not remainder.strip():
+                    break
+                data = b"\n"  # the last line had no newline
+            
+            # Parse up to the last complete line, carrying the rest into the next chunk
+            data = remainder + data
+            cut = data.rfind(b"\n") + 1
+            remainder = data[cut:]
+            if cut:
+                try:
+                    chunk_attributes, chunk_corners = parse_obj_chunk(data[:cut], totals)
+                except RuntimeError as error:
+                    raise RuntimeError(f"{error}: {path}") from error
+                for kind, values in chunk_attributes.items():
+                    attributes[kind].append(values)
+                    totals[kind] += len(values)
+                corners.append(chunk_corners)
+    
+    positions, uvs, normals = (np.concatenate(attributes[kind] or [np.zeros((0, width), dtype=np.float32)])
+                               for kind, width in (("v", 3), ("vt", 2), ("vn", 3)))
+    corners = np.concatenate(corners) if corners else np.zeros((0, 3), dtype=np.int32)
+    if not len(corners):
+        raise RuntimeError(f"No faces in OBJ file: {path}")
+    for column, kind in enumerate(("v", "vt", "vn")):
+        if corners[:, column].max() >= totals[kind] or (kind == "v" and corners[:, 0].min() < 0):
+            raise RuntimeError(f"OBJ face references a missing {kind} element: {path}")
+    
+    # An attribute is kept only if every corner has one
+    keep = [0] + [column for column in (1, 2) if corners[:, column].min() >= 0]
+    if keep == [0]:
+        return Mesh(positions, corners[:, 0].reshape(-1, 3))
+    first, inverse = unique_rows(corners[:, keep])
+    vertices = corners[first]
+    return Mesh(positions[vertices[:, 0]], inverse.reshape(-1, 3),
+                normals[vertices[:, 2]] if 2 in keep else None,
+                uvs[vertices[:, 1]] if 1 in keep else None)
+
+def read_ply_header(file):
+    """Byte order and elements [(name, count, properties)] of a binary PLY file"""
+    if file.readline().strip() != b"ply":
+        raise RuntimeError("Not a PLY file")
+    byte_order = None
+    elements = []
+    while True:
+        line = file.readline()
+        if not line:
+            raise RuntimeError("PLY header has no end_header")
+        words = line.decode("ascii", "replace").split()
+        if not words or words[0] in ("comment", "obj_info"):
+            continue
+        if words[0] == "end_header":
+            break
+        if words[0] == "format":
+            if words[1] == "ascii":
+                raise RuntimeError("ASCII PLY is not supported, only binary")
+            byte_order = {"binary_little_endian": "<", "binary_big_endian": ">"}[words[1]]
+        elif words[0] == "element":
+            elements.append((words[1], int(words[2]), []))
+        elif words[0] == "property":
+            # Scalars are (name, type), lists (name, count type, item type)
+            if words[1] == "list":
+                elements[-1][2].append((words[4], PLY_TYPES[words[2]], PLY_TYPES[words[3]]))
+            else:
+                elements[-1][2].append((words[2], PLY_TYPES[words[1]]))
+    if byte_order is None:
+        raise RuntimeError("PLY header has no format line")
+    return byte_order, elements
+
+def read_ply_vertices(path, offset, count, dtype):
+    """Positions, normals and uvs (or None) of the vertex element, copied from a memory map"""
+    names = dtype.names
+    if not {"x", "y", "z"} <= set(names):
+        raise RuntimeError("PLY vertices have no x, y, z properties")
+    groups = [("x", "y", "z")]
+    groups.append(("nx", "ny", "nz") if {"nx", "ny", "nz"} <= set(names) else None)
+    groups.append(next((pair for pair in PLY_UV_NAMES if set(pair) <= set(names)), None))
+    arrays = [None if group is None else np.empty((count, len(group)), dtype=np.float32) for group in groups]
+    
+    records = np.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,)) if count else []
+    for start in range(0, count, BLOCK_ROWS):
+        block = records[start:start + BLOCK_ROWS]
+        for group, array in zip(groups, arrays):
+            if group is not None:
+                for column, name in enumerate(group):
+                    array[start:start + len(block), column] = block[name]
+    return arrays
+
+def read_ply_faces(path, offset, count, properties, byte_order):
+    """(T, 3) triangles of the face element and the element's size in bytes"""
+    lists = [i for i, prop in enumerate(properties) if len(prop) == 3]
+    if len(lists) != 1 or properties[lists[0]][0] not in ("vertex_indices", "vertex_index"):
+        raise RuntimeError("PLY faces need exactly one vertex_indices list")
+    _, count_type, index_type = properties[lists[0]]
+    before = sum(np.dtype(prop[1]).itemsize for prop in properties[:lists[0]])
+    after = sum(np.dtype(prop[1]).itemsize for prop in properties[lists[0] + 1:])
+    if count == 0:
+        return np.zeros((0, 3), dtype=np.uint32), 0
+    
+    # Fast path: every face has as many corners as the first, so the element is an
+    # array of fixed-size records
+    with open(path, "rb") as file:
+        file.seek(offset + before)
+        corners = int(np.frombuffer(file.read(np.dtype(count_type).itemsize), dtype=byte_order + count_type)[0])
+        file.seek(0, os.SEEK_END)
+        file_size = file.tell()
+    record = np.dtype({
+        "names": ["count", "indices"],
+        "formats": [byte_order + count_type, (byte_order + index_type, (corners,))],
+        "offsets": [before, before + np.dtype(count_type).itemsize],
+        "itemsize": before + np.dtype(count_type).itemsize + corners * np.dtype(index_type).itemsize + after,
+    })
+    if corners >= 3 and offset + count * record.itemsize <= file_size:
+        records = np.memmap(path, dtype=record, mode="r", offset=offset, shape=(count,))
+        fan = triangulate(np.zeros(1, dtype=np.int64), np.array([corners]))
+        triangles = np.empty((count, len(fan), 3), dtype=np.uint32)
+        for start in range(0, count, BLOCK_ROWS):
+            block = records[start:start + BLOCK_ROWS]
+            if (block["count"] != corners).any():
+                break
+            triangles[start:start + len(block)] = block["indices"][:, fan]
+        else:
+            return triangles.reshape(-1, 3), count * record.itemsize
+    return read_ply_polygons(path, offset, count, before, after, count_type, index_type, byte_order)
+
+def read_ply_polygons(path, offset, count, before, after, count_type, index_type, byte_order):
+    """(T, 3) triangles of a face element whose faces have differing corner counts"""
+    # Only the record boundaries need a Python loop (one step per face); the
+    # indices are then gathered for all faces of a block at once
+    count_size = np.dtype(count_type).itemsize
+    index_size = np.dtype(index_type).itemsize
+    endian = "little" if byte_order == "<" else "big"
+    triangles = []
+    with open(path, "rb") as file:
+        file.seek(offset)
+        data = b""
+        remaining = count
+        size = 0
+        while remaining:
+            block = file.read(CHUNK_BYTES)
+            if not block:
+                raise RuntimeError("PLY file ends inside its face element")
+            data += block
+            starts = []
+            sizes = []
+            position = 0
+            while remaining:
+                corner_offset = position + before
+                if corner_offset + count_size > len(data):
+                    break
+                corners = int.from_bytes(data[corner_offset:corner_offset + count_size], endian)
+                end = corner_offset + count_size + corners * index_size + after
+                if end > len(data):
+                    break
+                starts.append(corner_offset + count_size)
+                sizes.append(corners)
+                position = end
+                remaining -= 1
+            
+            starts = np.array(starts, dtype=np.int64)
+            sizes = np.array(sizes, dtype=np.int64)
+            if (sizes < 3).any():
+                raise RuntimeError("PLY face with fewer than 3 corners")
+            bytes_ = np.frombuffer(data, dtype=np.uint8)
+            corner_starts = np.repeat(starts, sizes) + index_size * (np.arange(sizes.sum()) - np.repeat(np.cumsum(sizes) - sizes, sizes))
+            indices = bytes_[corner_starts[:, np.newaxis] + np.arange(index_size)].copy().view(byte_order + index_type).reshape(-1)
+            triangles.append(indices[triangulate(np.cumsum(sizes) - sizes, sizes)].astype(np.uint32))
+            data = data[position:]
+            size += position
+    return np.concatenate(triangles), size
+
+def load_ply(path):
+    """Load a binary PLY file; its vertex and face elements are already indexed"""
+    with open(path, "rb") as file:
+        byte_order, elements = read_ply_header(file)
+        offset = file.tell()
+    
+    vertices = None
+    triangles = None
+    for name, count, properties in elements:
+        if all(len(prop) == 2 for prop in properties):
+            dtype = np.dtype([(prop[0], byte_order + prop[1]) for prop in properties])
+            if name == "vertex":
+                vertices = read_ply_vertices(path, offset, count, dtype)
+            offset += count * dtype.itemsize
+        elif name == "face":
+            triangles, size = read_ply_faces(path, offset, count, properties, byte_order)
+            offset += size
+        elif vertices is None or triangles is None:
+            raise RuntimeError(f"Unsupported PLY element before the mesh data: {name}")
+        if vertices is not None and triangles is not None:
+            break
+    
+    if vertices is None or triangles is None:
+        raise RuntimeError(f"PLY file needs vertex and face elements: {path}")
+    positions, normals, uvs = vertices
+    if len(triangles) and triangles.max() >= len(positions):
+        raise RuntimeError(f"PLY face references a missing vertex: {path}")
+    return Mesh(positions, triangles, normals, uvs)
+
+def load_mesh(path):
+    """Load an OBJ or binary PLY mesh, chosen by file extension"""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == ".obj":
+        return load_obj(path)
+    if extension == ".ply":
+        return load_ply(path)
+    raise RuntimeError(f"Unsupported mesh format: {path}")
+
+def write_ply(path, mesh):
+    """Write a mesh as binary little-endian PLY, with whatever normals and uvs it has"""
+    groups = [("x", "y", "z", mesh.positions)]
+    if mesh.normals is not None:
+        groups.append(("nx", "ny", "nz", mesh.normals))
+    if mesh.uvs is not None:
+        groups.append(("s", "t", mesh.uvs))
+    names = [name for group in groups for name in group[:-1]]
+    vertices = np.empty(mesh.vertex_count(), dtype=[(name, "<f4") for name in names])
+    for group in groups:
+        for column, name in enumerate(group[:-1]):
+            vertices[name] = group[-1][:, column]
+    faces = np.empty(mesh.triangle_count(), dtype=[("count", "u1"), ("indices", "<u4", (3,))])
+    faces["count"] = 3
+    faces["indices"] = mesh.indices
+    
+    header = ["ply", "format binary_little_endian 1.0", f"element vertex {len(vertices)}"]
+    header += [f"property float {name}" for name in names]
+    header += [f"element face {len(faces)}", "property list uchar uint vertex_indices", "end_header"]
+    with open(path, "wb") as file:
+        file.write(("\n".join(header) + "\n").encode("ascii"))
+        vertices.tofile(file)
+        faces.tofile(file)
+
+def mesh_from_environment(extent=0.5):
+    """Mesh named by the DEMO_MESH environment variable, fitted to extent, or None"""
+    # The default extent is the half size of the triangle the mesh replaces
+    path = os.environ.get("DEMO_MESH")
+    if not path:
+        return None
+    start = time.perf_counter()
+    mesh = load_mesh(path).fit(extent)
+    print(f"Loaded {path}: {mesh.vertex_count()} vertices, {mesh.triangle_count()} triangles "
+          f"in {time.perf_counter() - start:.2f} s")
+    return mesh
+
+def main():
+    """Load each mesh given on the command line and report it"""
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    for path in sys.argv[1:]:
+        start = time.perf_counter()
+        mesh = load_mesh(path)
+        elapsed = time.perf_counter() - start
+        print(f"{path}: {mesh.vertex_count()} vertices, {mesh.triangle_count()} triangles "
+              f"in {elapsed:.2f} s")
+        print(f"  normals: {'file' if mesh.normals is not None else 'generated'}, "
+              f"uvs: {'file' if mesh.uvs is not None else 'generated'}")
+        for name, layout in (("Phong", PHONG_LAYOUT), ("textured", TEXTURED_LAYOUT)):
+            vertices = mesh.vertex_array(layout)
+            print(f"  {name} layout: {vertices.nbytes / 2 ** 20:.1f} MB of vertices, "
+                  f"{mesh.indices.nbytes / 2 ** 20:.1f} MB of indices")
+
+if __name__ == "__main__":
+    main()
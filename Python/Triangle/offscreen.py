@@ -0,0 +1,222 @@
+"""
+Offscreen Rendering
+Headless OpenGL contexts (EGL surfaceless or OSMesa) that render into a framebuffer
+object, so the demos can run without a display and hand back frames as NumPy arrays.
+"""
+
+import ctypes
+import os
+import sys
+import numpy as np
+
+# OpenGL is imported inside the methods below rather than here, so that importing
+# this module does not bind PyOpenGL to a platform before select_platform() runs
+
+BACKENDS = ("egl", "osmesa")
+
+def select_platform(backend="egl"):
+    """Point PyOpenGL at a headless platform; must run before OpenGL is first imported"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown headless backend '{backend}', expected one of {BACKENDS}")
+    
+    # PyOpenGL binds its platform on first import and cannot switch afterwards
+    if "OpenGL.platform" in sys.modules and os.environ.get("PYOPENGL_PLATFORM") != backend:
+        raise RuntimeError(f"OpenGL was imported before selecting the '{backend}' platform")
+    
+    os.environ["PYOPENGL_PLATFORM"] = backend
+    if backend == "egl":
+        # Let Mesa create a display without X11/Wayland (e.g. llvmpipe in CI)
+        os.environ.setdefault("EGL_PLATFORM", "surfaceless")
+
+class OffscreenContext:
+    """Headless GL context with a color + depth framebuffer object of a fixed size"""
+    
+    def __init__(self, width, height, backend="egl", profile="core"):
+        self.width = width
+        self.height = height
+        self.backend = backend
+        self.profile = profile
+        
+        # EGL handles
+        self.egl_display = None
+        self.egl_context = None
+        self.egl_surface = None
+        
+        # OSMesa handles (OSMesa renders into a client-side buffer we own)
+        self.osmesa_context = None
+        self.osmesa_buffer = None
+        
+        self.fbo = None
+        self.renderbuffers = []
+        
+        if backend == "egl":
+            self.create_egl_context()
+        elif backend == "osmesa":
+            self.create_osmesa_context()
+        else:
+            raise ValueError(f"Unknown headless backend '{backend}', expected one of {BACKENDS}")
+        
+        self.create_framebuffer()
+    
+    def create_egl_context(self):
+        """Create an EGL context, surfaceless when the driver allows it"""
+        from OpenGL import EGL
+        
+        try:
+            self.egl_display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+            major, minor = EGL.EGLint(), EGL.EGLint()
+            EGL.eglInitialize(self.egl_display, ctypes.pointer(major), ctypes.pointer(minor))
+        except Exception as e:
+            raise RuntimeError(f"Failed to initialize EGL display: {e}")
+        
+        # Pick a config that can back a desktop OpenGL context
+        config_attribs = (EGL.EGLint * 5)(
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_NONE,
+        )
+        config = EGL.EGLConfig()
+        num_configs = EGL.EGLint()
+        EGL.eglChooseConfig(self.egl_display, config_attribs, ctypes.pointer(config), 1, ctypes.pointer(num_configs))
+        if num_configs.value == 0:
+            raise RuntimeError("No EGL config supports desktop OpenGL")
+        
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        
+        # Same 3.3 Core Profile the GLFW demos request, or the highest
+        # compatibility profile for the immediate-mode demo
+        if self.profile == "core":
+            context_attribs = (EGL.EGLint * 7)(
+                EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+                EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+                EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT,
+                EGL.EGL_NONE,
+            )
+        else:
+            context_attribs = (EGL.EGLint * 3)(
+                EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_COMPATIBILITY_PROFILE_BIT,
+                EGL.EGL_NONE,
+            )
+        self.egl_context = EGL.eglCreateContext(self.egl_display, config, EGL.EGL_NO_CONTEXT, context_attribs)
+        if not self.egl_context:
+            raise RuntimeError("Failed to create EGL context")
+        
+        # Rendering goes to our FBO, so no surface is needed when
+        # EGL_KHR_surfaceless_context is available; fall back to a pbuffer
+        try:
+            made_current = EGL.eglMakeCurrent(self.egl_display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, self.egl_context)
+        except Exception:
+            made_current = False
+        if not made_current:
+            surface_attribs = (EGL.EGLint * 5)(EGL.EGL_WIDTH, self.width, EGL.EGL_HEIGHT, self.height, EGL.EGL_NONE)
+            self.egl_surface = EGL.eglCreatePbufferSurface(self.egl_display, config, surface_attribs)
+            if not EGL.eglMakeCurrent(self.egl_display, self.egl_surface, self.egl_surface, self.egl_context):
+                raise RuntimeError("Failed to make EGL context current")
+    
+    def create_osmesa_context(self):
+        """Create an OSMesa software context rendering into a client buffer"""
+        from OpenGL import osmesa, arrays
+        from OpenGL.GL import GL_UNSIGNED_BYTE
+        
+        attribs = [
+            osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA,
+            osmesa.OSMESA_DEPTH_BITS, 24,
+        ]
+        if self.profile == "core":
+            attribs += [
+                osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+                osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3,
+                osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3,
+            ]
+        else:
+            attribs += [osmesa.OSMESA_PROFILE, osmesa.OSMESA_COMPAT_PROFILE]
+        attribs.append(0)
+        
+        self.osmesa_context = osmesa.OSMesaCreateContextAttribs(attribs, None)
+        if not self.osmesa_context:
+            raise RuntimeError("Failed to create OSMesa context")
+        
+        self.osmesa_buffer = arrays.GLubyteArray.zeros((self.height, self.width, 4))
+        if not osmesa.OSMesaMakeCurrent(self.osmesa_context, self.osmesa_buffer, GL_UNSIGNED_BYTE, self.width, self.height):
+            raise RuntimeError("Failed to make OSMesa context current")
+    
+    def create_framebuffer(self):
+        """Create the RGBA8 + depth FBO every frame is rendered into"""
+        from OpenGL.GL import (
+            glGenFramebuffers, glBindFramebuffer, glGenRenderbuffers, glBindRenderbuffer,
+            glRenderbufferStorage, glFramebufferRenderbuffer, glCheckFramebufferStatus,
+            GL_FRAMEBUFFER, GL_RENDERBUFFER, GL_RGBA8, GL_DEPTH24_STENCIL8,
+            GL_COLOR_ATTACHMENT0, GL_DEPTH_STENCIL_ATTACHMENT, GL_FRAMEBUFFER_COMPLETE,
+        )
+        
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        
+        color, depth = glGenRenderbuffers(2)
+        self.renderbuffers = [color, depth]
+        
+        # Color attachment
+        glBindRenderbuffer(GL_RENDERBUFFER, color)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, self.width, self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, color)
+        
+        # Depth attachment
+        glBindRenderbuffer(GL_RENDERBUFFER, depth)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH24_STENCIL8, self.width, self.height)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_STENCIL_ATTACHMENT, GL_RENDERBUFFER, depth)
+        glBindRenderbuffer(GL_RENDERBUFFER, 0)
+        
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("Offscreen framebuffer is incomplete")
+        
+        self.bind()
+    
+    def bind(self):
+        """Make the offscreen FBO the draw target and cover it with the viewport"""
+        from OpenGL.GL import glBindFramebuffer, glViewport, GL_FRAMEBUFFER
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, self.width, self.height)
+    
+    def read_pixels(self):
+        """Return the current frame as a (height, width, 4) uint8 array, top row first"""
+        from OpenGL.GL import (
+            glBindFramebuffer, glReadBuffer, glPixelStorei, glReadPixels,
+            GL_READ_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_PACK_ALIGNMENT, GL_RGBA, GL_UNSIGNED_BYTE,
+        )
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.fbo)
+        glReadBuffer(GL_COLOR_ATTACHMENT0)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        data = glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE)
+        
+        # OpenGL rows start at the bottom, images start at the top
+        pixels = np.frombuffer(data, dtype=np.uint8).reshape(self.height, self.width, 4)
+        return np.ascontiguousarray(pixels[::-1])
+    
+    def save_png(self, path):
+        """Write the current frame to a PNG file"""
+        from PIL import Image
+        Image.fromarray(self.read_pixels(), "RGBA").save(path)
+    
+    def destroy(self):
+        """Release the framebuffer and the context"""
+        from OpenGL.GL import glDeleteFramebuffers, glDeleteRenderbuffers
+        
+        if self.fbo:
+            glDeleteFramebuffers(1, [self.fbo])
+            glDeleteRenderbuffers(len(self.renderbuffers), self.renderbuffers)
+            self.fbo = None
+            self.renderbuffers = []
+        
+        if self.egl_context:
+            from OpenGL import EGL
+            EGL.eglMakeCurrent(self.egl_display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            if self.egl_surface:
+                EGL.eglDestroySurface(self.egl_display, self.egl_surface)
+            EGL.eglDestroyContext(self.egl_display, self.egl_context)
+            EGL.eglTerminate(self.egl_display)
+            self.egl_context = None
+        
+        if self.osmesa_context:
+            from OpenGL import osmesa
+            osmesa.OSMesaDestroyContext(self.osmesa_context)
+            self.osmesa_context = None
@@ -0,0 +1,82 @@
+"""
+Phong Shading
+NumPy version of the advanced Phong fragment shader, evaluated for whole arrays of
+fragments (a G-buffer, or the visible pixels of a software-rasterized frame) at once.
+
+Every input may be a single value or an array broadcasting against the positions, so
+per-pixel materials work the same way as the shader's uniforms.
+"""
+
+import numpy as np
+
+def normalize(vectors):
+    """Unit vectors along the last axis, like GLSL normalize()"""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return vectors / np.sqrt(np.sum(vectors * vectors, axis=-1, keepdims=True))
+
+def dot(a, b):
+    """Dot product along the last axis, keeping it as a length-1 axis"""
+    return np.sum(a * b, axis=-1, keepdims=True)
+
+def shade_phong(positions, normals, light_pos, view_pos, object_color, light_color=(1.0, 1.0, 1.0),
+                ambient_strength=0.3, specular_strength=0.0, shininess=32.0, light_intensity=1.0):
+    """(..., 3) RGB of the ambient + diffuse + specular model for (..., 3) positions and normals"""
+    positions = np.asarray(positions, dtype=np.float32)
+    light_pos = np.asarray(light_pos, dtype=np.float32)
+    view_pos = np.asarray(view_pos, dtype=np.float32)
+    object_color = np.asarray(object_color, dtype=np.float32)
+    light = np.asarray(light_color, dtype=np.float32) * np.asarray(light_intensity, dtype=np.float32)[..., np.newaxis]
+    
+    # Scalar material terms get a trailing axis so they broadcast against RGB
+    ambient_strength = np.asarray(ambient_strength, dtype=np.float32)[..., np.newaxis]
+    specular_strength = np.asarray(specular_strength, dtype=np.float32)[..., np.newaxis]
+    shininess = np.asarray(shininess, dtype=np.float32)[..., np.newaxis]
+    
+    # Ambient lighting
+    ambient = ambient_strength * light
+    
+    # Diffuse lighting
+    norm = normalize(normals)
+    light_dir = normalize(light_pos - positions)
+    diff = np.maximum(dot(norm, light_dir), 0.0)
+    diffuse = diff * light
+    
+    # Specular lighting, reflect(-lightDir, norm) = -lightDir + 2 * dot(norm, lightDir) * norm
+    view_dir = normalize(view_pos - positions)
+    reflect_dir = 2.0 * dot(norm, light_dir) * norm - light_dir
+    spec = np.power(np.maximum(dot(view_dir, reflect_dir), 0.0), shininess)
+    specular = specular_strength * spec * light
+    
+    # Combine all lighting components
+    return (ambient + diffuse + specular) * object_color
+
+def shade_point_lights(positions, normals, view_pos, light_positions, light_colors, light_radii,
+                       specular_strength=0.0, shininess=32.0):
+    """(P, 3) diffuse + specular light of point lights that fade to zero at their radius"""
+    positions = np.asarray(positions, dtype=np.float32).reshape(-1, 3)
+    count = len(positions)
+    norm = normalize(np.asarray(normals, dtype=np.float32).reshape(-1, 3))
+    view_dir = normalize(np.asarray(view_pos, dtype=np.float32) - positions)
+    specular_strength = np.broadcast_to(np.asarray(specular_strength, dtype=np.float32), (count,))
+    shininess = np.broadcast_to(np.asarray(shininess, dtype=np.float32), (count,))
+    
+    # Each light only touches the fragments inside its radius, like a tile's list
+    result = np.zeros((count, 3), dtype=np.float32)
+    for light_pos, color, radius in zip(light_positions, light_colors, light_radii):
+        to_light = light_pos - positions
+        distance_sq = np.sum(to_light * to_light, axis=-1)
+        inside = np.nonzero(distance_sq < radius * radius)[0]
+        if len(inside) == 0:
+            continue
+        
+        to_light = to_light[inside]
+        distance = np.sqrt(distance_sq[inside])[:, np.newaxis]
+        attenuation = np.square(np.clip(1.0 - distance / radius, 0.0, 1.0))
+        light_dir = to_light / distance
+        n = norm[inside]
+        diff = np.maximum(dot(n, light_dir), 0.0)
+        reflect_dir = 2.0 * dot(n, light_dir) * n - light_dir
+        spec = np.power(np.maximum(dot(view_dir[inside], reflect_dir), 0.0), shininess[inside, np.newaxis])
+        result[inside] += (diff + specular_strength[inside, np.newaxis] * spec) * attenuation * color
+    return result
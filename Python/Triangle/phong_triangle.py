@@ -6,9 +6,29 @@ Very basic version to ensure triangle is visible.
 
 import numpy as np
 import glfw
-from OpenGL.GL import *
-import math
-import random
+from gl_optional import *
+from shader_program import create_program
+from frame_profiler import NullProfiler
+from render_scheduler import RenderScheduler
+from transforms import MvpTransform
+from phong_shading import shade_phong
+from normals import random_normals
+from mesh_loader import mesh_from_environment, PHONG_LAYOUT
+from vertex_cache import compact_indices
+from vertex_format import format_from_environment
+from frame_uniforms import FrameUniforms, bind_uniform_blocks, CAMERA_BLOCK, LIGHT_BLOCK
+from software_rasterizer import transform_vertices
+
+# Light and camera shared by the GL and software renderers
+LIGHT_POSITION = (1.0, 1.0, 2.0)
+VIEW_POSITION = (0.0, 0.0, 3.0)
+LIGHT_COLOR = (1.0, 1.0, 1.0)
+OBJECT_COLOR = (0.8, 0.2, 0.2)
+
+def phong_fragment(values):
+    """Software fragment shader: the advanced Phong model with a fixed ambient and no specular"""
+    return shade_phong(values[:, 0:3], values[:, 3:6], LIGHT_POSITION, VIEW_POSITION, OBJECT_COLOR,
+                       LIGHT_COLOR, ambient_strength=0.3, specular_strength=0.0)
 
 class PhongTriangle:
     def __init__(self):
@@ -16,6 +36,9 @@ class PhongTriangle:
         self.shader_program = None
         self.vao = None
         self.vbo = None
+        self.ebo = None
+        self.index_type = None
+        self.frame_uniforms = None
         
         # Simple triangle vertices (3D positions + normals)
         self.vertices = np.array([
@@ -25,12 +48,31 @@ class PhongTriangle:
              0.0,  0.5, 0.0,  0.0, 0.0, 1.0,  # Top center
         ], dtype=np.float32)
         
+        # Triangle corners as indices into the vertices, drawn from an element buffer
+        self.indices = compact_indices(np.arange(3))
+        
+        # A mesh named by DEMO_MESH replaces the triangle, keeping its own normals
+        self.mesh = mesh_from_environment()
+        if self.mesh:
+            self.vertices = self.mesh.vertex_array(PHONG_LAYOUT).reshape(-1)
+            self.indices = compact_indices(self.mesh.indices)
+        
+        # GPU layout of the vertices, float unless VERTEX_FORMAT picks a packed one
+        self.vertex_format = format_from_environment(PHONG_LAYOUT)
+        
         # Animation parameters
         self.rotation_angle = 0.0
         self.time = 0.0
         
+        # Model/view/projection matrices, rebuilt in place every frame
+        self.transform = MvpTransform(aspect=800.0 / 600.0, distance=3.0)
+        
+        # Per-phase frame timing, replaced by a FrameProfiler when benchmarking
+        self.profiler = NullProfiler()
+        
     def init_glfw(self):
         """Initialize GLFW and create window"""
+        require_opengl()
         if not glfw.init():
             raise RuntimeError("Failed to initialize GLFW")
         
@@ -49,48 +91,45 @@ class PhongTriangle:
         glfw.make_context_current(self.window)
         glfw.set_window_size_callback(self.window, self.window_size_callback)
         
-        # Enable depth testing
-        glEnable(GL_DEPTH_TEST)
-        
     def window_size_callback(self, window, width, height):
         """Handle window resize"""
         glViewport(0, 0, width, height)
+        self.transform.projection.resize(width, height)
         
     def create_shaders(self):
         """Create and compile shaders"""
         # Very simple vertex shader
-        vertex_shader_source = """
+        vertex_shader_source = f"""
         #version 330 core
         layout (location = 0) in vec3 aPos;
         layout (location = 1) in vec3 aNormal;
-        
-        uniform mat4 mvp;
+        {CAMERA_BLOCK}
+        uniform float positionScale;
         
         out vec3 Normal;
         out vec3 FragPos;
         
         void main()
-        {
-            FragPos = aPos;
+        {{
+            vec3 position = aPos * positionScale;
+            FragPos = position;
             Normal = aNormal;
-            gl_Position = mvp * vec4(aPos, 1.0);
-        }
+            gl_Position = mvp * vec4(position, 1.0);
+        }}
         """
         
         # Simple fragment shader with basic lighting
-        fragment_shader_source = """
+        fragment_shader_source = f"""
         #version 330 core
         out vec4 FragColor;
         
         in vec3 Normal;
         in vec3 FragPos;
-        
-        uniform vec3 lightPos;
-        uniform vec3 lightColor;
+        {LIGHT_BLOCK}
         uniform vec3 objectColor;
         
         void main()
-        {
+        {{
             // Ambient lighting
             float ambient = 0.3;
             vec3 ambientColor = ambient * lightColor;
@@ -104,46 +143,27 @@ class PhongTriangle:
             // Combine lighting
             vec3 result = (ambientColor + diffuseColor) * objectColor;
             FragColor = vec4(result, 1.0);
-        }
+        }}
         """
         
-        # Compile vertex shader
-        vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-        glShaderSource(vertex_shader, vertex_shader_source)
-        glCompileShader(vertex_shader)
-        
-        # Check vertex shader compilation
-        success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(vertex_shader)
-            raise RuntimeError(f"Vertex shader compilation failed: {info_log}")
-        
-        # Compile fragment shader
-        fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-        glShaderSource(fragment_shader, fragment_shader_source)
-        glCompileShader(fragment_shader)
-        
-        # Check fragment shader compilation
-        success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(fragment_shader)
-            raise RuntimeError(f"Fragment shader compilation failed: {info_log}")
-        
-        # Create shader program
-        self.shader_program = glCreateProgram()
-        glAttachShader(self.shader_program, vertex_shader)
-        glAttachShader(self.shader_program, fragment_shader)
-        glLinkProgram(self.shader_program)
-        
-        # Check program linking
-        success = glGetProgramiv(self.shader_program, GL_LINK_STATUS)
-        if not success:
-            info_log = glGetProgramInfoLog(self.shader_program)
-            raise RuntimeError(f"Shader program linking failed: {info_log}")
-        
-        # Clean up shaders
-        glDeleteShader(vertex_shader)
-        glDeleteShader(fragment_shader)
+        # Compile and link (or load from the program binary cache)
+        self.shader_program = create_program(vertex_shader_source, fragment_shader_source)
+        print(f"Shaders loaded {self.shader_program.build_summary()}")
+        bind_uniform_blocks(self.shader_program)
+        
+    def setup(self):
+        """Create GL resources once a context (window or headless) is current"""
+        # Enable depth testing
+        glEnable(GL_DEPTH_TEST)
+        
+        self.create_shaders()
+        self.setup_buffers()
+        self.frame_uniforms = FrameUniforms()
+        self.generate_random_normals()  # Start with random normals
+        
+    def setup_software(self):
+        """Prepare for render_software(), with the same random normals setup() would pick"""
+        self.generate_random_normals()
         
     def setup_buffers(self):
         """Setup VAO and VBO"""
@@ -154,112 +174,97 @@ class PhongTriangle:
         # Generate and bind VBO
         self.vbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+        packed = self.vertex_format.pack(self.vertices)
+        glBufferData(GL_ARRAY_BUFFER, packed.nbytes, packed, GL_STATIC_DRAW)
         
-        # Position attribute (location = 0)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 6 * 4, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(0)
+        # Position (location = 0) and normal (location = 1) attributes
+        self.vertex_format.setup_attributes()
         
-        # Normal attribute (location = 1)
-        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 6 * 4, ctypes.c_void_p(3 * 4))
-        glEnableVertexAttribArray(1)
+        # Element buffer; the VAO records its binding, so shared vertices are
+        # stored and transformed once instead of once per triangle
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+        self.index_type = GL_UNSIGNED_SHORT if self.indices.dtype == np.uint16 else GL_UNSIGNED_INT
         
-        # Unbind
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        # Unbind (the VAO first, so it keeps the element buffer)
         glBindVertexArray(0)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
         
     def generate_random_normals(self):
         """Generate random normals for demonstration"""
+        if self.mesh:
+            print("Keeping the mesh normals")
+            return
         print("Generating random normals...")
         
-        # Generate random normals for each vertex
-        for i in range(3):  # 3 vertices
-            # Generate random normal vector
-            nx = random.uniform(-1.0, 1.0)
-            ny = random.uniform(-1.0, 1.0)
-            nz = random.uniform(0.0, 1.0)  # Keep Z positive for visibility
-            
-            # Normalize the vector
-            length = math.sqrt(nx*nx + ny*ny + nz*nz)
-            nx /= length
-            ny /= length
-            nz /= length
-            
-            # Update the normal in vertices array (positions 3,4,5 for each vertex)
-            vertex_offset = i * 6
-            self.vertices[vertex_offset + 3] = nx
-            self.vertices[vertex_offset + 4] = ny
-            self.vertices[vertex_offset + 5] = nz
-            
+        # One random unit normal per vertex, written into the normal columns at once
+        normals = random_normals(3)
+        self.vertices.reshape(-1, 6)[:, 3:6] = normals
+        for i, (nx, ny, nz) in enumerate(normals):
             print(f"Vertex {i}: Normal = ({nx:.3f}, {ny:.3f}, {nz:.3f})")
         
-        # Update VBO with new normals
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferSubData(GL_ARRAY_BUFFER, 0, self.vertices.nbytes, self.vertices)
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
-        
-    def create_mvp_matrix(self):
-        """Create Model-View-Projection matrix"""
-        # Model matrix (rotation around Y axis)
-        model = np.eye(4, dtype=np.float32)
-        cos_angle = math.cos(self.rotation_angle)
-        sin_angle = math.sin(self.rotation_angle)
-        model[0, 0] = cos_angle
-        model[0, 2] = sin_angle
-        model[2, 0] = -sin_angle
-        model[2, 2] = cos_angle
-        
-        # View matrix (camera looking at origin)
-        view = np.eye(4, dtype=np.float32)
-        view[2, 3] = -3.0  # Move camera back
-        
-        # Projection matrix (perspective)
-        fov = 45.0
-        aspect = 800.0 / 600.0
-        near = 0.1
-        far = 100.0
-        
-        projection = np.zeros((4, 4), dtype=np.float32)
-        f = 1.0 / math.tan(math.radians(fov) / 2.0)
-        projection[0, 0] = f / aspect
-        projection[1, 1] = f
-        projection[2, 2] = (far + near) / (near - far)
-        projection[2, 3] = (2 * far * near) / (near - far)
-        projection[3, 2] = -1.0
-        
-        # Combine matrices: MVP = Projection * View * Model
-        mvp = np.dot(projection, np.dot(view, model))
-        return mvp
+        # Update VBO with new normals (there is none when rendering in software)
+        if self.vbo:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            packed = self.vertex_format.pack(self.vertices)
+            glBufferSubData(GL_ARRAY_BUFFER, 0, packed.nbytes, packed)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
         
     def render(self):
         """Render the triangle"""
         # Clear screen with a light blue color
         glClearColor(0.2, 0.3, 0.5, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.profiler.mark("draw")
         
         # Use shader program
-        glUseProgram(self.shader_program)
+        self.shader_program.use()
         
-        # Create and set MVP matrix
-        mvp = self.create_mvp_matrix()
-        mvp_loc = glGetUniformLocation(self.shader_program, "mvp")
-        glUniformMatrix4fv(mvp_loc, 1, GL_FALSE, mvp)
+        # Create the MVP matrix
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
         
-        # Set lighting uniforms
-        light_pos_loc = glGetUniformLocation(self.shader_program, "lightPos")
-        light_color_loc = glGetUniformLocation(self.shader_program, "lightColor")
-        object_color_loc = glGetUniformLocation(self.shader_program, "objectColor")
+        # Camera and lighting go out in one uniform buffer upload
+        self.frame_uniforms.set_camera(mvp, VIEW_POSITION)
+        self.frame_uniforms.set_light(LIGHT_POSITION, LIGHT_COLOR)
+        self.frame_uniforms.upload()
         
-        glUniform3f(light_pos_loc, 1.0, 1.0, 2.0)  # Light position
-        glUniform3f(light_color_loc, 1.0, 1.0, 1.0)  # White light
-        glUniform3f(object_color_loc, 0.8, 0.2, 0.2)  # Red color
+        # The material stays a plain uniform (unchanged values are not re-uploaded)
+        self.shader_program.set_vec3("objectColor", OBJECT_COLOR)
+        self.shader_program.set_float("positionScale", self.vertex_format.position_scale)
+        self.profiler.mark("uniforms")
         
         # Draw triangle
         glBindVertexArray(self.vao)
-        glDrawArrays(GL_TRIANGLES, 0, 3)
-        
-        # Swap buffers
-        glfw.swap_buffers(self.window)
+        glDrawElements(GL_TRIANGLES, len(self.indices), self.index_type, None)
+        self.profiler.mark("draw")
+        
+        # Swap buffers (headless contexts render into an FBO instead)
+        if self.window:
+            glfw.swap_buffers(self.window)
+        self.profiler.mark("swap")
+        
+    def render_software(self, rasterizer):
+        """Render the triangle with the CPU rasterizer, same lighting as the fragment shader"""
+        rasterizer.clear((0.2, 0.3, 0.5, 1.0))
+        self.profiler.mark("draw")
+        
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        
+        # Each vertex is transformed once, then expanded to the triangle corners
+        vertices = self.vertices.reshape(-1, 6)
+        clip = transform_vertices(vertices[:, :3], mvp)[self.indices]
+        vertices = vertices[self.indices]
+        rasterizer.draw(clip, vertices, phong_fragment)
+        self.profiler.mark("draw")
+        
+    def update(self, time):
+        """Advance the animation to the given time in seconds"""
+        self.time = time
+        self.rotation_angle = self.time * 0.5  # Slow rotation
         
     def run(self):
         """Main render loop"""
@@ -268,13 +273,11 @@ class PhongTriangle:
         print("  R - Generate new random normals")
         print("  ESC - Exit")
         
-        while not glfw.window_should_close(self.window):
+        # The scene rotates, so it needs a new frame every time round the loop
+        scheduler = RenderScheduler(self.window, animated=True)
+        while scheduler.next_frame():
             # Update time and rotation
-            self.time = glfw.get_time()
-            self.rotation_angle = self.time * 0.5  # Slow rotation
-            
-            # Handle input
-            glfw.poll_events()
+            self.update(glfw.get_time())
             
             # Check for key presses
             if glfw.get_key(self.window, glfw.KEY_R) == glfw.PRESS:
@@ -293,8 +296,12 @@ class PhongTriangle:
             glDeleteVertexArrays(1, [self.vao])
         if self.vbo:
             glDeleteBuffers(1, [self.vbo])
+        if self.ebo:
+            glDeleteBuffers(1, [self.ebo])
+        if self.frame_uniforms:
+            self.frame_uniforms.delete()
         if self.shader_program:
-            glDeleteProgram(self.shader_program)
+            self.shader_program.delete()
         glfw.terminate()
 
 def main():
@@ -302,9 +309,7 @@ def main():
     try:
         demo = PhongTriangle()
         demo.init_glfw()
-        demo.create_shaders()
-        demo.setup_buffers()
-        demo.generate_random_normals()  # Start with random normals
+        demo.setup()
         demo.run()
     except Exception as e:
         print(f"Error: {e}")
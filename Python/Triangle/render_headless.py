@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Headless Triangle Demo Renderer
+Renders any Triangle demo into an offscreen framebuffer (EGL or OSMesa) at fixed
+animation times and saves the frames as PNG images or NumPy arrays.
+"""
+
+import argparse
+import functools
+import importlib
+import os
+import random
+import numpy as np
+
+from frame_profiler import NullProfiler
+from offscreen import BACKENDS, OffscreenContext, select_platform
+from software_rasterizer import SoftwareRasterizer, solid_color, transform_vertices
+
+# Demo name -> (module, class, width, height, GL profile); sizes match the GLFW windows
+DEMOS = {
+    "simple_triangle": ("render_headless", "SimpleTriangle", 800, 600, "core"),
+    "triangle_demo": ("triangle_demo", "TriangleRenderer", 800, 600, "core"),
+    "triangle_pygame": ("triangle_pygame", "TriangleRenderer", 800, 600, "compat"),
+    "phong_triangle": ("phong_triangle", "PhongTriangle", 800, 600, "core"),
+    "advanced_phong_triangle": ("advanced_phong_triangle", "AdvancedPhongTriangleDemo", 1000, 800, "core"),
+    "textured_triangle": ("textured_triangle", "TexturedTriangleDemo", 800, 600, "core"),
+    "advanced_textured_triangle": ("advanced_textured_triangle", "AdvancedTexturedTriangleDemo", 1000, 800, "core"),
+    "advanced_textured_instanced": ("advanced_textured_triangle", "InstancedTexturedTriangleDemo", 1000, 800, "core"),
+}
+
+# CPU rasterizer backend for hosts without any OpenGL implementation; demos opt in
+# by providing render_software(rasterizer), plus setup_software() if they need one
+SOFTWARE_BACKEND = "software"
+
+class SimpleTriangle:
+    """Adapter giving the function-based simple_triangle.py the demo class interface"""
+    def __init__(self):
+        self.window = None
+        self.handles = None
+        self.profiler = NullProfiler()
+        
+    def setup(self):
+        """Create the triangle's GL objects"""
+        import simple_triangle
+        self.handles = simple_triangle.create_triangle()
+        
+    def update(self, time):
+        """Static scene, nothing to animate"""
+        pass
+        
+    def render(self):
+        """Draw the triangle"""
+        import simple_triangle
+        shader_program, vao, vbo = self.handles
+        simple_triangle.draw_triangle(shader_program, vao)
+        self.profiler.mark("draw")
+        
+    def render_software(self, rasterizer):
+        """Draw the triangle with the CPU rasterizer, matching simple_triangle's shaders"""
+        import simple_triangle
+        rasterizer.clear((0.2, 0.3, 0.3, 1.0))
+        rasterizer.depth_test = False
+        clip = transform_vertices(simple_triangle.VERTICES.reshape(-1, 3))
+        rasterizer.draw(clip, np.zeros((3, 0)), functools.partial(solid_color, (1.0, 0.5, 0.2, 1.0)))
+        self.profiler.mark("draw")
+        
+    def cleanup(self):
+        """Release the triangle's GL objects"""
+        import simple_triangle
+        if self.handles:
+            simple_triangle.delete_triangle(*self.handles)
+
+class HeadlessRenderer:
+    """Runs one demo class on an offscreen context (or the CPU rasterizer) and returns rendered frames"""
+    def __init__(self, name, width=None, height=None, backend="egl", seed=0, fallback=True, threads=1, processes=False):
+        module_name, class_name, default_width, default_height, profile = DEMOS[name]
+        self.name = name
+        self.width = width or default_width
+        self.height = height or default_height
+        self.context = None
+        self.rasterizer = None
+        
+        # Create the context before the demo so its setup() has GL available,
+        # falling back to the software rasterizer when there is no GL at all
+        if backend != SOFTWARE_BACKEND:
+            try:
+                self.context = OffscreenContext(self.width, self.height, backend=backend, profile=profile)
+            except Exception as e:
+                if not fallback:
+                    raise
+                print(f"Warning: no {backend} OpenGL context ({e}), using the software rasterizer")
+        if self.context is None:
+            self.rasterizer = SoftwareRasterizer(self.width, self.height, threads=threads, processes=processes)
+        
+        # Demos that randomize normals get the same values on every run
+        random.seed(seed)
+        np.random.seed(seed)
+        
+        module = importlib.import_module(module_name)
+        self.demo = getattr(module, class_name)()
+        
+        # A --size override changes the aspect ratio the demo was built for
+        transform = getattr(self.demo, "transform", None)
+        if transform is not None:
+            transform.projection.resize(self.width, self.height)
+        if self.rasterizer:
+            if not hasattr(self.demo, "render_software"):
+                raise RuntimeError(f"Demo '{name}' has no software renderer")
+            if hasattr(self.demo, "setup_software"):
+                self.demo.setup_software()
+        elif self.demo.setup() is False:
+            raise RuntimeError(f"Failed to set up demo '{name}'")
+        
+    def draw(self, time):
+        """Render the demo at the given animation time without reading it back"""
+        self.demo.update(time)
+        if self.rasterizer:
+            self.demo.render_software(self.rasterizer)
+        else:
+            self.context.bind()
+            self.demo.render()
+        
+    def render(self, time):
+        """Render the demo at the given animation time and return an RGBA array"""
+        self.draw(time)
+        if self.rasterizer:
+            return self.rasterizer.read_pixels()
+        return self.context.read_pixels()
+        
+    def close(self):
+        """Release the demo's GL objects and the offscreen context"""
+        if self.rasterizer:
+            self.rasterizer.close()
+        if self.context is None:
+            return
+        
+        # Demo cleanup also calls glfw.terminate(), which is harmless without a window
+        cleanup = getattr(self.demo, "cleanup", None)
+        if cleanup:
+            cleanup()
+        self.context.destroy()
+
+def save_frame(pixels, path):
+    """Save a frame as .npy or as an image (format from the file extension)"""
+    if path.endswith(".npy"):
+        np.save(path, pixels)
+    else:
+        from PIL import Image
+        Image.fromarray(pixels, "RGBA").save(path)
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Render Triangle demos without a display")
+    parser.add_argument("demos", nargs="*", help=f"demos to render (default: all of {', '.join(DEMOS)})")
+    parser.add_argument("--backend", choices=BACKENDS + (SOFTWARE_BACKEND,), default="egl", help="headless GL backend, or the CPU rasterizer")
+    parser.add_argument("--times", type=float, nargs="+", default=[0.0], help="animation times in seconds")
+    parser.add_argument("--size", type=int, nargs=2, metavar=("WIDTH", "HEIGHT"), help="override frame size")
+    parser.add_argument("--format", choices=("png", "npy"), default="png", help="output file format")
+    parser.add_argument("--output", default="frames", help="output directory")
+    parser.add_argument("--seed", type=int, default=0, help="seed for demos with random normals")
+    parser.add_argument("--threads", type=int, default=1, help="software rasterizer tile threads (0: one per core)")
+    parser.add_argument("--processes", action="store_true", help="run the --threads tile workers as processes")
+    args = parser.parse_args()
+    
+    unknown = [name for name in args.demos if name not in DEMOS]
+    if unknown:
+        parser.error(f"unknown demos: {', '.join(unknown)}")
+    
+    # Must happen before any demo module imports OpenGL
+    if args.backend != SOFTWARE_BACKEND:
+        select_platform(args.backend)
+    
+    width, height = args.size if args.size else (None, None)
+    os.makedirs(args.output, exist_ok=True)
+    
+    for name in args.demos or list(DEMOS):
+        renderer = HeadlessRenderer(name, width, height, backend=args.backend, seed=args.seed, threads=args.threads, processes=args.processes)
+        try:
+            for time in args.times:
+                path = os.path.join(args.output, f"{name}_t{time:.2f}.{args.format}")
+                save_frame(renderer.render(time), path)
+                print(f"Saved {path}")
+        finally:
+            renderer.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Render Scheduler
+Dirty-flag redraw scheduling for the GLFW demos. Static scenes sleep in
+glfw.wait_events() and only redraw after a resize, expose or input event; animated
+scenes declare that they need continuous frames, paced by a FramePacer.
+"""
+
+import glfw
+from frame_pacer import pacer_from_environment
+
+# Window events that can change what should be on screen. The scheduler chains onto
+# callbacks the demo already installed instead of replacing them.
+REDRAW_CALLBACKS = (
+    glfw.set_window_refresh_callback,
+    glfw.set_framebuffer_size_callback,
+    glfw.set_window_size_callback,
+    glfw.set_key_callback,
+    glfw.set_mouse_button_callback,
+    glfw.set_scroll_callback,
+)
+
+class RenderScheduler:
+    """Decides when a demo's run() loop draws a frame"""
+    
+    def __init__(self, window, animated=False, pacer=None):
+        self.window = window
+        
+        # Animated scenes draw every frame; static ones only when dirty
+        self.animated = animated
+        self.dirty = True
+        
+        # Swap interval and frame rate of continuous frames (FRAME_PACING by default)
+        self.pacer = pacer or pacer_from_environment()
+        self.pacer.attach()
+        
+        # Install after the demo's own callbacks, which keep being called first
+        for set_callback in REDRAW_CALLBACKS:
+            set_callback(window, self.chain(set_callback, window))
+    
+    def chain(self, set_callback, window):
+        """Callback that runs the demo's previous callback, then marks the frame dirty"""
+        previous = set_callback(window, None)
+        
+        def callback(*args):
+            if previous:
+                previous(*args)
+            self.dirty = True
+        return callback
+    
+    def request_redraw(self):
+        """Draw one more frame; safe to call from other threads"""
+        self.dirty = True
+        glfw.post_empty_event()
+    
+    def set_animated(self, animated):
+        """Switch between continuous frames and redraw-on-demand"""
+        self.animated = animated
+        self.request_redraw()
+    
+    def next_frame(self):
+        """Handle events, blocking while nothing needs drawing; False once the window closes"""
+        while not glfw.window_should_close(self.window):
+            if self.animated:
+                self.pacer.wait()
+            if self.animated or self.dirty:
+                glfw.poll_events()
+                self.dirty = False
+                if glfw.window_should_close(self.window):
+                    break
+                return True
+            
+            # Sleeps until any event arrives, so an idle static scene costs no CPU
+            self.pacer.pause()
+            glfw.wait_events()
+        
+        self.pacer.report()
+        return False
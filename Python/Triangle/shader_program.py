@@ -0,0 +1,252 @@
+"""
+Shader Program Helpers
+Compiles and links GLSL programs with an on-disk program binary cache, and wraps
+linked programs with a cached uniform-location table that skips redundant uploads.
+"""
+
+import hashlib
+import os
+import time
+import numpy as np
+from gl_optional import *
+
+# Linked program binaries are stored here, keyed by source and driver hash.
+# Override with the SHADER_CACHE_DIR environment variable.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "graphics-course", "shaders")
+
+class ShaderProgram:
+    """Linked GL program with a cached uniform-location table and typed setters"""
+    
+    def __init__(self, program):
+        self.program = program
+        
+        # Uniform name -> location, filled once from the active uniform list
+        self.locations = {}
+        
+        # Location -> last uploaded value, used to skip redundant uploads
+        self.values = {}
+        
+        # Build timings in milliseconds, filled in by create_program()
+        self.from_cache = False
+        self.timings = {}
+        
+        self.introspect_uniforms()
+    
+    def introspect_uniforms(self):
+        """Query every active uniform once and cache its location"""
+        count = glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)
+        if count == 0:
+            return
+        
+        # Uniforms that live in a uniform block have no location, skip them
+        indices = np.arange(count, dtype=np.uint32)
+        block_indices = np.zeros(count, dtype=np.int32)
+        glGetActiveUniformsiv(self.program, count, indices, GL_UNIFORM_BLOCK_INDEX, block_indices)
+        
+        for i in range(count):
+            if block_indices[i] != -1:
+                continue
+            name, size, uniform_type = glGetActiveUniform(self.program, i)
+            name = name.decode() if isinstance(name, bytes) else name
+            location = glGetUniformLocation(self.program, name)
+            if location < 0:
+                continue
+            
+            # Arrays are reported as "name[0]", expose them as "name" too
+            if name.endswith("[0]"):
+                self.locations[name[:-3]] = location
+            self.locations[name] = location
+    
+    def location(self, name):
+        """Cached location of a uniform, -1 if it is not active"""
+        return self.locations.get(name, -1)
+    
+    def use(self):
+        """Make this program current"""
+        glUseProgram(self.program)
+    
+    def location_if_changed(self, name, value):
+        """Record value for the uniform, returning its location if an upload is needed"""
+        location = self.locations.get(name, -1)
+        if location < 0 or self.values.get(location) == value:
+            return -1
+        self.values[location] = value
+        return location
+    
+    def set_int(self, name, value):
+        """Set an int (or sampler) uniform; the program must be in use"""
+        value = int(value)
+        location = self.location_if_changed(name, value)
+        if location >= 0:
+            glUniform1i(location, value)
+    
+    def set_float(self, name, value):
+        """Set a float uniform; the program must be in use"""
+        value = float(value)
+        location = self.location_if_changed(name, value)
+        if location >= 0:
+            glUniform1f(location, value)
+    
+    def set_vec3(self, name, value):
+        """Set a vec3 uniform from any 3-element sequence"""
+        x, y, z = (float(v) for v in value)
+        location = self.location_if_changed(name, (x, y, z))
+        if location >= 0:
+            glUniform3f(location, x, y, z)
+    
+    def set_mat4(self, name, matrix):
+        """Set a mat4 uniform from a 4x4 float32 array (uploaded untransposed)"""
+        matrix = np.asarray(matrix, dtype=np.float32)
+        location = self.location_if_changed(name, matrix.tobytes())
+        if location >= 0:
+            glUniformMatrix4fv(location, 1, GL_FALSE, matrix)
+    
+    def build_summary(self):
+        """One-line description of how the program was built and how long it took"""
+        if not self.timings:
+            return "built externally"
+        source = "program binary cache" if self.from_cache else "GLSL source"
+        details = ", ".join(f"{name} {ms:.2f} ms" for name, ms in self.timings.items())
+        return f"from {source} ({details})"
+        
+    def delete(self):
+        """Delete the GL program object"""
+        glDeleteProgram(self.program)
+        self.program = 0
+        self.locations.clear()
+        self.values.clear()
+
+
+def compile_shader(shader_type, source):
+    """Compile one shader stage, raising RuntimeError with the info log on failure"""
+    shader = glCreateShader(shader_type)
+    glShaderSource(shader, source)
+    glCompileShader(shader)
+    
+    # Check shader compilation
+    success = glGetShaderiv(shader, GL_COMPILE_STATUS)
+    if not success:
+        info_log = glGetShaderInfoLog(shader)
+        glDeleteShader(shader)
+        stage = "Vertex" if shader_type == GL_VERTEX_SHADER else "Fragment"
+        raise RuntimeError(f"{stage} shader compilation failed: {info_log}")
+    return shader
+
+def link_program(vertex_shader_source, fragment_shader_source, timings, retrievable=False):
+    """Compile both stages from source and link them, recording timings in ms"""
+    start = time.perf_counter()
+    vertex_shader = compile_shader(GL_VERTEX_SHADER, vertex_shader_source)
+    fragment_shader = compile_shader(GL_FRAGMENT_SHADER, fragment_shader_source)
+    timings["compile"] = (time.perf_counter() - start) * 1000.0
+    
+    # Create shader program
+    start = time.perf_counter()
+    program = glCreateProgram()
+    if retrievable:
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+    glAttachShader(program, vertex_shader)
+    glAttachShader(program, fragment_shader)
+    glLinkProgram(program)
+    
+    # Clean up shaders
+    glDeleteShader(vertex_shader)
+    glDeleteShader(fragment_shader)
+    
+    # Check program linking
+    success = glGetProgramiv(program, GL_LINK_STATUS)
+    if not success:
+        info_log = glGetProgramInfoLog(program)
+        glDeleteProgram(program)
+        raise RuntimeError(f"Shader program linking failed: {info_log}")
+    timings["link"] = (time.perf_counter() - start) * 1000.0
+    return program
+
+def program_binaries_supported():
+    """Whether the current context can save and restore program binaries"""
+    try:
+        return bool(glProgramBinary) and glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+    except Exception:
+        return False
+
+def program_cache_path(cache_dir, vertex_shader_source, fragment_shader_source):
+    """Cache file for a source pair on the current driver"""
+    # Binaries are only valid for the driver that produced them
+    driver = b"|".join(glGetString(name) or b"" for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+    digest = hashlib.sha256()
+    digest.update(driver)
+    digest.update(b"\0" + vertex_shader_source.encode())
+    digest.update(b"\0" + fragment_shader_source.encode())
+    return os.path.join(cache_dir, digest.hexdigest() + ".bin")
+
+def load_program_binary(path):
+    """Create a program from a cached binary, or return None if it is missing or rejected"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+    if len(data) <= 4:
+        return None
+    
+    # File layout: uint32 binary format followed by the driver blob
+    binary_format = int(np.frombuffer(data, dtype=np.uint32, count=1)[0])
+    blob = np.frombuffer(data, dtype=np.uint8, offset=4)
+    
+    program = glCreateProgram()
+    glProgramBinary(program, binary_format, blob, len(blob))
+    if not glGetProgramiv(program, GL_LINK_STATUS):
+        # Driver update or corrupt file, fall back to compiling from source
+        glGetError()
+        glDeleteProgram(program)
+        return None
+    return program
+
+def save_program_binary(program, path):
+    """Write the linked program's binary to the cache, ignoring I/O failures"""
+    length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+    if length <= 0:
+        return
+    blob = np.empty(length, dtype=np.uint8)
+    binary_format = GLenum(0)
+    written = GLsizei(0)
+    glGetProgramBinary(program, length, written, binary_format, blob)
+    
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Write to a temporary file first so a crash never leaves a torn entry
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(np.uint32(binary_format.value).tobytes())
+            f.write(blob[:written.value].tobytes())
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write shader cache {path}: {e}")
+
+def create_program(vertex_shader_source, fragment_shader_source, cache_dir=None, use_cache=True):
+    """Build a ShaderProgram, reusing a cached program binary when the driver accepts it"""
+    if cache_dir is None:
+        cache_dir = os.environ.get("SHADER_CACHE_DIR", DEFAULT_CACHE_DIR)
+    use_cache = use_cache and program_binaries_supported()
+    
+    timings = {}
+    program = None
+    path = None
+    start = time.perf_counter()
+    
+    if use_cache:
+        path = program_cache_path(cache_dir, vertex_shader_source, fragment_shader_source)
+        program = load_program_binary(path)
+        timings["binary load"] = (time.perf_counter() - start) * 1000.0
+    
+    from_cache = program is not None
+    if not from_cache:
+        program = link_program(vertex_shader_source, fragment_shader_source, timings, retrievable=use_cache)
+        if use_cache:
+            save_program_binary(program, path)
+    
+    shader_program = ShaderProgram(program)
+    timings["total"] = (time.perf_counter() - start) * 1000.0
+    shader_program.from_cache = from_cache
+    shader_program.timings = timings
+    return shader_program
@@ -6,35 +6,20 @@ A minimal example for testing PyOpenGL installation
 
 import glfw
 import numpy as np
-from OpenGL.GL import *
+from gl_optional import *
+from render_scheduler import RenderScheduler
 import sys
 
-def main():
-    # Initialize GLFW
-    if not glfw.init():
-        print("Failed to initialize GLFW")
-        return
-    
-    # Create window with OpenGL 3.3 Core Profile (modern approach)
-    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
-    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 3)
-    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
-    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, GL_TRUE)
-    
-    window = glfw.create_window(800, 600, "Simple Triangle", None, None)
-    if not window:
-        print("Failed to create GLFW window")
-        glfw.terminate()
-        return
-    
-    glfw.make_context_current(window)
-    
-    # Triangle vertices (position only)
-    vertices = np.array([
-        -0.5, -0.5, 0.0,  # Left
-         0.5, -0.5, 0.0,  # Right
-         0.0,  0.5, 0.0   # Top
-    ], dtype=np.float32)
+# Triangle vertices (position only)
+VERTICES = np.array([
+    -0.5, -0.5, 0.0,  # Left
+     0.5, -0.5, 0.0,  # Right
+     0.0,  0.5, 0.0   # Top
+], dtype=np.float32)
+
+def create_triangle():
+    """Create the shader program, VAO and VBO (needs a current GL context)"""
+    vertices = VERTICES
     
     # Create simple shaders
     vertex_shader_source = """
@@ -92,30 +77,64 @@ def main():
     glBindBuffer(GL_ARRAY_BUFFER, 0)
     glBindVertexArray(0)
     
+    return shader_program, vao, vbo
+
+def draw_triangle(shader_program, vao):
+    """Clear the screen and draw the triangle"""
+    glClearColor(0.2, 0.3, 0.3, 1.0)
+    glClear(GL_COLOR_BUFFER_BIT)
+    
+    # Use modern shader-based rendering
+    glUseProgram(shader_program)
+    glBindVertexArray(vao)
+    glDrawArrays(GL_TRIANGLES, 0, 3)
+
+def delete_triangle(shader_program, vao, vbo):
+    """Release the GL objects created by create_triangle()"""
+    glDeleteVertexArrays(1, [vao])
+    glDeleteBuffers(1, [vbo])
+    glDeleteProgram(shader_program)
+
+def main():
+    # The demo draws with OpenGL only
+    require_opengl()
+    
+    # Initialize GLFW
+    if not glfw.init():
+        print("Failed to initialize GLFW")
+        return
+    
+    # Create window with OpenGL 3.3 Core Profile (modern approach)
+    glfw.window_hint(glfw.CONTEXT_VERSION_MAJOR, 3)
+    glfw.window_hint(glfw.CONTEXT_VERSION_MINOR, 3)
+    glfw.window_hint(glfw.OPENGL_PROFILE, glfw.OPENGL_CORE_PROFILE)
+    glfw.window_hint(glfw.OPENGL_FORWARD_COMPAT, GL_TRUE)
+    
+    window = glfw.create_window(800, 600, "Simple Triangle", None, None)
+    if not window:
+        print("Failed to create GLFW window")
+        glfw.terminate()
+        return
+    
+    glfw.make_context_current(window)
+    
+    shader_program, vao, vbo = create_triangle()
+    
     print("Simple Triangle Demo is running!")
     print("Press ESC or close window to exit")
     
-    # Render loop
-    while not glfw.window_should_close(window):
-        glClearColor(0.2, 0.3, 0.3, 1.0)
-        glClear(GL_COLOR_BUFFER_BIT)
-        
-        # Use modern shader-based rendering
-        glUseProgram(shader_program)
-        glBindVertexArray(vao)
-        glDrawArrays(GL_TRIANGLES, 0, 3)
-        
+    # Render loop; the triangle never changes, so only redraw when the window needs it
+    scheduler = RenderScheduler(window)
+    while scheduler.next_frame():
+        draw_triangle(shader_program, vao)
         glfw.swap_buffers(window)
-        glfw.poll_events()
         
         # Handle ESC key
         if glfw.get_key(window, glfw.KEY_ESCAPE) == glfw.PRESS:
             glfw.set_window_should_close(window, True)
     
     # Cleanup
-    glDeleteVertexArrays(1, [vao])
-    glDeleteBuffers(1, [vbo])
-    glDeleteProgram(shader_program)
+    delete_triangle(shader_program, vao, vbo)
     glfw.terminate()
 
 if __name__ == "__main__":
@@ -0,0 +1,457 @@
+"""
+Software Rasterizer
+Pure-NumPy reference rasterizer for hosts without OpenGL: vectorized edge functions over
+bounding-box pixel blocks, perspective-correct barycentric varyings and a depth buffer.
+
+Triangles are first rasterized into fragments (pixel, depth, triangle, barycentrics),
+the nearest fragment per pixel is resolved with one sort, and only those visible
+fragments are shaded, in a single vectorized call to the fragment function.
+
+With threads > 1 the screen is split into tiles, triangles are binned into the tiles
+their bounding boxes touch, and tiles are rasterized, resolved and shaded in parallel.
+Thread workers share one interpreter: NumPy releases the GIL inside large array loops,
+but the per-tile bookkeeping and the ufunc.at scatters of the resolve hold it, so
+threads overlap only part of a frame. With processes=True the tiles go to worker
+processes instead, which write straight into a color and depth buffer kept in
+multiprocessing.shared_memory; the fragment function is pickled to them, so it must be
+a module-level function (or a functools.partial of one), not a closure or lambda.
+"""
+
+import os
+import multiprocessing
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import numpy as np
+
+# Triangles whose bounding box covers at most this many pixels are rasterized
+# together in batches; larger ones are walked one at a time in row bands
+SMALL_TRIANGLE_PIXELS = 1024
+
+# Pixels evaluated per block, bounds the size of temporary arrays
+BLOCK_PIXELS = 1 << 16
+
+# Edge length of a screen tile in tiled mode, in pixels
+TILE_SIZE = 128
+
+# (shared memory, rasterizer) pairs attached in a worker process, by shared memory name
+WORKER_RASTERIZERS = {}
+
+def transform_vertices(positions, mvp=None):
+    """Object-space (N, 3) positions to clip-space (N, 4), w = 1 without an mvp"""
+    positions = np.asarray(positions, dtype=np.float32)
+    clip = np.empty((len(positions), 4), dtype=np.float32)
+    clip[:, :3] = positions
+    clip[:, 3] = 1.0
+    if mvp is None:
+        return clip
+    
+    # The demos upload row-major matrices untransposed, so GLSL sees mvp transposed
+    # and gl_Position = transpose(mvp) * v, which is v @ mvp for row vectors
+    return clip @ np.asarray(mvp, dtype=np.float32)
+
+def varying_color(values):
+    """Fragment function that outputs its interpolated varyings as the color"""
+    return values
+
+def solid_color(color, values):
+    """Fragment function that outputs one color; bind it with functools.partial"""
+    return np.broadcast_to(np.asarray(color, dtype=np.float32), (len(values), len(color)))
+
+def clip_depth(clip, varyings):
+    """Clip (N, 3, 4) triangles to -w <= z <= w; returns clip, varyings and source indices"""
+    # Distances to the near and far planes, both >= 0 inside; together they also
+    # guarantee w >= 0, which the perspective divide below relies on
+    distances = (clip[..., 2] + clip[..., 3], clip[..., 3] - clip[..., 2])
+    inside = (distances[0] >= 0.0) & (distances[1] >= 0.0)
+    all_inside = inside.all(axis=1)
+    outside = ((distances[0] < 0.0).all(axis=1)) | ((distances[1] < 0.0).all(axis=1))
+    crossing = ~all_inside & ~outside
+    if not crossing.any():
+        source = np.nonzero(all_inside & (clip[..., 3] > 0.0).all(axis=1))[0]
+        return clip[source], varyings[source], source
+    
+    # Sutherland-Hodgman against each plane in turn; triangles reaching behind the
+    # camera or past the far plane are rare, so a loop over them is fine
+    new_clip, new_varyings, new_source = [], [], []
+    for index in np.nonzero(crossing)[0]:
+        polygon = list(zip(clip[index].astype(np.float64), varyings[index].astype(np.float64)))
+        for sign in (1.0, -1.0):
+            clipped = []
+            for i in range(len(polygon)):
+                (p_i, v_i), (p_j, v_j) = polygon[i], polygon[(i + 1) % len(polygon)]
+                d_i = p_i[3] + sign * p_i[2]
+                d_j = p_j[3] + sign * p_j[2]
+                if d_i >= 0.0:
+                    clipped.append((p_i, v_i))
+                if (d_i >= 0.0) != (d_j >= 0.0):
+                    t = d_i / (d_i - d_j)
+                    clipped.append((p_i + t * (p_j - p_i), v_i + t * (v_j - v_i)))
+            polygon = clipped
+        
+        # Triangulate the clipped polygon as a fan
+        for k in range(1, len(polygon) - 1):
+            fan = (polygon[0], polygon[k], polygon[k + 1])
+            new_clip.append([vertex[0] for vertex in fan])
+            new_varyings.append([vertex[1] for vertex in fan])
+            new_source.append(index)
+    
+    source = np.concatenate([np.nonzero(all_inside)[0], np.array(new_source, dtype=np.int64)])
+    clip = np.concatenate([clip[all_inside], np.array(new_clip, dtype=np.float32).reshape(-1, 3, 4)])
+    varyings = np.concatenate([varyings[all_inside], np.array(new_varyings, dtype=np.float32).reshape(-1, 3, varyings.shape[2])])
+    
+    # Keep submission order, it decides which of two equally deep fragments wins.
+    # Triangles touching w = 0 (on both planes at once) have no area on screen
+    order = np.argsort(source, kind="stable")
+    order = order[(clip[order, :, 3] > 0.0).all(axis=1)]
+    return clip[order], varyings[order], source[order]
+
+class TriangleSetup:
+    """Per-triangle screen-space data shared by every pixel block of a draw"""
+    
+    def __init__(self, clip, width, height):
+        # Perspective divide and viewport transform (window y points up, like OpenGL)
+        w = clip[..., 3].astype(np.float64)
+        x = (clip[..., 0] / w * 0.5 + 0.5) * width
+        y = (clip[..., 1] / w * 0.5 + 0.5) * height
+        z = clip[..., 2] / w
+        
+        # Make every triangle counter-clockwise so inside means all edges >= 0
+        area = (x[:, 1] - x[:, 0]) * (y[:, 2] - y[:, 0]) - (y[:, 1] - y[:, 0]) * (x[:, 2] - x[:, 0])
+        self.permutation = np.where((area < 0.0)[:, np.newaxis], [0, 2, 1], [0, 1, 2])
+        rows = np.arange(len(clip))[:, np.newaxis]
+        x, y, z, w = (a[rows, self.permutation] for a in (x, y, z, w))
+        self.area = np.abs(area)
+        self.x, self.y, self.z, self.inv_w = x, y, z, 1.0 / w
+        
+        # Edge i is opposite vertex i: E_i(p) = A_i * px + B_i * py + C_i
+        a_x, a_y = x[:, [1, 2, 0]], y[:, [1, 2, 0]]
+        b_x, b_y = x[:, [2, 0, 1]], y[:, [2, 0, 1]]
+        self.edge_a = -(b_y - a_y)
+        self.edge_b = b_x - a_x
+        self.edge_c = (b_y - a_y) * a_x - (b_x - a_x) * a_y
+        
+        # Top-left fill rule: pixels exactly on an edge belong to top and left edges
+        # only, so triangles sharing an edge never both cover its pixels
+        self.top_left = (b_y < a_y) | ((b_y == a_y) & (b_x < a_x))
+        
+        # Pixel-center bounding boxes, clamped to the viewport
+        self.x_min = np.clip(np.ceil(x.min(axis=1) - 0.5), 0, width).astype(np.int64)
+        self.x_max = np.clip(np.floor(x.max(axis=1) - 0.5), -1, width - 1).astype(np.int64)
+        self.y_min = np.clip(np.ceil(y.min(axis=1) - 0.5), 0, height).astype(np.int64)
+        self.y_max = np.clip(np.floor(y.max(axis=1) - 0.5), -1, height - 1).astype(np.int64)
+        self.visible = (self.area > 0.0) & (self.x_max >= self.x_min) & (self.y_max >= self.y_min)
+    
+    def coverage(self, triangles, px, py):
+        """Inside mask and edge function values at the pixel centers of the given triangles"""
+        px = px + 0.5
+        py = py + 0.5
+        lam = []
+        inside = None
+        for i in range(3):
+            a = self.edge_a[triangles, i]
+            b = self.edge_b[triangles, i]
+            c = self.edge_c[triangles, i]
+            top_left = self.top_left[triangles, i]
+            edge = a * px + b * py + c
+            covered = (edge > 0.0) | ((edge == 0.0) & top_left)
+            inside = covered if inside is None else inside & covered
+            lam.append(edge)
+        return inside, lam
+
+class SoftwareRasterizer:
+    """CPU framebuffer (RGBA float color + depth) that draws triangles like the GL demos do"""
+    
+    def __init__(self, width, height, threads=1, tile_size=TILE_SIZE, processes=False):
+        self.width = width
+        self.height = height
+        self.color = np.zeros((height, width, 4), dtype=np.float32)
+        self.depth = np.ones((height, width), dtype=np.float32)
+        
+        # Matches glEnable(GL_DEPTH_TEST) with the default GL_LESS
+        self.depth_test = True
+        
+        # Tiles own disjoint pixels, so they need no locking; threads share the GIL
+        # for everything NumPy does not run in C, processes share only the framebuffer
+        self.threads = threads or os.cpu_count() or 1
+        self.tile_size = tile_size
+        self.pool = None
+        self.shared = None
+        if self.threads > 1 and processes:
+            self.shared = shared_memory.SharedMemory(create=True, size=self.color.nbytes + self.depth.nbytes)
+            self.bind(self.shared.buf)
+            self.clear()
+            context = multiprocessing.get_context("spawn")
+            self.pool = ProcessPoolExecutor(max_workers=self.threads, mp_context=context)
+        elif self.threads > 1:
+            self.pool = ThreadPoolExecutor(max_workers=self.threads, thread_name_prefix="rasterizer")
+    
+    def bind(self, buffer):
+        """Use a buffer of color.nbytes + depth.nbytes bytes as the color and depth buffers"""
+        color_bytes = self.width * self.height * 4 * 4
+        self.color = np.ndarray((self.height, self.width, 4), dtype=np.float32, buffer=buffer)
+        self.depth = np.ndarray((self.height, self.width), dtype=np.float32, buffer=buffer, offset=color_bytes)
+    
+    def clear(self, color=(0.0, 0.0, 0.0, 1.0), depth=True):
+        """Fill the color buffer (and the depth buffer unless depth is False)"""
+        self.color[...] = color
+        if depth:
+            self.depth[...] = 1.0
+    
+    def draw(self, clip_positions, varyings, fragment, flat=None):
+        """Draw (3N, 4) clip positions with (3N, K) varyings and shade the visible pixels"""
+        # fragment(values) receives the (P, K) interpolated varyings of the visible
+        # pixels, followed by the columns of the optional per-triangle (N, F) flat
+        # array, and returns (P, 3) or (P, 4) colors in 0..1
+        clip = np.asarray(clip_positions, dtype=np.float32).reshape(-1, 3, 4)
+        varyings = np.asarray(varyings, dtype=np.float32)
+        varyings = varyings.reshape(len(clip), 3, varyings.shape[-1])
+        clip, varyings, source = clip_depth(clip, varyings)
+        if len(clip) == 0:
+            return
+        
+        setup = TriangleSetup(clip, self.width, self.height)
+        varyings = varyings[np.arange(len(varyings))[:, np.newaxis], setup.permutation]
+        if flat is not None:
+            flat = np.asarray(flat, dtype=np.float32)
+            if flat.ndim == 1:
+                flat = flat[:, np.newaxis]
+            flat = flat[source]
+        
+        if self.pool is None:
+            self.draw_region(setup, varyings, flat, fragment)
+            return
+        if self.shared is not None:
+            self.draw_processes(setup, clip, varyings, flat, fragment)
+            return
+        
+        # fragment() is called from several threads at once, one tile each
+        tiles = self.bin_triangles(setup)
+        futures = [self.pool.submit(self.draw_region, setup, varyings, flat, fragment, *tile) for tile in tiles]
+        for future in futures:
+            future.result()
+    
+    def draw_processes(self, setup, clip, varyings, flat, fragment):
+        """Split the tiles into one batch per worker process and wait for them to draw"""
+        # Greedy balance by triangle count, busiest tiles first
+        batches = [[] for _ in range(self.threads)]
+        loads = np.zeros(self.threads, dtype=np.int64)
+        for tile in self.bin_triangles(setup):
+            worker = np.argmin(loads)
+            batches[worker].append(tile)
+            loads[worker] += len(tile[0])
+        
+        # Each worker gets only the triangles its tiles touch, renumbered in draw
+        # order so depth ties resolve exactly as in a single-threaded draw
+        frame = (self.shared.name, self.width, self.height, self.depth_test)
+        futures = []
+        for batch in batches:
+            if not batch:
+                continue
+            used = np.unique(np.concatenate([triangles for triangles, _, _ in batch]))
+            tiles = [(np.searchsorted(used, triangles), x_range, y_range) for triangles, x_range, y_range in batch]
+            flat_used = None if flat is None else flat[used]
+            futures.append(self.pool.submit(draw_tiles, frame, clip[used], varyings[used], flat_used, fragment, tiles))
+        for future in futures:
+            future.result()
+    
+    def draw_region(self, setup, varyings, flat, fragment, triangles=None, x_range=None, y_range=None):
+        """Rasterize, resolve and shade the given triangles inside a pixel rectangle"""
+        pixels, depths, triangles, lam = self.rasterize(setup, triangles, x_range, y_range)
+        if len(pixels) == 0:
+            return
+        winners = self.resolve(pixels, depths, triangles, x_range, y_range)
+        pixels, triangles, lam = pixels[winners], triangles[winners], lam[winners]
+        
+        # Perspective-correct barycentrics: interpolate attribute / w, then divide by 1 / w
+        weights = lam * setup.inv_w[triangles]
+        weights /= weights.sum(axis=1, keepdims=True)
+        values = np.einsum("pk,pkj->pj", weights.astype(np.float32), varyings[triangles])
+        if flat is not None:
+            values = np.concatenate([values, flat[triangles]], axis=1)
+        
+        colors = np.asarray(fragment(values), dtype=np.float32)
+        color = self.color.reshape(-1, 4)
+        color[pixels, :colors.shape[1]] = colors
+        if colors.shape[1] == 3:
+            color[pixels, 3] = 1.0
+    
+    def bin_triangles(self, setup):
+        """(triangles, x_range, y_range) for every tile touched by a visible bounding box"""
+        visible = np.nonzero(setup.visible)[0]
+        if len(visible) == 0:
+            return []
+        size = self.tile_size
+        tiles_x = (self.width + size - 1) // size
+        tile_x0, tile_x1 = setup.x_min[visible] // size, setup.x_max[visible] // size
+        tile_y0, tile_y1 = setup.y_min[visible] // size, setup.y_max[visible] // size
+        
+        # One (tile, triangle) entry per tile in each triangle's span of tiles
+        span_x = tile_x1 - tile_x0 + 1
+        counts = span_x * (tile_y1 - tile_y0 + 1)
+        offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        span_x = np.repeat(span_x, counts)
+        tile_x = np.repeat(tile_x0, counts) + offsets % span_x
+        tile_y = np.repeat(tile_y0, counts) + offsets // span_x
+        
+        # A stable sort keeps triangles in draw order within each tile
+        tiles = tile_y * tiles_x + tile_x
+        order = np.argsort(tiles, kind="stable")
+        tiles, triangles = tiles[order], np.repeat(visible, counts)[order]
+        starts = np.flatnonzero(np.diff(tiles)) + 1
+        
+        bins = []
+        for tile, group in zip(tiles[np.concatenate([[0], starts])], np.split(triangles, starts)):
+            if len(group) == 0:
+                continue
+            x0, y0 = tile % tiles_x * size, tile // tiles_x * size
+            bins.append((group, (x0, min(x0 + size, self.width)), (y0, min(y0 + size, self.height))))
+        
+        # Start the busiest tiles first so they do not finish last
+        bins.sort(key=lambda tile: -len(tile[0]))
+        return bins
+    
+    def rasterize(self, setup, triangles=None, x_range=None, y_range=None):
+        """Fragments of the given triangles (default all) inside an optional pixel rectangle"""
+        if triangles is None:
+            triangles = np.nonzero(setup.visible)[0]
+        x_lo, x_hi = x_range if x_range else (0, self.width)
+        y_lo, y_hi = y_range if y_range else (0, self.height)
+        
+        # Bounding boxes restricted to the rectangle
+        x_min = np.maximum(setup.x_min[triangles], x_lo)
+        x_max = np.minimum(setup.x_max[triangles], x_hi - 1)
+        y_min = np.maximum(setup.y_min[triangles], y_lo)
+        y_max = np.minimum(setup.y_max[triangles], y_hi - 1)
+        box_w = x_max - x_min + 1
+        box_h = y_max - y_min + 1
+        keep = (box_w > 0) & (box_h > 0)
+        triangles, x_min, y_min, box_w, box_h = (a[keep] for a in (triangles, x_min, y_min, box_w, box_h))
+        
+        parts = []
+        small = box_w * box_h <= SMALL_TRIANGLE_PIXELS
+        if small.any():
+            parts += self.rasterize_small(setup, triangles[small], x_min[small], y_min[small], box_w[small], box_h[small])
+        for t, x0, y0, bw, bh in zip(*(a[~small] for a in (triangles, x_min, y_min, box_w, box_h))):
+            parts += self.rasterize_large(setup, t, x0, y0, bw, bh)
+        
+        if not parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, np.empty(0, dtype=np.float32), empty, np.empty((0, 3), dtype=np.float64)
+        pixels, depths, tris, lam = (np.concatenate(column) for column in zip(*parts))
+        return pixels, depths, tris, lam
+    
+    def rasterize_small(self, setup, triangles, x_min, y_min, box_w, box_h):
+        """Rasterize many small triangles at once, grouped by power-of-two box size"""
+        parts = []
+        grid_w = 1 << np.ceil(np.log2(box_w)).astype(np.int64)
+        grid_h = 1 << np.ceil(np.log2(box_h)).astype(np.int64)
+        for gw, gh in set(zip(grid_w.tolist(), grid_h.tolist())):
+            group = np.nonzero((grid_w == gw) & (grid_h == gh))[0]
+            offsets_x = np.arange(gw)
+            offsets_y = np.arange(gh)[:, np.newaxis]
+            for start in range(0, len(group), max(1, BLOCK_PIXELS // (gw * gh))):
+                chunk = group[start:start + max(1, BLOCK_PIXELS // (gw * gh))]
+                t = triangles[chunk][:, np.newaxis, np.newaxis]
+                px = x_min[chunk][:, np.newaxis, np.newaxis] + offsets_x
+                py = y_min[chunk][:, np.newaxis, np.newaxis] + offsets_y
+                in_box = (offsets_x < box_w[chunk][:, np.newaxis, np.newaxis]) & (offsets_y < box_h[chunk][:, np.newaxis, np.newaxis])
+                parts.append(self.fragments(setup, t, px, py, in_box))
+        return parts
+    
+    def rasterize_large(self, setup, triangle, x_min, y_min, box_w, box_h):
+        """Rasterize one large triangle in bands of rows"""
+        parts = []
+        band = max(1, BLOCK_PIXELS // box_w)
+        px = x_min + np.arange(box_w)
+        for y0 in range(y_min, y_min + box_h, band):
+            py = np.arange(y0, min(y0 + band, y_min + box_h))[:, np.newaxis]
+            parts.append(self.fragments(setup, triangle, px, py, None))
+        return parts
+    
+    def fragments(self, setup, triangles, px, py, mask):
+        """Covered, depth-clipped fragments of a block as flat arrays"""
+        inside, edges = setup.coverage(triangles, px, py)
+        if mask is not None:
+            inside &= mask
+        index = np.nonzero(inside)
+        if len(index[0]) == 0:
+            return (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32),
+                    np.empty(0, dtype=np.int64), np.empty((0, 3), dtype=np.float64))
+        
+        px = np.broadcast_to(px, inside.shape)[index]
+        py = np.broadcast_to(py, inside.shape)[index]
+        tris = np.broadcast_to(triangles, inside.shape)[index]
+        lam = np.stack([np.broadcast_to(edge, inside.shape)[index] for edge in edges], axis=1)
+        lam /= setup.area[tris][:, np.newaxis]
+        
+        # Depth is linear in screen space; clip against near/far like OpenGL does
+        z = (lam * setup.z[tris]).sum(axis=1)
+        keep = (z >= -1.0) & (z <= 1.0)
+        depth = (z[keep] * 0.5 + 0.5).astype(np.float32)
+        return py[keep] * self.width + px[keep], depth, tris[keep], lam[keep]
+    
+    def resolve(self, pixels, depths, triangles, x_range=None, y_range=None):
+        """Index of the fragment that ends up visible in each pixel, updating the depth buffer"""
+        # Scatter-min per pixel with ufunc.at is far cheaper than sorting the fragments.
+        # The scratch arrays cover only the pixel rectangle, so a tile worker fills
+        # tile-sized arrays instead of full-frame ones
+        if x_range:
+            (x0, x1), (y0, y1) = x_range, y_range
+            rows, columns = np.divmod(pixels, self.width)
+            slots = (rows - y0) * (x1 - x0) + (columns - x0)
+            slot_count = (x1 - x0) * (y1 - y0)
+        else:
+            slots, slot_count = pixels, self.width * self.height
+        
+        if self.depth_test:
+            # Nearest fragment per pixel; on equal depth the first drawn wins (GL_LESS)
+            nearest = np.full(slot_count, np.inf, dtype=np.float32)
+            np.minimum.at(nearest, slots, depths)
+            candidates = np.nonzero(depths == nearest[slots])[0]
+            first = np.full(slot_count, np.iinfo(np.int64).max, dtype=np.int64)
+            np.minimum.at(first, slots[candidates], triangles[candidates])
+            winners = candidates[triangles[candidates] == first[slots[candidates]]]
+            
+            depth = self.depth.reshape(-1)
+            passed = depths[winners] < depth[pixels[winners]]
+            winners = winners[passed]
+            depth[pixels[winners]] = depths[winners]
+            return winners
+        
+        # Without depth testing the last triangle drawn covers the pixel
+        last = np.full(slot_count, -1, dtype=np.int64)
+        np.maximum.at(last, slots, triangles)
+        return np.nonzero(triangles == last[slots])[0]
+    
+    def read_pixels(self):
+        """Return the frame as a (height, width, 4) uint8 array, top row first"""
+        pixels = np.rint(np.clip(self.color, 0.0, 1.0) * 255.0).astype(np.uint8)
+        return np.ascontiguousarray(pixels[::-1])
+    
+    def close(self):
+        """Stop the tile workers and move the frame out of shared memory"""
+        if self.pool:
+            self.pool.shutdown()
+            self.pool = None
+        if self.shared is not None:
+            self.color = self.color.copy()
+            self.depth = self.depth.copy()
+            self.shared.close()
+            self.shared.unlink()
+            self.shared = None
+
+def draw_tiles(frame, clip, varyings, flat, fragment, tiles):
+    """Worker process entry: draw (triangles, x_range, y_range) tiles into a shared frame"""
+    name, width, height, depth_test = frame
+    if name not in WORKER_RASTERIZERS:
+        # Attached once per worker; the pool is shut down before the memory is unlinked
+        shared = shared_memory.SharedMemory(name=name)
+        rasterizer = SoftwareRasterizer(width, height)
+        rasterizer.bind(shared.buf)
+        WORKER_RASTERIZERS[name] = (shared, rasterizer)
+    rasterizer = WORKER_RASTERIZERS[name][1]
+    rasterizer.depth_test = depth_test
+    
+    setup = TriangleSetup(clip, width, height)
+    for triangles, x_range, y_range in tiles:
+        rasterizer.draw_region(setup, varyings, flat, fragment, triangles, x_range, y_range)
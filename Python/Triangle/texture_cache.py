@@ -0,0 +1,134 @@
+"""
+Texture Cache
+Decodes images once into a flipped RGBA mip chain stored in a raw, memory-mappable
+file, so later launches skip PIL entirely and upload straight from np.memmap.
+"""
+
+import hashlib
+import os
+import numpy as np
+from PIL import Image
+from gl_optional import *
+
+# Decoded mip chains are stored here, keyed by source path, size and mtime.
+# Override with the TEXTURE_CACHE_DIR environment variable.
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "graphics-course", "textures")
+
+# File layout (all uint32, little endian):
+#   magic, version, level count, then (width, height, byte offset) per level,
+#   followed by the RGBA8 rows of each level, bottom row first, 64-byte aligned
+MAGIC = int.from_bytes(b"GCTX", "little")
+VERSION = 1
+ALIGNMENT = 64
+
+def build_mip_chain(image):
+    """Box-filtered RGBA levels from full size down to 1x1, flipped for OpenGL"""
+    image = image.convert("RGBA") if image.mode != "RGBA" else image
+    width, height = image.size
+    levels = []
+    while True:
+        # OpenGL has (0,0) at bottom-left, images have (0,0) at top-left
+        levels.append(np.ascontiguousarray(np.asarray(image)[::-1]))
+        if width == 1 and height == 1:
+            return levels
+        
+        # Level sizes must halve with rounding down for the texture to be complete
+        width, height = max(1, width // 2), max(1, height // 2)
+        image = image.resize((width, height), Image.BOX)
+
+def texture_cache_path(cache_dir, image_path):
+    """Cache file for the current contents of image_path"""
+    stat = os.stat(image_path)
+    key = f"{os.path.realpath(image_path)}|{stat.st_size}|{stat.st_mtime_ns}|{VERSION}"
+    return os.path.join(cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".tex")
+
+def read_mip_chain(path):
+    """Map every level of a cache file without copying, or return None if it is unusable"""
+    try:
+        header = np.fromfile(path, dtype="<u4", count=3)
+        if len(header) < 3 or header[0] != MAGIC or header[1] != VERSION:
+            return None
+        count = int(header[2])
+        table = np.fromfile(path, dtype="<u4", count=3 + 3 * count)[3:].reshape(count, 3)
+        file_size = os.path.getsize(path)
+        
+        levels = []
+        for width, height, offset in table.tolist():
+            if offset + width * height * 4 > file_size:
+                return None
+            levels.append(np.memmap(path, dtype=np.uint8, mode="r", offset=offset, shape=(height, width, 4)))
+        return levels
+    except (OSError, ValueError):
+        return None
+
+def write_mip_chain(levels, path):
+    """Write levels to a cache file, ignoring I/O failures"""
+    # Header and level table, then each level at an aligned offset
+    table = []
+    offset = 12 + 12 * len(levels)
+    for level in levels:
+        offset = (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+        height, width = level.shape[:2]
+        table += [width, height, offset]
+        offset += level.nbytes
+    header = np.array([MAGIC, VERSION, len(levels)] + table, dtype="<u4")
+    
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        # Write to a temporary file first so a crash never leaves a torn entry
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(header.tobytes())
+            for level, level_offset in zip(levels, table[2::3]):
+                f.write(b"\0" * (level_offset - f.tell()))
+                f.write(level.tobytes())
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: could not write texture cache {path}: {e}")
+
+def load_mip_chain(image_path, cache_dir=None, use_cache=True):
+    """Return (levels, from_cache), decoding and caching the image on a miss"""
+    if cache_dir is None:
+        cache_dir = os.environ.get("TEXTURE_CACHE_DIR", DEFAULT_CACHE_DIR)
+    
+    path = texture_cache_path(cache_dir, image_path) if use_cache else None
+    if use_cache:
+        levels = read_mip_chain(path)
+        if levels is not None:
+            return levels, True
+    
+    with Image.open(image_path) as image:
+        levels = build_mip_chain(image)
+    if use_cache:
+        write_mip_chain(levels, path)
+    return levels, False
+
+def upload_mip_chain(levels, wrap=None):
+    """Create a trilinear-filtered 2D texture from a mip chain and return its id"""
+    if wrap is None:
+        wrap = GL_REPEAT
+    texture = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_2D, texture)
+    
+    # Set texture parameters
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, 0)
+    glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(levels) - 1)
+    
+    # Upload each level straight from its (possibly memory-mapped) array
+    for level, data in enumerate(levels):
+        height, width = data.shape[:2]
+        glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, data)
+    
+    return texture
+
+def create_texture(image_path, cache_dir=None, use_cache=True):
+    """Load (through the cache) and upload an image; returns (texture, width, height, from_cache)"""
+    levels, from_cache = load_mip_chain(image_path, cache_dir, use_cache)
+    texture = upload_mip_chain(levels)
+    height, width = levels[0].shape[:2]
+    return texture, width, height, from_cache
@@ -0,0 +1,173 @@
+"""
+Async Texture Loader
+Decodes textures on a thread pool and streams their mip chains into GL through pixel
+buffer objects a few rows at a time, so loading never stalls a frame.
+"""
+
+import ctypes
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from gl_optional import *
+from texture_cache import load_mip_chain
+
+# Bytes copied into PBOs per poll(), keeps each frame's upload cost flat
+UPLOAD_BUDGET = 4 * 1024 * 1024
+
+# PBOs used round-robin so a copy never waits on the previous transfer
+PBO_COUNT = 2
+
+# Shown while the real texture is streaming in
+PLACEHOLDER_SIZE = 8
+
+class TextureUpload:
+    """A decoded mip chain being streamed into a new texture object"""
+    
+    def __init__(self, path, levels, on_ready):
+        self.path = path
+        self.levels = levels
+        self.on_ready = on_ready
+        self.texture = None
+        self.level = 0
+        self.row = 0
+    
+    def allocate(self):
+        """Create the texture and reserve storage for every level"""
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR_MIPMAP_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, 0)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(self.levels) - 1)
+        for level, data in enumerate(self.levels):
+            height, width = data.shape[:2]
+            glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, None)
+    
+    def done(self):
+        """Whether every row of every level has been uploaded"""
+        return self.level == len(self.levels)
+
+class AsyncTextureLoader:
+    """Thread-pool decoding plus budgeted PBO uploads, driven by poll() on the render thread"""
+    
+    def __init__(self, max_workers=None, upload_budget=UPLOAD_BUDGET):
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="texture-decode")
+        self.upload_budget = upload_budget
+        
+        # Decodes still running on the pool, and decoded chains waiting for upload
+        self.decoding = []
+        self.uploads = deque()
+        
+        self.pbos = list(glGenBuffers(PBO_COUNT))
+        self.next_pbo = 0
+        self.placeholder = self.create_placeholder()
+    
+    def create_placeholder(self):
+        """Small grey checkerboard bound in place of textures that are still loading"""
+        cells = (np.indices((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE)).sum(axis=0) % 2).astype(np.uint8)
+        pixels = np.empty((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE, 4), dtype=np.uint8)
+        pixels[..., :3] = (96 + 64 * cells)[..., np.newaxis]
+        pixels[..., 3] = 255
+        
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, PLACEHOLDER_SIZE, PLACEHOLDER_SIZE, 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+        return texture
+    
+    def load(self, image_path, on_ready):
+        """Start decoding image_path; on_ready(texture, width, height) runs from poll() once uploaded"""
+        future = self.executor.submit(load_mip_chain, image_path)
+        self.decoding.append((future, image_path, on_ready))
+    
+    def pending(self):
+        """Number of textures not yet handed to their callbacks"""
+        return len(self.decoding) + len(self.uploads)
+    
+    def poll(self):
+        """Collect finished decodes and upload up to the byte budget; call once per frame"""
+        if self.decoding:
+            self.collect_decoded()
+        if self.uploads:
+            self.stream_uploads()
+    
+    def collect_decoded(self):
+        """Queue every finished decode for upload, reporting failures"""
+        still_decoding = []
+        for future, path, on_ready in self.decoding:
+            if not future.done():
+                still_decoding.append((future, path, on_ready))
+                continue
+            try:
+                levels, _ = future.result()
+            except Exception as e:
+                print(f"Failed to load texture {path}: {e}")
+                continue
+            self.uploads.append(TextureUpload(path, levels, on_ready))
+        self.decoding = still_decoding
+    
+    def stream_uploads(self):
+        """Copy rows into PBOs until this frame's budget is spent"""
+        budget = self.upload_budget
+        while self.uploads and budget > 0:
+            upload = self.uploads[0]
+            if upload.texture is None:
+                upload.allocate()
+            
+            # Upload as many whole rows of the current level as the budget allows
+            data = upload.levels[upload.level]
+            height, width = data.shape[:2]
+            row_bytes = width * 4
+            rows = min(height - upload.row, max(1, budget // row_bytes))
+            chunk = data[upload.row:upload.row + rows]
+            self.upload_rows(upload.texture, upload.level, upload.row, width, rows, chunk)
+            budget -= chunk.nbytes
+            
+            upload.row += rows
+            if upload.row == height:
+                upload.level += 1
+                upload.row = 0
+            if upload.done():
+                self.uploads.popleft()
+                height, width = upload.levels[0].shape[:2]
+                upload.on_ready(upload.texture, width, height)
+    
+    def upload_rows(self, texture, level, row, width, rows, chunk):
+        """Stage rows in the next PBO and copy them into the texture from there"""
+        pbo = self.pbos[self.next_pbo]
+        self.next_pbo = (self.next_pbo + 1) % len(self.pbos)
+        
+        # Orphan the buffer so the driver never waits for the previous copy from it
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, pbo)
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, chunk.nbytes, None, GL_STREAM_DRAW)
+        pointer = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, chunk.nbytes, GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        chunk = np.ascontiguousarray(chunk)
+        ctypes.memmove(pointer, chunk.ctypes.data, chunk.nbytes)
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+        
+        # With a PBO bound the data argument is an offset into it
+        glBindTexture(GL_TEXTURE_2D, texture)
+        glTexSubImage2D(GL_TEXTURE_2D, level, 0, row, width, rows, GL_RGBA, GL_UNSIGNED_BYTE, ctypes.c_void_p(0))
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+    
+    def shutdown(self):
+        """Stop decoding and release the PBOs, placeholder and half-uploaded textures"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+        self.decoding = []
+        
+        unfinished = [upload.texture for upload in self.uploads if upload.texture]
+        if unfinished:
+            glDeleteTextures(len(unfinished), unfinished)
+        self.uploads.clear()
+        
+        if self.pbos:
+            glDeleteBuffers(len(self.pbos), self.pbos)
+            self.pbos = []
+        if self.placeholder:
+            glDeleteTextures(1, [self.placeholder])
+            self.placeholder = None
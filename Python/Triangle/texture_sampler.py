@@ -0,0 +1,147 @@
+"""
+Texture Sampler
+NumPy sampling of RGBA mip chains the way the demos' GL samplers do it: GL_REPEAT or
+GL_CLAMP_TO_EDGE wrapping, GL_NEAREST or GL_LINEAR filtering, and trilinear
+GL_LINEAR_MIPMAP_LINEAR, for whole arrays of texture coordinates in a single gather.
+
+Also reproduces the UV and color effects of the advanced textured fragment shader.
+"""
+
+import numpy as np
+from texture_cache import load_mip_chain
+
+# Wrap modes (GL_REPEAT, GL_CLAMP_TO_EDGE)
+REPEAT = "repeat"
+CLAMP_TO_EDGE = "clamp_to_edge"
+
+# Filters within a level (GL_NEAREST, GL_LINEAR)
+NEAREST = "nearest"
+LINEAR = "linear"
+
+# Effects of the advanced textured shaders, in the order the E key cycles through them
+EFFECT_NORMAL, EFFECT_WAVE, EFFECT_PULSE, EFFECT_RAINBOW = range(4)
+
+class SampledTexture:
+    """A mip chain flattened into one float texel array and sampled like a GL texture"""
+    
+    def __init__(self, levels, wrap=REPEAT, filter=LINEAR, mipmaps=True):
+        # Levels are stored back to back so a single fancy index can gather texels
+        # from any mix of levels; rows are bottom first, as uploaded to GL
+        self.texels = np.concatenate([np.asarray(level).reshape(-1, 4) for level in levels]).astype(np.float32)
+        self.texels /= 255.0
+        self.widths = np.array([level.shape[1] for level in levels], dtype=np.int64)
+        self.heights = np.array([level.shape[0] for level in levels], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.widths * self.heights)[:-1]])
+        self.width = int(self.widths[0])
+        self.height = int(self.heights[0])
+        
+        self.wrap = wrap
+        self.filter = filter
+        self.max_level = len(levels) - 1 if mipmaps else 0
+    
+    def texel_index(self, level, x, y):
+        """Flat index of integer texel coordinates at the given levels, after wrapping"""
+        width, height = self.widths[level], self.heights[level]
+        if self.wrap == REPEAT:
+            x = x % width
+            y = y % height
+        else:
+            x = np.clip(x, 0, width - 1)
+            y = np.clip(y, 0, height - 1)
+        return self.offsets[level] + y * width + x
+    
+    def footprint(self, uv, level):
+        """Texel indices (P, n) and weights (P, n) of the level filter at each uv"""
+        x = uv[:, 0] * self.widths[level]
+        y = uv[:, 1] * self.heights[level]
+        if self.filter == NEAREST:
+            index = self.texel_index(level, np.floor(x).astype(np.int64), np.floor(y).astype(np.int64))
+            return index[:, np.newaxis], np.ones((len(uv), 1), dtype=np.float32)
+        
+        # GL_LINEAR blends the four texels around the sample point, centers at +0.5
+        x -= 0.5
+        y -= 0.5
+        x0 = np.floor(x)
+        y0 = np.floor(y)
+        fx = (x - x0).astype(np.float32)
+        fy = (y - y0).astype(np.float32)
+        x0 = x0.astype(np.int64)
+        y0 = y0.astype(np.int64)
+        index = np.stack([
+            self.texel_index(level, x0, y0),
+            self.texel_index(level, x0 + 1, y0),
+            self.texel_index(level, x0, y0 + 1),
+            self.texel_index(level, x0 + 1, y0 + 1),
+        ], axis=1)
+        weights = np.stack([(1 - fx) * (1 - fy), fx * (1 - fy), (1 - fx) * fy, fx * fy], axis=1)
+        return index, weights
+    
+    def sample(self, uv, lod=None):
+        """(P, 4) RGBA at (P, 2) texture coordinates, trilinear between levels when lod is given"""
+        uv = np.asarray(uv, dtype=np.float32).reshape(-1, 2)
+        if lod is None or self.max_level == 0:
+            level = np.zeros(len(uv), dtype=np.int64)
+            index, weights = self.footprint(uv, level)
+        else:
+            # GL_LINEAR_MIPMAP_LINEAR: filter the two nearest levels and blend them
+            lod = np.clip(np.broadcast_to(np.asarray(lod, dtype=np.float32), (len(uv),)), 0.0, self.max_level)
+            level = np.floor(lod).astype(np.int64)
+            blend = (lod - level).astype(np.float32)[:, np.newaxis]
+            index_0, weights_0 = self.footprint(uv, level)
+            index_1, weights_1 = self.footprint(uv, np.minimum(level + 1, self.max_level))
+            index = np.concatenate([index_0, index_1], axis=1)
+            weights = np.concatenate([weights_0 * (1 - blend), weights_1 * blend], axis=1)
+        
+        # One gather for every texel of every sample
+        return np.einsum("pn,pnc->pc", weights, self.texels[index])
+
+def load_sampled_texture(image_path, wrap=REPEAT):
+    """Load an image through the texture cache as a trilinear-filtered SampledTexture"""
+    levels, _ = load_mip_chain(image_path)
+    return SampledTexture(levels, wrap)
+
+def triangle_lod(clip, uv, width, height, texture_width, texture_height):
+    """Per-triangle mip level, log2 of texels per pixel, for (3N, 4) clip and (3N, 2) uv"""
+    # Fragment functions see no screen-space derivatives, so the level of detail
+    # comes from each triangle's screen-to-texel Jacobian instead; like GL, the
+    # longer of the x and y derivatives decides the level
+    clip = np.asarray(clip, dtype=np.float64).reshape(-1, 3, 4)
+    uv = np.asarray(uv, dtype=np.float64).reshape(-1, 3, 2)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = clip[..., 0] / clip[..., 3] * (0.5 * width)
+        y = clip[..., 1] / clip[..., 3] * (0.5 * height)
+        u = uv[..., 0] * texture_width
+        v = uv[..., 1] * texture_height
+        dx1, dx2 = x[:, 1] - x[:, 0], x[:, 2] - x[:, 0]
+        dy1, dy2 = y[:, 1] - y[:, 0], y[:, 2] - y[:, 0]
+        du1, du2 = u[:, 1] - u[:, 0], u[:, 2] - u[:, 0]
+        dv1, dv2 = v[:, 1] - v[:, 0], v[:, 2] - v[:, 0]
+        det = dx1 * dy2 - dx2 * dy1
+        d_dx = np.hypot(du1 * dy2 - du2 * dy1, dv1 * dy2 - dv2 * dy1) / np.abs(det)
+        d_dy = np.hypot(du2 * dx1 - du1 * dx2, dv2 * dx1 - dv1 * dx2) / np.abs(det)
+        lod = np.log2(np.maximum(d_dx, d_dy))
+    
+    # Triangles reaching behind the camera get clipped and have no useful ratio
+    lod[~np.isfinite(lod) | (clip[..., 3] <= 0.0).any(axis=1)] = 0.0
+    return lod.astype(np.float32)
+
+def effect_texcoords(uv, lod, effect, time):
+    """texCoord (and the matching lod) after the shader's Wave or Pulse UV effect"""
+    if effect == EFFECT_WAVE:
+        uv = uv.copy()
+        uv[:, 0] += np.sin(uv[:, 1] * 5.0 + time * 2.0) * 0.1
+    elif effect == EFFECT_PULSE:
+        scale = 1.0 + np.sin(time * 3.0) * 0.3
+        uv = (uv - 0.5) * scale + 0.5
+        lod = lod + np.log2(scale)
+    return uv, lod
+
+def effect_color(color, uv, effect, time, brightness):
+    """Apply brightness and the Rainbow color effect; uv is the unmodified TexCoord"""
+    color = color.copy()
+    color[:, :3] *= brightness
+    if effect == EFFECT_RAINBOW:
+        hue = time * 0.5 + uv[:, 0] + uv[:, 1]
+        rainbow = np.stack([np.sin(hue), np.sin(hue + 2.094), np.sin(hue + 4.188)], axis=1) * 0.5 + 0.5
+        color[:, :3] = color[:, :3] * 0.7 + rainbow * 0.3
+    return color
@@ -5,10 +5,30 @@ Demonstrates texture mapping with a rose texture.
 """
 
 import numpy as np
+import os
+import functools
 import glfw
-from OpenGL.GL import *
-import math
-from PIL import Image
+from gl_optional import *
+from shader_program import create_program
+from frame_profiler import NullProfiler
+from render_scheduler import RenderScheduler
+from transforms import MvpTransform
+from texture_cache import create_texture
+from texture_loader import AsyncTextureLoader
+from texture_sampler import load_sampled_texture, triangle_lod
+from software_rasterizer import solid_color, transform_vertices
+from mesh_loader import mesh_from_environment, TEXTURED_LAYOUT
+from vertex_cache import compact_indices
+from vertex_format import format_from_environment
+
+# The demo texture ships next to this file
+ROSE_TEXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "rose.png")
+
+def textured_fragment(texture, pulse, values):
+    """Software fragment shader: the sampled texture with its color scaled by the pulse"""
+    color = texture.sample(values[:, 0:2], values[:, 2])
+    color[:, :3] *= pulse
+    return color
 
 class TexturedTriangleDemo:
     def __init__(self):
@@ -16,7 +36,11 @@ class TexturedTriangleDemo:
         self.shader_program = None
         self.vao = None
         self.vbo = None
+        self.ebo = None
+        self.index_type = None
         self.texture = None
+        self.texture_loader = None
+        self.sampled_texture = None
         
         # Triangle vertices with texture coordinates
         # Position (x, y, z), Texture coordinates (u, v)
@@ -26,12 +50,31 @@ class TexturedTriangleDemo:
              0.0,  0.5, 0.0,  0.5, 1.0,  # Top center
         ], dtype=np.float32)
         
+        # Triangle corners as indices into the vertices, drawn from an element buffer
+        self.indices = compact_indices(np.arange(3))
+        
+        # A mesh named by DEMO_MESH replaces the triangle
+        self.mesh = mesh_from_environment()
+        if self.mesh:
+            self.vertices = self.mesh.vertex_array(TEXTURED_LAYOUT).reshape(-1)
+            self.indices = compact_indices(self.mesh.indices)
+        
+        # GPU layout of the vertices, float unless VERTEX_FORMAT picks a packed one
+        self.vertex_format = format_from_environment(TEXTURED_LAYOUT)
+        
         # Animation parameters
         self.rotation_angle = 0.0
         self.time = 0.0
         
+        # Model/view/projection matrices, rebuilt in place every frame
+        self.transform = MvpTransform(aspect=800.0 / 600.0, distance=3.0)
+        
+        # Per-phase frame timing, replaced by a FrameProfiler when benchmarking
+        self.profiler = NullProfiler()
+        
     def init_glfw(self):
         """Initialize GLFW and create window"""
+        require_opengl()
         if not glfw.init():
             raise RuntimeError("Failed to initialize GLFW")
         
@@ -50,12 +93,10 @@ class TexturedTriangleDemo:
         glfw.make_context_current(self.window)
         glfw.set_window_size_callback(self.window, self.window_size_callback)
         
-        # Enable depth testing
-        glEnable(GL_DEPTH_TEST)
-        
     def window_size_callback(self, window, width, height):
         """Handle window resize"""
         glViewport(0, 0, width, height)
+        self.transform.projection.resize(width, height)
         
     def create_shaders(self):
         """Create and compile shaders"""
@@ -66,12 +107,13 @@ class TexturedTriangleDemo:
         layout (location = 1) in vec2 aTexCoord;
         
         uniform mat4 mvp;
+        uniform float positionScale;
         
         out vec2 TexCoord;
         
         void main()
         {
-            gl_Position = mvp * vec4(aPos, 1.0);
+            gl_Position = mvp * vec4(aPos * positionScale, 1.0);
             TexCoord = aTexCoord;
         }
         """
@@ -99,82 +141,53 @@ class TexturedTriangleDemo:
         }
         """
         
-        # Compile vertex shader
-        vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-        glShaderSource(vertex_shader, vertex_shader_source)
-        glCompileShader(vertex_shader)
-        
-        # Check vertex shader compilation
-        success = glGetShaderiv(vertex_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(vertex_shader)
-            raise RuntimeError(f"Vertex shader compilation failed: {info_log}")
-        
-        # Compile fragment shader
-        fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-        glShaderSource(fragment_shader, fragment_shader_source)
-        glCompileShader(fragment_shader)
-        
-        # Check fragment shader compilation
-        success = glGetShaderiv(fragment_shader, GL_COMPILE_STATUS)
-        if not success:
-            info_log = glGetShaderInfoLog(fragment_shader)
-            raise RuntimeError(f"Fragment shader compilation failed: {info_log}")
-        
-        # Create shader program
-        self.shader_program = glCreateProgram()
-        glAttachShader(self.shader_program, vertex_shader)
-        glAttachShader(self.shader_program, fragment_shader)
-        glLinkProgram(self.shader_program)
-        
-        # Check program linking
-        success = glGetProgramiv(self.shader_program, GL_LINK_STATUS)
-        if not success:
-            info_log = glGetProgramInfoLog(self.shader_program)
-            raise RuntimeError(f"Shader program linking failed: {info_log}")
-        
-        # Clean up shaders
-        glDeleteShader(vertex_shader)
-        glDeleteShader(fragment_shader)
+        # Compile and link (or load from the program binary cache)
+        self.shader_program = create_program(vertex_shader_source, fragment_shader_source)
+        print(f"Shaders loaded {self.shader_program.build_summary()}")
         
     def load_texture(self, image_path):
         """Load texture from image file"""
         try:
-            # Load image using PIL
-            img = Image.open(image_path)
-            
-            # Convert to RGBA if not already
-            if img.mode != 'RGBA':
-                img = img.convert('RGBA')
-            
-            # Flip image vertically to match OpenGL coordinate system
-            # (OpenGL has (0,0) at bottom-left, images have (0,0) at top-left)
-            img = img.transpose(Image.FLIP_TOP_BOTTOM)
-            
-            # Get image data
-            img_data = np.array(img, dtype=np.uint8)
-            width, height = img.size
-            
-            # Generate texture
-            self.texture = glGenTextures(1)
-            glBindTexture(GL_TEXTURE_2D, self.texture)
-            
-            # Set texture parameters
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-            
-            # Upload texture data
-            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, width, height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
+            # Decoded, flipped and mipmapped once, then memory-mapped from the cache
+            self.texture, width, height, from_cache = create_texture(image_path)
             
-            print(f"Texture loaded successfully: {width}x{height}")
+            source = "texture cache" if from_cache else "decoded image"
+            print(f"Texture loaded successfully: {width}x{height} (from {source})")
             return True
             
         except Exception as e:
             print(f"Failed to load texture: {e}")
             return False
             
+    def texture_loaded(self, texture, width, height):
+        """Swap the streamed-in texture in for the placeholder"""
+        self.texture = texture
+        print(f"Texture streamed in: {width}x{height}")
+        
+    def setup(self, async_textures=False):
+        """Create GL resources once a context (window or headless) is current"""
+        # Enable depth testing
+        glEnable(GL_DEPTH_TEST)
+        
+        self.create_shaders()
+        self.setup_buffers()
+        
+        # Load texture, or show a placeholder while it decodes and streams in
+        if async_textures:
+            self.texture_loader = AsyncTextureLoader()
+            self.texture = self.texture_loader.placeholder
+            self.texture_loader.load(ROSE_TEXTURE, self.texture_loaded)
+        elif not self.load_texture(ROSE_TEXTURE):
+            print("Warning: Could not load rose.png")
+        
+    def setup_software(self):
+        """Load the texture for render_software() into a NumPy sampler"""
+        try:
+            self.sampled_texture = load_sampled_texture(ROSE_TEXTURE)
+            print(f"Texture loaded for software rendering: {self.sampled_texture.width}x{self.sampled_texture.height}")
+        except Exception as e:
+            print(f"Failed to load texture: {e}")
+        
     def setup_buffers(self):
         """Setup VAO and VBO"""
         # Generate and bind VAO
@@ -184,84 +197,96 @@ class TexturedTriangleDemo:
         # Generate and bind VBO
         self.vbo = glGenBuffers(1)
         glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
-        glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+        packed = self.vertex_format.pack(self.vertices)
+        glBufferData(GL_ARRAY_BUFFER, packed.nbytes, packed, GL_STATIC_DRAW)
         
-        # Position attribute (location = 0)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 5 * 4, ctypes.c_void_p(0))
-        glEnableVertexAttribArray(0)
+        # Position (location = 0) and texture coordinate (location = 1) attributes
+        self.vertex_format.setup_attributes()
         
-        # Texture coordinate attribute (location = 1)
-        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, 5 * 4, ctypes.c_void_p(3 * 4))
-        glEnableVertexAttribArray(1)
+        # Element buffer; the VAO records its binding, so shared vertices are
+        # stored and transformed once instead of once per triangle
+        self.ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.indices.nbytes, self.indices, GL_STATIC_DRAW)
+        self.index_type = GL_UNSIGNED_SHORT if self.indices.dtype == np.uint16 else GL_UNSIGNED_INT
         
-        # Unbind
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        # Unbind (the VAO first, so it keeps the element buffer)
         glBindVertexArray(0)
-        
-    def create_mvp_matrix(self):
-        """Create Model-View-Projection matrix"""
-        # Model matrix (rotation around Y axis)
-        model = np.eye(4, dtype=np.float32)
-        cos_angle = math.cos(self.rotation_angle)
-        sin_angle = math.sin(self.rotation_angle)
-        model[0, 0] = cos_angle
-        model[0, 2] = sin_angle
-        model[2, 0] = -sin_angle
-        model[2, 2] = cos_angle
-        
-        # View matrix (camera looking at origin)
-        view = np.eye(4, dtype=np.float32)
-        view[2, 3] = -3.0  # Move camera back
-        
-        # Projection matrix (perspective)
-        fov = 45.0
-        aspect = 800.0 / 600.0
-        near = 0.1
-        far = 100.0
-        
-        projection = np.zeros((4, 4), dtype=np.float32)
-        f = 1.0 / math.tan(math.radians(fov) / 2.0)
-        projection[0, 0] = f / aspect
-        projection[1, 1] = f
-        projection[2, 2] = (far + near) / (near - far)
-        projection[2, 3] = (2 * far * near) / (near - far)
-        projection[3, 2] = -1.0
-        
-        # Combine matrices: MVP = Projection * View * Model
-        mvp = np.dot(projection, np.dot(view, model))
-        return mvp
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
         
     def render(self):
         """Render the textured triangle"""
         # Clear screen
         glClearColor(0.2, 0.3, 0.5, 1.0)
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        self.profiler.mark("draw")
+        
+        # Stream in pending texture data within this frame's upload budget
+        if self.texture_loader:
+            self.texture_loader.poll()
+        self.profiler.mark("buffers")
         
         # Use shader program
-        glUseProgram(self.shader_program)
+        self.shader_program.use()
         
         # Create and set MVP matrix
-        mvp = self.create_mvp_matrix()
-        mvp_loc = glGetUniformLocation(self.shader_program, "mvp")
-        glUniformMatrix4fv(mvp_loc, 1, GL_FALSE, mvp)
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        self.shader_program.set_mat4("mvp", mvp)
+        self.shader_program.set_float("positionScale", self.vertex_format.position_scale)
         
         # Set time uniform for animation
-        time_loc = glGetUniformLocation(self.shader_program, "time")
-        glUniform1f(time_loc, self.time)
+        self.shader_program.set_float("time", self.time)
         
         # Bind texture
         if self.texture:
             glActiveTexture(GL_TEXTURE0)
             glBindTexture(GL_TEXTURE_2D, self.texture)
-            texture_loc = glGetUniformLocation(self.shader_program, "ourTexture")
-            glUniform1i(texture_loc, 0)
+            self.shader_program.set_int("ourTexture", 0)
+        self.profiler.mark("uniforms")
         
         # Draw triangle
         glBindVertexArray(self.vao)
-        glDrawArrays(GL_TRIANGLES, 0, 3)
-        
-        # Swap buffers
-        glfw.swap_buffers(self.window)
+        glDrawElements(GL_TRIANGLES, len(self.indices), self.index_type, None)
+        self.profiler.mark("draw")
+        
+        # Swap buffers (headless contexts render into an FBO instead)
+        if self.window:
+            glfw.swap_buffers(self.window)
+        self.profiler.mark("swap")
+        
+    def render_software(self, rasterizer):
+        """Render the textured triangle with the CPU rasterizer and NumPy sampler"""
+        rasterizer.clear((0.2, 0.3, 0.5, 1.0))
+        self.profiler.mark("draw")
+        
+        mvp = self.transform.update(self.rotation_angle)
+        self.profiler.mark("matrix")
+        
+        # Each vertex is transformed once, then expanded to the triangle corners
+        vertices = self.vertices.reshape(-1, 5)
+        clip = transform_vertices(vertices[:, :3], mvp)[self.indices]
+        vertices = vertices[self.indices]
+        texture = self.sampled_texture
+        pulse = np.sin(self.time * 2.0) * 0.1 + 0.9
+        lod = None
+        if texture:
+            lod = triangle_lod(clip, vertices[:, 3:5], rasterizer.width, rasterizer.height, texture.width, texture.height)
+        self.profiler.mark("uniforms")
+        
+        # Without a texture GL samples opaque black, like an unbound sampler
+        if texture is None:
+            fragment = functools.partial(solid_color, (0.0, 0.0, 0.0, 1.0))
+        else:
+            fragment = functools.partial(textured_fragment, texture, pulse)
+        rasterizer.draw(clip, vertices[:, 3:5], fragment, flat=lod)
+        self.profiler.mark("draw")
+        
+    def update(self, time):
+        """Advance the animation to the given time in seconds"""
+        self.time = time
+        self.rotation_angle = self.time * 0.5  # Slow rotation
         
     def run(self):
         """Main render loop"""
@@ -270,13 +295,11 @@ class TexturedTriangleDemo:
         print("  ESC - Exit")
         print("  Window Resize - Automatically adjusts viewport")
         
-        while not glfw.window_should_close(self.window):
+        # The scene rotates, so it needs a new frame every time round the loop
+        scheduler = RenderScheduler(self.window, animated=True)
+        while scheduler.next_frame():
             # Update time and rotation
-            self.time = glfw.get_time()
-            self.rotation_angle = self.time * 0.5  # Slow rotation
-            
-            # Handle input
-            glfw.poll_events()
+            self.update(glfw.get_time())
             
             # Check for key presses
             if glfw.get_key(self.window, glfw.KEY_ESCAPE) == glfw.PRESS:
@@ -291,10 +314,17 @@ class TexturedTriangleDemo:
             glDeleteVertexArrays(1, [self.vao])
         if self.vbo:
             glDeleteBuffers(1, [self.vbo])
+        if self.ebo:
+            glDeleteBuffers(1, [self.ebo])
+        if self.texture_loader:
+            # The placeholder belongs to the loader
+            if self.texture == self.texture_loader.placeholder:
+                self.texture = None
+            self.texture_loader.shutdown()
         if self.texture:
             glDeleteTextures(1, [self.texture])
         if self.shader_program:
-            glDeleteProgram(self.shader_program)
+            self.shader_program.delete()
         glfw.terminate()
 
 def main():
@@ -302,19 +332,7 @@ def main():
     try:
         demo = TexturedTriangleDemo()
         demo.init_glfw()
-        demo.create_shaders()
-        demo.setup_buffers()
-        
-        # Load texture
-        if not demo.load_texture('rose.png'):
-            print("Warning: Could not load rose.png, using fallback")
-            # Create a simple colored triangle as fallback
-            demo.vertices = np.array([
-                -0.5, -0.5, 0.0,  0.0, 0.0,  # Bottom left
-                 0.5, -0.5, 0.0,  1.0, 0.0,  # Bottom right
-                 0.0,  0.5, 0.0,  0.5, 1.0,  # Top center
-            ], dtype=np.float32)
-        
+        demo.setup(async_textures=True)
         demo.run()
     except Exception as e:
         print(f"Error: {e}")
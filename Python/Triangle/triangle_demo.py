@@ -6,8 +6,11 @@ A simple demonstration of rendering a triangle using modern shader-based approac
 
 import glfw
 import numpy as np
-from OpenGL.GL import *
-from OpenGL.GL import shaders
+from gl_optional import *
+from shader_program import create_program
+from frame_profiler import NullProfiler
+from render_scheduler import RenderScheduler
+from software_rasterizer import transform_vertices, varying_color
 import sys
 import ctypes
 
@@ -18,6 +21,9 @@ class TriangleRenderer:
         self.vao = None
         self.vbo = None
         
+        # Per-phase frame timing, replaced by a FrameProfiler when benchmarking
+        self.profiler = NullProfiler()
+        
         # Vertex data for triangle (position + color)
         self.vertices = np.array([
             # Position (x, y, z)   # Color (r, g, b)
@@ -55,6 +61,7 @@ class TriangleRenderer:
     
     def init_glfw(self):
         """Initialize GLFW and create window"""
+        require_opengl()
         if not glfw.init():
             print("Failed to initialize GLFW")
             sys.exit(-1)
@@ -80,50 +87,22 @@ class TriangleRenderer:
     def create_shaders(self):
         """Create and compile shaders"""
         try:
-            # Compile vertex shader
-            vertex_shader = glCreateShader(GL_VERTEX_SHADER)
-            glShaderSource(vertex_shader, self.vertex_shader_source)
-            glCompileShader(vertex_shader)
-            
-            # Check vertex shader compilation
-            if not glGetShaderiv(vertex_shader, GL_COMPILE_STATUS):
-                error = glGetShaderInfoLog(vertex_shader)
-                print(f"Vertex shader compilation error: {error}")
-                return False
-            
-            # Compile fragment shader
-            fragment_shader = glCreateShader(GL_FRAGMENT_SHADER)
-            glShaderSource(fragment_shader, self.fragment_shader_source)
-            glCompileShader(fragment_shader)
-            
-            # Check fragment shader compilation
-            if not glGetShaderiv(fragment_shader, GL_COMPILE_STATUS):
-                error = glGetShaderInfoLog(fragment_shader)
-                print(f"Fragment shader compilation error: {error}")
-                return False
-            
-            # Create shader program
-            self.shader_program = glCreateProgram()
-            glAttachShader(self.shader_program, vertex_shader)
-            glAttachShader(self.shader_program, fragment_shader)
-            glLinkProgram(self.shader_program)
-            
-            # Check program linking
-            if not glGetProgramiv(self.shader_program, GL_LINK_STATUS):
-                error = glGetProgramInfoLog(self.shader_program)
-                print(f"Shader program linking error: {error}")
-                return False
-            
-            # Clean up shaders
-            glDeleteShader(vertex_shader)
-            glDeleteShader(fragment_shader)
-            
+            # Compile and link (or load from the program binary cache)
+            self.shader_program = create_program(self.vertex_shader_source, self.fragment_shader_source)
+            print(f"Shaders loaded {self.shader_program.build_summary()}")
             return True
             
         except Exception as e:
             print(f"Error creating shaders: {e}")
             return False
     
+    def setup(self):
+        """Create GL resources once a context (window or headless) is current"""
+        if not self.create_shaders():
+            return False
+        self.setup_buffers()
+        return True
+        
     def setup_buffers(self):
         """Setup vertex buffer and vertex array objects"""
         # Create VAO
@@ -152,27 +131,44 @@ class TriangleRenderer:
         glClearColor(0.2, 0.3, 0.3, 1.0)
         glClear(GL_COLOR_BUFFER_BIT)
         
-        glUseProgram(self.shader_program)
+        self.shader_program.use()
         glBindVertexArray(self.vao)
         glDrawArrays(GL_TRIANGLES, 0, 3)
+        self.profiler.mark("draw")
         
-        glfw.swap_buffers(self.window)
-        glfw.poll_events()
+        # Headless contexts render into an FBO and have no window to swap
+        if self.window:
+            glfw.swap_buffers(self.window)
+        self.profiler.mark("swap")
+    
+    def render_software(self, rasterizer):
+        """Render the triangle with the CPU rasterizer (no GL context needed)"""
+        rasterizer.clear((0.2, 0.3, 0.3, 1.0))
+        rasterizer.depth_test = False
+        
+        # Same pipeline as the shaders: position passed through, color interpolated
+        vertices = self.vertices.reshape(-1, 6)
+        rasterizer.draw(transform_vertices(vertices[:, :3]), vertices[:, 3:6], varying_color)
+        self.profiler.mark("draw")
     
+    def update(self, time):
+        """Static scene, nothing to animate"""
+        pass
+        
     def run(self):
         """Main render loop"""
         self.init_glfw()
         
-        if not self.create_shaders():
+        if not self.setup():
             print("Failed to create shaders")
             return
         
-        self.setup_buffers()
-        
         print("Triangle Demo is running!")
         print("Press ESC or close window to exit")
         
-        while not glfw.window_should_close(self.window):
+        # The triangle never changes, so only redraw when the window needs it
+        scheduler = RenderScheduler(self.window)
+        while scheduler.next_frame():
             self.render()
             
             # Handle input
@@ -188,7 +184,7 @@ class TriangleRenderer:
         if self.vbo:
             glDeleteBuffers(1, [self.vbo])
         if self.shader_program:
-            glDeleteProgram(self.shader_program)
+            self.shader_program.delete()
         
         glfw.terminate()
 
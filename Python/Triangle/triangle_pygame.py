@@ -1,81 +1,286 @@
 #!/usr/bin/env python3
 """
 Triangle Demo with Pygame - Alternative to GLFW
-A simple demonstration of rendering a triangle using PyOpenGL with Pygame
+A simple demonstration of rendering triangles using PyOpenGL with Pygame, either
+retained (VAO/VBO and shaders) or in immediate mode for comparison, with the frame
+rate held by pygame.time.Clock
 """
 
+import argparse
+import ctypes
+import math
 import pygame
 from pygame.locals import *
-from OpenGL.GL import *
-from OpenGL.GLU import *
+from gl_optional import *
+from shader_program import create_program
+from frame_profiler import NullProfiler
+from software_rasterizer import transform_vertices, varying_color
 import numpy as np
 import sys
 
+# Frame limit of the run loop, 0 renders as fast as possible
+TARGET_FPS = 60
+
+# How often the window title shows the measured frame rate, in milliseconds
+FPS_REPORT_INTERVAL = 500
+
+# The original triangle: position (x, y, z) and color (r, g, b) per vertex
+BASE_TRIANGLE = np.array([
+    -0.5, -0.5, 0.0,   1.0, 0.0, 0.0,  # Red
+     0.5, -0.5, 0.0,   0.0, 1.0, 0.0,  # Green
+     0.0,  0.5, 0.0,   0.0, 0.0, 1.0,  # Blue
+], dtype=np.float32).reshape(3, 6)
+
+def generate_triangles(count):
+    """Interleaved position + color vertices of count triangles tiled over the viewport"""
+    # A single triangle is the original one; more are scaled into the cells of a grid
+    side = math.ceil(math.sqrt(count))
+    cells = np.arange(count)
+    centers = np.stack([
+        (cells % side + 0.5) / side * 2.0 - 1.0,
+        (cells // side + 0.5) / side * 2.0 - 1.0,
+    ], axis=1).astype(np.float32)
+    
+    vertices = np.repeat(BASE_TRIANGLE[np.newaxis], count, axis=0)
+    vertices[:, :, :2] = vertices[:, :, :2] / side + centers[:, np.newaxis, :]
+    return vertices.reshape(-1)
+
 class TriangleRenderer:
-    def __init__(self):
+    def __init__(self, retained=True, core=False, triangle_count=1, target_fps=TARGET_FPS):
         self.display = None
-        self.vertices = None
-        
-        # Triangle vertices (position only)
-        self.vertices = np.array([
-            -0.5, -0.5, 0.0,  # Left
-             0.5, -0.5, 0.0,  # Right
-             0.0,  0.5, 0.0   # Top
-        ], dtype=np.float32)
+        self.shader_program = None
+        self.vao = None
+        self.vbo = None
+        
+        # Retained mode draws from a VBO with shaders, immediate mode issues
+        # glBegin/glEnd calls every frame; a core context only allows retained mode
+        self.retained = retained or core
+        self.core = core
+        self.target_fps = target_fps
+        
+        # Per-phase frame timing, replaced by a FrameProfiler when benchmarking
+        self.profiler = NullProfiler()
+        
+        # Triangle vertices (position + color)
+        self.triangle_count = triangle_count
+        self.vertices = generate_triangles(triangle_count)
+        
+        # Vertex shader source code
+        self.vertex_shader_source = """
+        #version 330 core
+        layout (location = 0) in vec3 position;
+        layout (location = 1) in vec3 color;
+        
+        out vec3 fragmentColor;
+        
+        void main()
+        {
+            gl_Position = vec4(position, 1.0);
+            fragmentColor = color;
+        }
+        """
+        
+        # Fragment shader source code
+        self.fragment_shader_source = """
+        #version 330 core
+        in vec3 fragmentColor;
+        out vec4 FragColor;
+        
+        void main()
+        {
+            FragColor = vec4(fragmentColor, 1.0);
+        }
+        """
     
     def init_pygame(self):
         """Initialize Pygame and OpenGL context"""
+        require_opengl()
         pygame.init()
         display = (800, 600)
-        pygame.display.set_mode(display, DOUBLEBUF | OPENGL)
         
-        # Set up OpenGL
-        glClearColor(0.2, 0.3, 0.3, 1.0)
-        glEnable(GL_DEPTH_TEST)
+        # Shaders need OpenGL 3.3; a compatibility profile keeps immediate mode available
+        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MAJOR_VERSION, 3)
+        pygame.display.gl_set_attribute(pygame.GL_CONTEXT_MINOR_VERSION, 3)
+        if self.core:
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_CORE)
+        else:
+            pygame.display.gl_set_attribute(pygame.GL_CONTEXT_PROFILE_MASK, pygame.GL_CONTEXT_PROFILE_COMPATIBILITY)
+        pygame.display.set_mode(display, DOUBLEBUF | OPENGL)
+        if self.setup() is False:
+            raise RuntimeError("Failed to set up retained mode")
         
         self.display = display
         print("Triangle Demo with Pygame is running!")
+        print(f"Drawing {self.triangle_count} triangle(s) in {self.mode_name()} mode")
         print("Press ESC or close window to exit")
+        if not self.core:
+            print("Press M to switch between retained and immediate mode")
+    
+    def mode_name(self):
+        """Name of the current drawing path for messages"""
+        return "retained" if self.retained else "immediate"
+    
+    def setup(self):
+        """Set up OpenGL state once a context (window or headless) is current"""
+        glClearColor(0.2, 0.3, 0.3, 1.0)
+        glEnable(GL_DEPTH_TEST)
+        
+        try:
+            self.shader_program = create_program(self.vertex_shader_source, self.fragment_shader_source)
+            print(f"Shaders loaded {self.shader_program.build_summary()}")
+        except Exception as e:
+            # Compatibility contexts older than 3.3 can still draw in immediate mode
+            print(f"Error creating shaders: {e}")
+            if self.core:
+                return False
+            print("Falling back to immediate mode")
+            self.retained = False
+            return True
+        self.setup_buffers()
+        return True
+    
+    def setup_buffers(self):
+        """Upload the vertices once into a VBO described by a VAO"""
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+        
+        self.vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+        
+        # Position attribute (location = 0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 6 * 4, None)
+        glEnableVertexAttribArray(0)
+        
+        # Color attribute (location = 1)
+        glVertexAttribPointer(1, 3, GL_FLOAT, GL_FALSE, 6 * 4, ctypes.c_void_p(3 * 4))
+        glEnableVertexAttribArray(1)
+        
+        # Unbind
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindVertexArray(0)
+    
+    def set_triangle_count(self, count):
+        """Regenerate the triangle grid and re-upload it"""
+        self.triangle_count = max(1, count)
+        self.vertices = generate_triangles(self.triangle_count)
+        if self.vbo is not None:
+            glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+            glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+        print(f"Triangles: {self.triangle_count}")
+    
+    def toggle_mode(self):
+        """Switch between retained and immediate mode on a compatibility context"""
+        if self.core or self.vao is None:
+            print("Only one drawing mode is available on this context")
+            return
+        self.retained = not self.retained
+        print(f"Drawing in {self.mode_name()} mode")
+    
+    def update(self, time):
+        """Static scene, nothing to animate"""
+        pass
     
     def render(self):
-        """Render the triangle"""
+        """Render the triangles"""
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
         
-        # Draw triangle using immediate mode (for simplicity)
-        glBegin(GL_TRIANGLES)
-        glColor3f(1.0, 0.0, 0.0)  # Red
-        glVertex3f(-0.5, -0.5, 0.0)
-        
-        glColor3f(0.0, 1.0, 0.0)  # Green
-        glVertex3f(0.5, -0.5, 0.0)
+        if self.retained:
+            # One draw call for every triangle, the vertices stay on the GPU
+            self.shader_program.use()
+            glBindVertexArray(self.vao)
+            glDrawArrays(GL_TRIANGLES, 0, 3 * self.triangle_count)
+            glBindVertexArray(0)
+            glUseProgram(0)
+        else:
+            # Immediate mode sends every vertex from Python each frame
+            glBegin(GL_TRIANGLES)
+            for vertex in self.vertices.reshape(-1, 6):
+                glColor3f(*vertex[3:6])
+                glVertex3f(*vertex[:3])
+            glEnd()
+        self.profiler.mark("draw")
         
-        glColor3f(0.0, 0.0, 1.0)  # Blue
-        glVertex3f(0.0, 0.5, 0.0)
-        glEnd()
+        # Headless contexts render into an FBO and have no display to flip
+        if self.display:
+            pygame.display.flip()
+        self.profiler.mark("swap")
+    
+    def render_software(self, rasterizer):
+        """Render the triangles with the CPU rasterizer (no GL context needed)"""
+        rasterizer.clear((0.2, 0.3, 0.3, 1.0))
         
-        pygame.display.flip()
+        # Same pipeline as the shaders: position passed through, color interpolated
+        vertices = self.vertices.reshape(-1, 6)
+        rasterizer.draw(transform_vertices(vertices[:, :3]), vertices[:, 3:6], varying_color)
+        self.profiler.mark("draw")
+    
+    def handle_key(self, key):
+        """Handle a key press; returns False when the demo should exit"""
+        if key == pygame.K_ESCAPE:
+            return False
+        elif key == pygame.K_m:
+            self.toggle_mode()
+        elif key == pygame.K_RIGHTBRACKET:
+            self.set_triangle_count(self.triangle_count * 2)
+        elif key == pygame.K_LEFTBRACKET:
+            self.set_triangle_count(self.triangle_count // 2)
+        return True
     
     def run(self):
         """Main render loop"""
         self.init_pygame()
         
-        while True:
+        # Clock.tick() sleeps off whatever is left of each frame's time budget
+        clock = pygame.time.Clock()
+        last_report = pygame.time.get_ticks()
+        running = True
+        while running:
             for event in pygame.event.get():
                 if event.type == pygame.QUIT:
-                    pygame.quit()
-                    return
+                    running = False
                 elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        pygame.quit()
-                        return
+                    running = self.handle_key(event.key) and running
+            if not running:
+                break
             
             self.render()
-            pygame.time.wait(10)  # Small delay to prevent excessive CPU usage
+            clock.tick(self.target_fps)
+            
+            now = pygame.time.get_ticks()
+            if now - last_report >= FPS_REPORT_INTERVAL:
+                pygame.display.set_caption(f"Triangle Demo with Pygame - {self.mode_name()}, "
+                                           f"{self.triangle_count} triangles, {clock.get_fps():.1f} FPS")
+                last_report = now
+        
+        self.cleanup()
+        pygame.quit()
+    
+    def cleanup(self):
+        """Release the VAO, VBO and shader program"""
+        if self.vao is not None:
+            glDeleteVertexArrays(1, [self.vao])
+            self.vao = None
+        if self.vbo is not None:
+            glDeleteBuffers(1, [self.vbo])
+            self.vbo = None
+        if self.shader_program:
+            self.shader_program.delete()
+            self.shader_program = None
 
 def main():
     """Main function"""
+    parser = argparse.ArgumentParser(description="Triangle demo with Pygame")
+    parser.add_argument("--immediate", action="store_true", help="start in immediate mode instead of retained mode")
+    parser.add_argument("--core", action="store_true", help="use a 3.3 core profile context (retained mode only)")
+    parser.add_argument("--triangles", type=int, default=1, help="number of triangles to draw")
+    parser.add_argument("--fps", type=int, default=TARGET_FPS, help="frame limit, 0 for unlimited")
+    args = parser.parse_args()
+    
     try:
-        renderer = TriangleRenderer()
+        renderer = TriangleRenderer(retained=not args.immediate, core=args.core,
+                                    triangle_count=max(1, args.triangles), target_fps=args.fps)
         renderer.run()
     except Exception as e:
         print(f"Error: {e}")
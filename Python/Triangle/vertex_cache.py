@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Vertex Cache Optimization
+Offline reordering of an indexed mesh for the GPU's post-transform vertex cache. The
+triangles are reordered with Tipsify (Sander, Nehab and Barczak, "Fast Triangle
+Reordering for Vertex Locality and Reduced Overdraw", 2007), so a vertex is mostly
+reused while it is still cached, then the vertices are renumbered in order of first
+use so vertex fetches walk the buffer forwards. The average cache miss ratio
+(ACMR, transformed vertices per triangle) shows the effect: about 3 for a mesh in
+random order, 0.5 for an ideal one.
+
+Usage:
+    python vertex_cache.py model.obj                # report the ACMR before and after
+    python vertex_cache.py model.obj optimized.ply  # also write the optimized mesh
+
+Writing the result as binary PLY keeps the reordering offline: the demos load it
+with DEMO_MESH like any other mesh.
+"""
+
+import sys
+import time
+import numpy as np
+from mesh_loader import Mesh, load_mesh, write_ply
+
+# Cache size the reordering targets; post-transform caches hold 16 to 32 vertices
+CACHE_SIZE = 16
+
+# Cache sizes the report simulates
+REPORT_CACHE_SIZES = (8, 16, 32)
+
+def compact_indices(indices):
+    """Flat index buffer as uint16 when every index fits, halving its size, else uint32"""
+    indices = np.asarray(indices).reshape(-1)
+    if len(indices) and int(indices.max()) > 0xFFFF:
+        return indices.astype(np.uint32)
+    return indices.astype(np.uint16)
+
+def cache_misses(indices, cache_size=CACHE_SIZE):
+    """Vertices a FIFO post-transform cache of cache_size entries would transform"""
+    # A vertex is cached if it was one of the last cache_size misses
+    corners = np.asarray(indices).reshape(-1)
+    if not len(corners):
+        return 0
+    stamps = [-cache_size - 1] * (int(corners.max()) + 1)
+    misses = 0
+    for vertex in corners.tolist():
+        if misses - stamps[vertex] > cache_size:
+            stamps[vertex] = misses
+            misses += 1
+    return misses
+
+def acmr(indices, cache_size=CACHE_SIZE):
+    """Average cache miss ratio: transformed vertices per triangle"""
+    triangles = len(np.asarray(indices).reshape(-1)) // 3
+    return cache_misses(indices, cache_size) / max(triangles, 1)
+
+def tipsify(indices, vertex_count, cache_size=CACHE_SIZE):
+    """Triangles (F, 3) reordered so consecutive triangles share cached vertices"""
+    triangles = np.asarray(indices).reshape(-1, 3)
+    if len(triangles) == 0:
+        return triangles
+    corners = triangles.reshape(-1)
+    
+    # Vertex to triangle adjacency in CSR form. The walk below is sequential, so it
+    # runs on Python lists, which index far faster than NumPy scalars
+    valence = np.bincount(corners, minlength=vertex_count)
+    offsets = np.concatenate([[0], np.cumsum(valence)]).tolist()
+    adjacency = (np.argsort(corners, kind="stable") // 3).tolist()
+    live = valence.tolist()
+    corner_list = corners.tolist()
+    
+    cache_time = [0] * vertex_count
+    emitted = [False] * len(triangles)
+    dead_end = []
+    order = []
+    timestamp = cache_size + 1
+    cursor = 0
+    fanning = 0
+    while fanning >= 0:
+        # Emit every remaining triangle around the fanning vertex
+        candidates = []
+        for triangle in adjacency[offsets[fanning]:offsets[fanning + 1]]:
+            if emitted[triangle]:
+                continue
+            emitted[triangle] = True
+            order.append(triangle)
+            for vertex in corner_list[3 * triangle:3 * triangle + 3]:
+                dead_end.append(vertex)
+                candidates.append(vertex)
+                live[vertex] -= 1
+                if timestamp - cache_time[vertex] > cache_size:
+                    cache_time[vertex] = timestamp
+                    timestamp += 1
+        
+        # Next fan around the candidate that stays cached longest while its
+        # remaining triangles are emitted
+        fanning = -1
+        best = -1
+        for vertex in candidates:
+            if live[vertex] > 0:
+                age = timestamp - cache_time[vertex]
+                priority = age if age + 2 * live[vertex] <= cache_size else 0
+                if priority > best:
+                    best = priority
+                    fanning = vertex
+        if fanning < 0:
+            # Dead end: the most recently used vertex with triangles left, else
+            # the next one in index order
+            while dead_end:
+                vertex = dead_end.pop()
+                if live[vertex] > 0:
+                    fanning = vertex
+                    break
+            else:
+                while cursor < vertex_count and live[cursor] == 0:
+                    cursor += 1
+                fanning = cursor if cursor < vertex_count else -1
+    return triangles[order]
+
+def first_use_order(indices, vertex_count):
+    """Vertex numbers sorted by first use in the index buffer, unused vertices last"""
+    corners = np.asarray(indices).reshape(-1)
+    first = np.full(vertex_count, len(corners), dtype=np.int64)
+    used, positions = np.unique(corners, return_index=True)
+    first[used] = positions
+    return np.argsort(first, kind="stable")
+
+def optimize_mesh(mesh, cache_size=CACHE_SIZE):
+    """Copy of a mesh with cache-ordered triangles and fetch-ordered vertices"""
+    triangles = tipsify(mesh.indices, mesh.vertex_count(), cache_size)
+    order = first_use_order(triangles, mesh.vertex_count())
+    remap = np.empty_like(order)
+    remap[order] = np.arange(len(order))
+    normals = None if mesh.normals is None else mesh.normals[order]
+    uvs = None if mesh.uvs is None else mesh.uvs[order]
+    return Mesh(mesh.positions[order], remap[triangles], normals, uvs)
+
+def print_report(label, indices):
+    """Print the ACMR of an index buffer for each of REPORT_CACHE_SIZES"""
+    ratios = "  ".join(f"{size:2d}: {acmr(indices, size):.3f}" for size in REPORT_CACHE_SIZES)
+    print(f"  {label:10s} ACMR by cache size  {ratios}")
+
+def main():
+    """Optimize the mesh given on the command line, report it, and optionally save it"""
+    if len(sys.argv) not in (2, 3):
+        print(__doc__)
+        sys.exit(1)
+    mesh = load_mesh(sys.argv[1])
+    print(f"{sys.argv[1]}: {mesh.vertex_count()} vertices, {mesh.triangle_count()} triangles")
+    print_report("original", mesh.indices)
+    
+    start = time.perf_counter()
+    optimized = optimize_mesh(mesh)
+    print(f"  Optimized in {time.perf_counter() - start:.2f} s")
+    print_report("optimized", optimized.indices)
+    
+    if len(sys.argv) == 3:
+        write_ply(sys.argv[2], optimized)
+        print(f"  Saved {sys.argv[2]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Vertex Formats
+Compact GPU layouts for the demos' interleaved float vertices. Positions can be
+stored as half floats or as normalized 16-bit integers, normals as
+GL_INT_2_10_10_10_REV and texture coordinates as normalized 16-bit integers. A
+VertexFormat packs the float array into a NumPy structured array and issues the
+matching glVertexAttribPointer calls, so a demo switches formats without touching its
+buffer setup.
+
+The format comes from the VERTEX_FORMAT environment variable: "float" (default, the
+demos' original 32-bit layout), "half" or "quantized".
+"""
+
+import ctypes
+import os
+import numpy as np
+from gl_optional import *
+from mesh_loader import ATTRIBUTE_SIZES
+
+# Encodings: NumPy field type, component count, normalized. Half and 16-bit
+# positions carry a fourth component so every attribute stays 4-byte aligned
+ENCODINGS = {
+    "float3": ((np.float32, 3), 3, False),
+    "float2": ((np.float32, 2), 2, False),
+    "half4": ((np.float16, 4), 4, False),
+    "snorm16x4": ((np.int16, 4), 4, True),
+    "int_2_10_10_10": (np.uint32, 4, True),
+    "unorm16x2": ((np.uint16, 2), 2, True),
+}
+
+# Encoding of each attribute per named format
+VERTEX_FORMATS = {
+    "float": {"position": "float3", "normal": "float3", "uv": "float2"},
+    "half": {"position": "half4", "normal": "int_2_10_10_10", "uv": "unorm16x2"},
+    "quantized": {"position": "snorm16x4", "normal": "int_2_10_10_10", "uv": "unorm16x2"},
+}
+DEFAULT_FORMAT = "float"
+
+def component_type(encoding):
+    """GL type of an encoding's components; looked up on use, so packing needs no OpenGL"""
+    return {
+        "float3": GL_FLOAT,
+        "float2": GL_FLOAT,
+        "half4": GL_HALF_FLOAT,
+        "snorm16x4": GL_SHORT,
+        "int_2_10_10_10": GL_INT_2_10_10_10_REV,
+        "unorm16x2": GL_UNSIGNED_SHORT,
+    }[encoding]
+
+def pack_normals(normals):
+    """Signed normalized 10-bit x, y, z in one uint32 per normal, as GL_INT_2_10_10_10_REV"""
+    quantized = np.round(np.clip(normals, -1.0, 1.0) * 511.0).astype(np.int32) & 0x3FF
+    return (quantized[:, 0] | (quantized[:, 1] << 10) | (quantized[:, 2] << 20)).astype(np.uint32)
+
+class VertexFormat:
+    """Packed GPU layout for the attributes of one interleaved float layout"""
+    
+    def __init__(self, layout, name=DEFAULT_FORMAT):
+        if name not in VERTEX_FORMATS:
+            raise RuntimeError(f"Unknown vertex format '{name}' (choose from {', '.join(VERTEX_FORMATS)})")
+        self.name = name
+        self.layout = layout
+        self.encodings = [VERTEX_FORMATS[name][attribute] for attribute in layout]
+        self.dtype = np.dtype([(attribute, ENCODINGS[encoding][0]) for attribute, encoding in zip(layout, self.encodings)])
+        self.floats = sum(ATTRIBUTE_SIZES[attribute] for attribute in layout)
+        self.position_scale = 1.0
+    
+    def stride(self):
+        """Bytes per packed vertex"""
+        return self.dtype.itemsize
+    
+    def pack(self, vertices):
+        """Structured array of packed vertices from interleaved floats"""
+        vertices = np.asarray(vertices, dtype=np.float32).reshape(-1, self.floats)
+        packed = np.zeros(len(vertices), dtype=self.dtype)
+        column = 0
+        for attribute, encoding in zip(self.layout, self.encodings):
+            values = vertices[:, column:column + ATTRIBUTE_SIZES[attribute]]
+            column += ATTRIBUTE_SIZES[attribute]
+            packed[attribute] = self.encode(encoding, values)
+        return packed
+    
+    def encode(self, encoding, values):
+        """One attribute's values in the given encoding"""
+        if encoding in ("float3", "float2"):
+            return values
+        if encoding == "half4":
+            return np.concatenate([values, np.ones((len(values), 1), dtype=np.float32)], axis=1)
+        if encoding == "snorm16x4":
+            # Scale into [-1, 1]; vertex shaders multiply by a positionScale uniform
+            # set from position_scale to undo it (1 for every other encoding)
+            extent = float(np.abs(values).max()) if len(values) else 0.0
+            self.position_scale = extent if extent > 0.0 else 1.0
+            quantized = np.full((len(values), 4), 32767, dtype=np.int16)
+            quantized[:, :3] = np.round(values / self.position_scale * 32767.0)
+            return quantized
+        if encoding == "int_2_10_10_10":
+            return pack_normals(values)
+        if encoding == "unorm16x2":
+            if len(values) and (values.min() < 0.0 or values.max() > 1.0):
+                raise RuntimeError("Texture coordinates outside [0, 1] need the float vertex format")
+            return np.round(values * 65535.0).astype(np.uint16)
+        raise RuntimeError(f"Unknown vertex encoding: {encoding}")
+    
+    def setup_attributes(self):
+        """Point attribute locations 0, 1, ... at the packed fields; the VAO and VBO must be bound"""
+        for location, (attribute, encoding) in enumerate(zip(self.layout, self.encodings)):
+            _, components, normalized = ENCODINGS[encoding]
+            offset = self.dtype.fields[attribute][1]
+            glVertexAttribPointer(location, components, component_type(encoding), GL_TRUE if normalized else GL_FALSE,
+                                  self.stride(), ctypes.c_void_p(offset))
+            glEnableVertexAttribArray(location)
+
+def format_from_environment(layout):
+    """VertexFormat for a layout, named by the VERTEX_FORMAT environment variable"""
+    name = os.environ.get("VERTEX_FORMAT", DEFAULT_FORMAT).strip().lower()
+    return VertexFormat(layout, name)